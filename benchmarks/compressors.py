@@ -0,0 +1,71 @@
+"""
+Compares the throughput and compression ratio of the deflate compressor backends on a
+real dependency tree, such as a virtualenv's `site-packages` directory or a built
+requirements directory.  Backends whose package is not installed are skipped.
+
+Usage:
+
+    python benchmarks/compressors.py [PATH] [--levels 1,6,9] [--limit MB]
+"""
+import argparse
+import sys
+import sysconfig
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lambda_package.compressors import Compressors  # noqa
+
+
+def read_files(root: Path, limit: int):
+    """
+    Reads the files of a directory tree into memory, up to `limit` bytes in total
+    """
+    (files, total) = ([], 0)
+    for path in sorted(root.rglob("*")):
+        if total >= limit:
+            break
+        if path.is_file() and not path.is_symlink():
+            data = path.read_bytes()
+            files.append(data)
+            total += len(data)
+
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser("compressors")
+    parser.add_argument("path", nargs="?", default=sysconfig.get_paths()["purelib"])
+    parser.add_argument("--levels", default="1,6,9")
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    files = read_files(Path(args.path), args.limit * 1024 * 1024)
+    raw_size = sum(len(data) for data in files)
+    print(f"{len(files)} files, {raw_size / 1048576:.1f} MB from {args.path}\n")
+    print(f"{'backend':<12}{'level':>6}{'MB/s':>10}{'ratio':>9}")
+
+    for (name, backend) in Compressors.items():
+        try:
+            compressor = backend()
+        except ImportError:
+            print(f"{name:<12}  not installed")
+            continue
+
+        for level in [int(level) for level in args.levels.split(",")]:
+            start = time.perf_counter()
+            compressed_size = 0
+            for data in files:
+                compressor.crc32(data)
+                compressed_size += len(compressor.compress(data, level))
+            elapsed = time.perf_counter() - start
+
+            print(
+                f"{name:<12}{level:>6}{raw_size / 1048576 / elapsed:>10.1f}"
+                f"{compressed_size / raw_size:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Measures the effect of reading files ahead of the compressor on the time taken to zip a
+real dependency tree, such as a virtualenv's `site-packages` directory.  Before each run
+the files are evicted from the page cache with `posix_fadvise`, so that every read goes
+to the disk, as in a fresh CI runner.  Pass `--warm` to keep the page cache instead.
+`--latency MS` adds a delay to every file opened in the tree, to simulate a network
+filesystem such as NFS or EFS.
+
+Usage:
+
+    python benchmarks/read_ahead.py [PATH] [--depths 0,4,16,64] [--threads 4]
+        [--compressor zlib] [--limit MB] [--warm] [--latency MS]
+"""
+import argparse
+import builtins
+import os
+import sys
+import sysconfig
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lambda_package.configuration import Configuration  # noqa
+from lambda_package.lambda_package import zip_package  # noqa
+
+
+def find_files(root: Path, limit: int):
+    """
+    Returns the zip package paths of the files of a directory tree, up to `limit` bytes
+    in total
+    """
+    (paths, total) = ([], 0)
+    for path in sorted(root.rglob("*")):
+        if total >= limit:
+            break
+        if path.is_file() and not path.is_symlink():
+            paths.append((path, path.relative_to(root)))
+            total += path.stat().st_size
+
+    return (paths, total)
+
+
+def evict(paths) -> bool:
+    """
+    Drops the files from the page cache, if the platform supports it
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+
+    for (path, _) in paths:
+        fd = os.open(str(path), os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+    return True
+
+
+def delay_open(root: Path, latency: float):
+    """
+    Returns a replacement for `open` which sleeps for `latency` seconds before opening
+    a file in `root`
+    """
+    real_open = builtins.open
+    prefix = str(root)
+
+    def open_with_latency(file, *args, **kwargs):
+        if isinstance(file, str) and file.startswith(prefix):
+            time.sleep(latency)
+        return real_open(file, *args, **kwargs)
+
+    return open_with_latency
+
+
+def main():
+    parser = argparse.ArgumentParser("read_ahead")
+    parser.add_argument("path", nargs="?", default=sysconfig.get_paths()["purelib"])
+    parser.add_argument("--depths", default="0,4,16,64")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--compressor", default="zlib")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--warm", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    root = Path(args.path).resolve()
+
+    (paths, total) = find_files(root, args.limit * 1024 * 1024)
+    print(f"{len(paths)} files, {total / 1048576:.1f} MB from {args.path}\n")
+    print(f"{'depth':>6}{'seconds':>10}{'MB/s':>10}")
+
+    with TemporaryDirectory() as temp_dir:
+        output = Path(temp_dir).joinpath("package.zip")
+
+        for depth in [int(depth) for depth in args.depths.split(",")]:
+            if not args.warm and not evict(paths):
+                print("The page cache cannot be dropped on this platform")
+                args.warm = True
+
+            start = time.perf_counter()
+            with mock.patch("builtins.open", delay_open(root, args.latency / 1000)):
+                zip_package(
+                    paths,
+                    str(output),
+                    configuration=Configuration(
+                        read_ahead=depth or None,
+                        read_ahead_threads=args.threads,
+                        compressor=args.compressor,
+                    ),
+                )
+            elapsed = time.perf_counter() - start
+            print(f"{depth:>6}{elapsed:>10.2f}{total / 1048576 / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares the sequential and threaded directory walkers on a simulated high-latency
+filesystem, such as NFS or EFS, where every directory listing and `is_dir` call is a
+network round trip.
+
+Usage:
+
+    python benchmarks/walkers.py [--latency MS] [--dirs N] [--files N] [--threads N]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lambda_package.lambda_package import find_paths, find_paths_threaded  # noqa
+
+
+class LatencyPath:
+    """
+    Wraps a `pathlib` path, adding a fixed delay to each filesystem call made by the
+    walkers
+    """
+
+    def __init__(self, path: Path, latency: float):
+        self.path = path
+        self.latency = latency
+        self.name = path.name
+
+    def iterdir(self):
+        time.sleep(self.latency)
+        return [LatencyPath(p, self.latency) for p in self.path.iterdir()]
+
+    def is_dir(self):
+        time.sleep(self.latency)
+        return self.path.is_dir()
+
+    def __fspath__(self):
+        return str(self.path)
+
+    def __str__(self):
+        return str(self.path)
+
+
+def create_tree(root: Path, dirs: int, files: int):
+    """
+    Creates a two-level directory tree with `dirs` directories at each level and
+    `files` files in each leaf directory, plus an excluded `__pycache__` directory
+    """
+    for i in range(dirs):
+        for j in range(dirs):
+            leaf = root.joinpath(f"pkg{i}", f"mod{j}")
+            leaf.mkdir(parents=True)
+            leaf.joinpath("__pycache__").mkdir()
+            leaf.joinpath("__pycache__", "x.pyc").write_text("")
+            for k in range(files):
+                leaf.joinpath(f"file{k}.py").write_text("")
+
+
+def measure(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return (time.perf_counter() - start, result)
+
+
+def main():
+    parser = argparse.ArgumentParser("walkers")
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--dirs", type=int, default=8)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    excludes = ["__pycache__/", "*.pyc"]
+
+    with TemporaryDirectory() as temp_dir:
+        create_tree(Path(temp_dir), args.dirs, args.files)
+        root = LatencyPath(Path(temp_dir), args.latency / 1000)
+
+        (sequential_time, (sequential_paths, _)) = measure(find_paths, root, excludes)
+        (threaded_time, (threaded_paths, _)) = measure(
+            find_paths_threaded, root, excludes, max_workers=args.threads
+        )
+
+    same_order = [str(p) for p in sequential_paths] == [str(p) for p in threaded_paths]
+    print(f"Files found:          {len(sequential_paths)}")
+    print(f"Simulated latency:    {args.latency:.1f} ms per call")
+    print(f"Sequential walker:    {sequential_time:.3f} s")
+    print(f"Threaded walker:      {threaded_time:.3f} s ({args.threads} threads)")
+    print(f"Speed-up:             {sequential_time / threaded_time:.1f}x")
+    print(f"Identical results:    {same_order}")
+
+
+if __name__ == "__main__":
+    main()
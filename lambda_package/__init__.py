@@ -1,5 +1,11 @@
 from lambda_package.configuration import Configuration
 
-from .lambda_package import find_paths, package
+from .lambda_package import find_paths, iter_paths, package, stream_package
 
-__all__ = ["package", "find_paths", "Configuration"]
+__all__ = [
+    "package",
+    "stream_package",
+    "find_paths",
+    "iter_paths",
+    "Configuration",
+]
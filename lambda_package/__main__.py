@@ -1,8 +1,21 @@
 import argparse
+import json
+from datetime import datetime
+from pathlib import Path
 
 from lambda_package.configuration import Configuration
 
-from .lambda_package import package
+from .benchmark import benchmark_package, compare_import_times
+from .cache import get_cache
+from .events import (
+    Events,
+    ProgressBar,
+    format_dedupe_report,
+    format_tree_shaking_report,
+)
+from .lambda_package import stream_package, validate_configuration
+from .layers import get_layer_outputs
+from .preview import format_size, iter_tree
 
 
 def main():
@@ -14,21 +27,71 @@ def main():
     args = parser.parse_args()
     configuration = Configuration.create_from_config_file()
     configuration.output = args.output if args.output else configuration.output
+    configuration.output_dir = (
+        args.output_dir if args.output_dir else configuration.output_dir
+    )
+    configuration.image_output = (
+        args.image_output if args.image_output else configuration.image_output
+    )
+    configuration.handler = args.handler if args.handler else configuration.handler
 
-    (_, tree) = package(root_path=args.path, configuration=configuration)
+    if args.cache:
+        run_cache_command(args.cache, configuration)
+        return
 
-    if not configuration.output and not configuration.layer_output:
-        print_tree(tree)
-    else:
-        if configuration.output:
-            print(f"Successfully created package {configuration.output}")
-        if configuration.requirements and configuration.layer_output:
-            print(f"Successfully created layer package {configuration.layer_output}")
+    if not (
+        configuration.output
+        or configuration.layer_output
+        or configuration.output_dir
+        or configuration.image_output
+    ):
+        configuration = validate_configuration(configuration)
+        print_tree(
+            args.path,
+            configuration.exclude,
+            max_depth=args.depth,
+            collapse=args.collapse,
+            as_json=args.json,
+        )
+        return
+
+    listeners = [ProgressBar()] if args.progress else []
+    if configuration.tree_shaking and not args.progress:
+        listeners.append(print_tree_shaking_report)
+    if configuration.dedupe and not args.progress:
+        listeners.append(print_dedupe_report)
+    events = Events(listeners) if listeners else None
+    stream_package(root_path=args.path, configuration=configuration, events=events)
+
+    if configuration.output:
+        print(f"Successfully created package {configuration.output}")
+    if configuration.requirements and configuration.layer_output:
+        for layer_output in get_layer_outputs(
+            configuration.layer_output, configuration.layer_count
+        ):
+            if layer_output.exists():
+                print(f"Successfully created layer package {layer_output}")
+    if configuration.output_dir:
+        print(f"Successfully updated directory {configuration.output_dir}")
+    if configuration.image_output:
+        print(f"Successfully created image {configuration.image_output}")
+
+    if args.benchmark:
+        report = benchmark_package(configuration)
+        baseline = (
+            benchmark_package(
+                configuration, output=args.compare, layer_output=args.compare_layer
+            )
+            if args.compare or args.compare_layer
+            else None
+        )
+        print_import_times(report, baseline)
 
 
 def add_arguments(parser):
     parser.add_argument(
         "path",
+        nargs="?",
         default=".",
         help="The path of the package source files.",
     )
@@ -38,33 +101,190 @@ def add_arguments(parser):
         required=False,
         help="Specifies file to which the output is written.",
     )
+    parser.add_argument(
+        "--output-dir",
+        required=False,
+        help="Specifies a directory to which the uncompressed output is written.",
+    )
+    parser.add_argument(
+        "--image-output",
+        required=False,
+        help="Specifies a directory to which an OCI container image is written.",
+    )
+    parser.add_argument(
+        "--cache",
+        choices=["info", "prune", "clear"],
+        required=False,
+        help="Inspects, prunes or clears the build cache instead of packaging.",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        required=False,
+        help="The number of directory levels to display in the preview.",
+    )
+    parser.add_argument(
+        "--collapse",
+        type=int,
+        default=100,
+        help="Collapses directories with more entries than this in the preview.",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Prints the preview as one JSON object per line.",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Displays the progress of the build and the output of pip.",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Measures the import time of the handler in the built package.",
+    )
+    parser.add_argument(
+        "--handler",
+        required=False,
+        help="The Lambda handler to import when benchmarking, e.g. `app.handler`.",
+    )
+    parser.add_argument(
+        "--compare",
+        required=False,
+        help="A previously built package to compare the benchmark against.",
+    )
+    parser.add_argument(
+        "--compare-layer",
+        required=False,
+        help="A previously built layer package to compare the benchmark against.",
+    )
 
 
-def print_tree(files_tree):
+def print_tree(root_path, excludes, max_depth=None, collapse=None, as_json=False):
     """
-    Displays a tree of the files about to be zipped.
+    Displays a tree of the files about to be zipped.  The tree is printed while the
+    directory is being walked, so that the preview of a large package starts
+    immediately.
 
-    :param files_tree   A recursive tuple in the form `(name, dirs, files)`,
-                        similar to the output of `os.walk`.
+    :param root_path    The path of the package source files.
+    :param excludes     A list of .gitignore exclude patterns.
+    :param max_depth    The number of directory levels to display before collapsing.
+    :param collapse     Directories with more entries than this are collapsed.
+    :param as_json      If `True`, prints one JSON object per line instead of a tree.
     """
-    print("List of the files that would be included in the package:\n")
+    root_path = Path(root_path)
+    entries = iter_tree(root_path, excludes, max_depth=max_depth, collapse=collapse)
 
-    def print_tree_recurse(files_tree, depth):
-        spacer = "│  " * (depth)
+    if as_json:
+        for entry in entries:
+            print(
+                json.dumps(
+                    {
+                        "path": entry.path.relative_to(root_path).as_posix(),
+                        "type": entry.kind,
+                        "depth": entry.depth,
+                        "size": entry.size,
+                        "files": entry.file_count,
+                    }
+                )
+            )
+        return
 
-        # Recursively print all subdirectories
-        for d in files_tree[1]:
-            if len(d[1]) > 0 or len(d[2]) > 0:
-                print(f"{spacer}└─ {d[0]}")
-                print_tree_recurse(d, depth + 1)
+    print("List of the files that would be included in the package:\n")
 
-        # Print all files in current directory
-        for f in files_tree[2]:
-            print(f"{spacer}└─ {f.name}")
+    for entry in entries:
+        spacer = "│  " * entry.depth
+        if entry.kind == "summary":
+            print(
+                f"{spacer}└─ {entry.path.name}/ ({entry.file_count} files, "
+                f"{format_size(entry.size)})"
+            )
+        else:
+            print(f"{spacer}└─ {entry.path.name}")
 
-    print_tree_recurse(files_tree, 0)
     print("\nTo create the actual zip, you need to specify the --output parameter")
 
 
+def run_cache_command(command, configuration):
+    """
+    Runs a cache management command.
+
+    :param command          `info` to list the cache entries, `prune` to evict the
+                            least recently used entries down to `cache_size_limit`,
+                            or `clear` to evict every entry.
+    :param configuration    The packager configuration.
+    """
+    cache = get_cache(configuration)
+
+    if command == "prune":
+        evicted = cache.prune()
+        print(f"Evicted {len(evicted)} entries from {cache.root}")
+    elif command == "clear":
+        evicted = cache.clear()
+        print(f"Evicted {len(evicted)} entries from {cache.root}")
+    else:
+        entries = cache.entries()
+        print(f"Cache directory: {cache.root}\n")
+        for entry in reversed(entries):
+            last_access = datetime.fromtimestamp(entry.last_access)
+            print(
+                f"  {format_size(entry.size):>10}  {last_access:%Y-%m-%d %H:%M}  "
+                f"{entry.name}"
+            )
+
+        limit = format_size(cache.size_limit) if cache.size_limit else "none"
+        total = format_size(sum(entry.size for entry in entries))
+        print(f"\n{len(entries)} entries, {total} (limit: {limit})")
+
+
+def print_tree_shaking_report(events):
+    """
+    An event listener which prints the size saved by tree shaking
+    """
+    for event in events:
+        if event.kind == "tree_shaken":
+            print(format_tree_shaking_report(event))
+
+
+def print_dedupe_report(events):
+    """
+    An event listener which prints the size saved by deduplication
+    """
+    for event in events:
+        if event.kind == "deduplicated":
+            print(format_dedupe_report(event))
+
+
+def print_import_times(report, baseline=None, limit=20):
+    """
+    Displays the total import time of the handler module and the slowest modules.  If
+    a baseline report is given, the differences between the two builds are shown.
+
+    :param report       The `ImportTimeReport` of the current build.
+    :param baseline     An optional `ImportTimeReport` of a previous build.
+    :param limit        The maximum number of modules to display.
+    """
+    print(f"\nImport time of {report.module}: {report.total_us / 1000:.1f} ms")
+
+    if baseline is None:
+        print("\nSlowest modules (self time):")
+        modules = sorted(report.modules, key=lambda m: m.self_us, reverse=True)
+        for m in modules[:limit]:
+            print(f"  {m.self_us / 1000:8.1f} ms  {m.name}")
+        return
+
+    print(f"Import time of the baseline: {baseline.total_us / 1000:.1f} ms")
+    print(f"Difference: {(report.total_us - baseline.total_us) / 1000:+.1f} ms")
+    print("\nLargest differences (self time, baseline -> current):")
+
+    def format_time(us):
+        return f"{us / 1000:8.1f} ms" if us is not None else "       -   "
+
+    differences = compare_import_times(baseline, report)
+    for (name, baseline_us, current_us) in differences[:limit]:
+        print(f"  {format_time(baseline_us)} -> {format_time(current_us)}  {name}")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,388 @@
+import asyncio
+import os
+import zipfile
+from asyncio.subprocess import PIPE, STDOUT
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+from shutil import copy, rmtree
+from subprocess import CalledProcessError
+from typing import List, Tuple
+
+from docker import from_env
+from docker.errors import ContainerError
+
+from lambda_package.cache import Cache, get_cache
+from lambda_package.configuration import Configuration
+from lambda_package.events import Events
+from lambda_package.lambda_package import (
+    run_package,
+    sort_zip_package_paths,
+    validate_configuration,
+    write_package_entries,
+)
+from lambda_package.requirements import (
+    BuildErrors,
+    DockerImagePrefix,
+    WorkspaceFallbackMessage,
+    build_requirements,
+    create_temp_requirements_directory,
+    follow_container,
+    get_build_method,
+    get_disk_configuration,
+    get_docker_command,
+    get_download_commands,
+    get_local_install_command,
+    normalize_version,
+    read_requirement_specs,
+)
+
+"""
+The functions in this file are `asyncio` counterparts of `package` and
+`build_requirements`, for services which package many functions at the same time.  pip
+runs as an asyncio subprocess, and the blocking work, such as walking directories,
+compressing files and calling the Docker API, runs in an executor, by default the event
+loop's.  Cancelling a build kills its pip processes or Docker container, and removes its
+partial output.  `package_async` runs the same packaging steps as `package`, so that
+both always produce the same outputs.
+"""
+
+ZipBatchSize = 64
+"""
+The number of files compressed in each executor call by `zip_package_async`.  A
+cancelled build stops after the current batch.
+"""
+
+
+async def package_async(
+    root_path=".",
+    configuration: Configuration = None,
+    events: Events = None,
+    executor: Executor = None,
+):
+    """
+    The `asyncio` counterpart of `package`, with the same parameters and return value.
+    The packaging steps of `package` run in the executor, except for the requirements
+    build, which runs in the event loop with `build_requirements_async`.  If the task
+    is cancelled, the build is cancelled, and the steps already under way are finished
+    before the cancellation is raised.
+
+    :param executor     The executor which runs blocking work, or `None` for the event
+                        loop's default executor.  The blocking work of the requirements
+                        build runs in the default executor, as the packaging steps hold
+                        a worker of `executor` while they wait for the build.
+    """
+    loop = asyncio.get_running_loop()
+    configuration = await loop.run_in_executor(
+        executor, validate_configuration, configuration
+    )
+    builds = []
+
+    def build(configuration: Configuration, events: Events) -> Path:
+        future = asyncio.run_coroutine_threadsafe(
+            build_requirements_async(configuration, events), loop
+        )
+        builds.append(future)
+        return future.result()
+
+    future = loop.run_in_executor(
+        executor,
+        partial(run_package, root_path, configuration, events, build=build),
+    )
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        for build_future in builds:
+            build_future.cancel()
+        await asyncio.wait([future])
+        # The steps fail with the cancellation of the build, which is raised instead
+        if not future.cancelled():
+            future.exception()
+        raise
+
+
+async def zip_package_async(
+    paths: List[Tuple[Path, Path]],
+    fp: str,
+    configuration: Configuration = None,
+    events: Events = None,
+    executor: Executor = None,
+):
+    """
+    The `asyncio` counterpart of `zip_package`.  Files are compressed in the executor
+    in batches of `ZipBatchSize`.  If the build is cancelled, the current batch is
+    finished and the partial zip file is removed.
+    """
+    loop = asyncio.get_running_loop()
+    if configuration is not None and configuration.reproducible:
+        paths = sort_zip_package_paths(paths)
+
+    try:
+        with zipfile.ZipFile(
+            file=fp, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=9
+        ) as z:
+            for offset in range(0, len(paths), ZipBatchSize):
+                batch = paths[offset : offset + ZipBatchSize]
+                await finish_in_executor(
+                    loop,
+                    executor,
+                    partial(write_package_entries, z, batch, configuration, events),
+                )
+    except asyncio.CancelledError:
+        os.unlink(fp)
+        raise
+
+
+async def build_requirements_async(
+    configuration: Configuration, events: Events = None, executor: Executor = None
+) -> Path:
+    """
+    The `asyncio` counterpart of `build_requirements`.  Docker builds, and local builds
+    which do not use the wheel store, run natively in the event loop and can be
+    cancelled at any point.  Other builds, such as the `"platform"` build method and
+    builds in the builder pool, run `build_requirements` in the executor.
+    """
+    loop = asyncio.get_running_loop()
+    build_method = get_build_method(configuration)
+
+    if build_method == "docker" and not configuration.builder_pool:
+        build = partial(build_requirements_docker_async, executor=executor)
+    elif build_method == "local" and not configuration.wheel_store:
+        build = partial(build_requirements_local_async, executor=executor)
+    else:
+        return await loop.run_in_executor(
+            executor, build_requirements, configuration, events
+        )
+
+    # A failed build in the workspace is retried on disk, as in `build_requirements`
+    disk_configuration = await loop.run_in_executor(
+        executor, get_disk_configuration, configuration
+    )
+    try:
+        requirements_dir = await build(configuration, events)
+    except BuildErrors:
+        if disk_configuration is None:
+            raise
+        if events is not None:
+            events.emit("log", message=WorkspaceFallbackMessage)
+        requirements_dir = await build(disk_configuration, events)
+
+    await loop.run_in_executor(executor, get_cache(configuration).prune)
+    return requirements_dir
+
+
+async def build_requirements_docker_async(
+    configuration: Configuration, events: Events = None, executor: Executor = None
+) -> Path:
+    """
+    The `asyncio` counterpart of `build_requirements_docker`.  Cancelling the build
+    kills and removes the container.
+    """
+    loop = asyncio.get_running_loop()
+    temp_dir = await loop.run_in_executor(
+        executor, create_temp_requirements_directory, configuration
+    )
+    requirements_src_path = Path(configuration.requirements)
+    requirements_dest_path = temp_dir.joinpath(requirements_src_path.name)
+    vols = {str(temp_dir): {"bind": "/var/task", "mode": "z"}}
+    python_version = normalize_version(configuration.python_version)
+    cache = get_cache(configuration)
+    wheelhouse = None
+
+    try:
+        await loop.run_in_executor(
+            executor, copy, str(requirements_src_path), str(requirements_dest_path)
+        )
+        client = await loop.run_in_executor(executor, from_env)
+
+        cache_name = f"docker_{python_version}"
+        async with use_cache_async(cache, cache_name, executor) as cache_dir:
+            image = f"{DockerImagePrefix}{python_version}"
+            (command, wheelhouse) = await loop.run_in_executor(
+                executor,
+                get_docker_command,
+                configuration,
+                requirements_dest_path.name,
+                cache_dir,
+                vols,
+            )
+
+            container = await finish_in_executor(
+                loop,
+                executor,
+                partial(
+                    client.containers.run, image, command, volumes=vols, detach=True
+                ),
+                on_cancel=lambda container: container.remove(force=True),
+            )
+            try:
+                exit_status = await loop.run_in_executor(
+                    executor, follow_container, container, events
+                )
+            finally:
+                # Removing the container also kills it if the build was cancelled
+                await finish_in_executor(
+                    loop, executor, partial(container.remove, force=True)
+                )
+
+            if exit_status:
+                raise ContainerError(container, exit_status, command, image, None)
+    except BaseException:
+        await remove_directory_async(temp_dir, executor)
+        raise
+    finally:
+        if wheelhouse is not None:
+            await remove_directory_async(wheelhouse, executor)
+
+    await loop.run_in_executor(executor, requirements_dest_path.unlink)
+    return temp_dir
+
+
+async def build_requirements_local_async(
+    configuration: Configuration, events: Events = None, executor: Executor = None
+) -> Path:
+    """
+    The `asyncio` counterpart of `build_requirements_local`, without the wheel store.
+    Cancelling the build kills the running pip processes.
+    """
+    loop = asyncio.get_running_loop()
+    temp_dir = await loop.run_in_executor(
+        executor, create_temp_requirements_directory, configuration
+    )
+    python_version = normalize_version(configuration.python_version)
+    cache = get_cache(configuration)
+    wheelhouse = None
+
+    try:
+        cache_name = f"local_{python_version}"
+        async with use_cache_async(cache, cache_name, executor) as cache_dir:
+            command = get_local_install_command(configuration, temp_dir, cache_dir)
+            split_requirements = (
+                read_requirement_specs(configuration.requirements)
+                if configuration.parallel_downloads
+                else None
+            )
+
+            if split_requirements is None:
+                await check_pip_async(command, events)
+                return temp_dir
+
+            wheelhouse = await loop.run_in_executor(
+                executor,
+                create_temp_requirements_directory,
+                configuration,
+                "wheelhouse",
+            )
+            download_commands = get_download_commands(
+                configuration,
+                split_requirements,
+                [command[0], "download", "--cache-dir", str(cache_dir)],
+                wheelhouse,
+            )
+            semaphore = asyncio.Semaphore(configuration.parallel_downloads)
+
+            async def download(download_command):
+                async with semaphore:
+                    return await run_pip_async(download_command, events)
+
+            await asyncio.gather(*[download(c) for c in download_commands])
+
+            find_links = ["--find-links", str(wheelhouse)]
+            if await run_pip_async(command + ["--no-index"] + find_links, events):
+                await check_pip_async(command + find_links, events)
+    except BaseException:
+        await remove_directory_async(temp_dir, executor)
+        raise
+    finally:
+        if wheelhouse is not None:
+            await remove_directory_async(wheelhouse, executor)
+
+    return temp_dir
+
+
+async def check_pip_async(command: List[str], events: Events = None):
+    """
+    The `asyncio` counterpart of `check_pip`
+
+    :raises CalledProcessError if the command fails
+    """
+    returncode = await run_pip_async(command, events)
+    if returncode:
+        raise CalledProcessError(returncode, command)
+
+
+async def run_pip_async(command: List[str], events: Events = None) -> int:
+    """
+    The `asyncio` counterpart of `run_pip`.  If the task is cancelled, the process is
+    killed.
+
+    :return The exit code of the command
+    """
+    output = PIPE if events is not None else None
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=output, stderr=STDOUT if output else None
+    )
+
+    try:
+        if events is not None:
+            async for line in process.stdout:
+                events.emit("log", message=line.decode(errors="replace"))
+        return await process.wait()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+
+
+@asynccontextmanager
+async def use_cache_async(cache: Cache, name: str, executor: Executor = None):
+    """
+    The `asyncio` counterpart of `Cache.use`.  The cache directory's lock is acquired
+    and released in the executor, as acquiring it waits for any eviction of the
+    directory.
+    """
+    loop = asyncio.get_running_loop()
+    context = cache.use(name)
+    cache_dir = await finish_in_executor(
+        loop,
+        executor,
+        context.__enter__,
+        on_cancel=lambda _: context.__exit__(None, None, None),
+    )
+    try:
+        yield cache_dir
+    finally:
+        await finish_in_executor(
+            loop, executor, partial(context.__exit__, None, None, None)
+        )
+
+
+async def remove_directory_async(directory: Path, executor: Executor = None):
+    """
+    Removes a directory in the executor, and waits for its removal even if the task is
+    cancelled
+    """
+    loop = asyncio.get_running_loop()
+    await finish_in_executor(
+        loop, executor, partial(rmtree, str(directory), ignore_errors=True)
+    )
+
+
+async def finish_in_executor(loop, executor: Executor, function, on_cancel=None):
+    """
+    Runs a function in the executor and returns its result.  If the task is cancelled,
+    the function is still waited for before the cancellation is raised, for work which
+    must not be interrupted, such as writing to a zip file.
+
+    :param on_cancel    An optional function which is called in the executor with the
+                        result if the task was cancelled, to release it
+    """
+    future = loop.run_in_executor(executor, function)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        if on_cancel is not None and future.exception() is None:
+            await loop.run_in_executor(executor, on_cancel, future.result())
+        raise
@@ -0,0 +1,504 @@
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import time
+import zlib
+from io import BytesIO
+from shutil import copyfileobj
+from typing import Optional
+from zipfile import (
+    ZIP64_LIMIT,
+    ZIP_DEFLATED,
+    ZIP_STORED,
+    ZipFile,
+    ZipInfo,
+    sizeFileHeader,
+)
+
+"""
+The functions in this file help to write entries into the package zip files.
+"""
+
+LargeFileChunkSize = 16 * 1024 * 1024
+"""
+The number of bytes passed to the compressor at a time when writing a large file
+"""
+
+CompressibilitySampleSize = 64 * 1024
+"""
+The size of each sample which is compressed to estimate how well a file compresses
+"""
+
+CompressibilityRatio = 0.95
+"""
+Files whose samples do not compress below this ratio are stored uncompressed
+"""
+
+ReproducibleDateTime = (1980, 1, 1, 0, 0, 0)
+"""
+The timestamp of every entry in reproducible archives, unless the `SOURCE_DATE_EPOCH`
+environment variable is set.  This is the earliest date which zip files can store.
+"""
+
+
+def write_large_file(
+    z: ZipFile, filename: str, arcname: str, compresslevel=None, date_time=None
+):
+    """
+    Writes a large file into a zip archive using a memory-mapped read and large
+    compression buffers, instead of the small chunks used by `ZipFile.write`.  The file
+    is stored uncompressed if a sample of it shows that it does not compress well.
+    Zip64 extensions are used automatically if the file requires them.
+
+    :param z                The zip archive, which must be open for writing
+    :param filename         The path of the file to add
+    :param arcname          The name of the file within the archive
+    :param compresslevel    The deflate compression level
+    :param date_time        If given, the entry's metadata is normalized with this
+                            timestamp, as described in `get_zip_info`
+    """
+    zinfo = get_zip_info(filename, arcname, date_time)
+    set_compress_level(zinfo, compresslevel if compresslevel is not None else 9)
+
+    with open(filename, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as m:
+        advise(m, "MADV_SEQUENTIAL")
+        zinfo.compress_type = ZIP_DEFLATED if is_compressible(m) else ZIP_STORED
+
+        with z.open(zinfo, "w") as dest:
+            for offset in range(0, len(m), LargeFileChunkSize):
+                dest.write(m[offset : offset + LargeFileChunkSize])
+
+                # Release the pages which have been written, to keep memory use flat
+                advise(m, "MADV_DONTNEED", offset, LargeFileChunkSize)
+
+
+def write_cached_file(
+    z: ZipFile,
+    artifact_cache,
+    filename: str,
+    arcname: str,
+    compresslevel=9,
+    date_time=None,
+):
+    """
+    Writes a file into a zip archive, reusing its compressed bytes from the artifact
+    cache if the same content has been compressed before, by this machine or by any
+    other machine sharing the remote cache.  Otherwise the file is compressed and its
+    compressed bytes are added to the cache.  The cache key is the SHA-256 digest of
+    the file's content and the compression level.  Entries downloaded from the remote
+    cache are decompressed once and checked against the file, so that a truncated or
+    corrupted artifact is replaced rather than written into the zip.
+
+    :param z                The zip archive, which must be open for writing
+    :param artifact_cache   The `ArtifactCache` in which compressed entries are stored
+    :param filename         The path of the file to add
+    :param arcname          The name of the file within the archive
+    :param compresslevel    The deflate compression level
+    :param date_time        If given, the entry's metadata is normalized with this
+                            timestamp, as described in `get_zip_info`
+    """
+    (digest, crc, file_size) = hash_file(filename)
+    key = f"{digest}-deflate{compresslevel}"
+
+    zinfo = get_zip_info(filename, arcname, date_time)
+    zinfo.compress_type = ZIP_DEFLATED
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+
+    with artifact_cache.fetch(
+        "entries", key, lambda path: is_deflate_stream_of(str(path), crc, file_size)
+    ) as cached_path:
+        if cached_path is not None:
+            with open(str(cached_path), "rb") as src:
+                write_raw_entry(z, zinfo, src, os.stat(str(cached_path)).st_size)
+            return
+
+    # The compressed bytes are written from the temporary file, before it is moved
+    # into the cache where it could be evicted
+    temp_path = artifact_cache.cache.create_temp_file()
+    try:
+        with open(str(temp_path), "wb") as dest:
+            compress_file(filename, dest, compresslevel)
+        with open(str(temp_path), "rb") as src:
+            write_raw_entry(z, zinfo, src, os.stat(str(temp_path)).st_size)
+    except BaseException:
+        temp_path.unlink()
+        raise
+    artifact_cache.store("entries", key, temp_path, move=True)
+
+
+def write_compressed_file(
+    z: ZipFile, compressor, filename: str, arcname: str, compresslevel=9, date_time=None
+):
+    """
+    Writes a file into a zip archive using a compressor backend from the `compressors`
+    module, instead of the `zlib` compressor used by `ZipFile.write`.
+
+    :param z                The zip archive, which must be open for writing
+    :param compressor       The `Compressor` backend
+    :param filename         The path of the file to add
+    :param arcname          The name of the file within the archive
+    :param compresslevel    The deflate compression level
+    :param date_time        If given, the entry's metadata is normalized with this
+                            timestamp, as described in `get_zip_info`
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    zinfo = get_zip_info(filename, arcname, date_time)
+    write_data(z, zinfo, data, compressor, compresslevel)
+
+
+def write_data(
+    z: ZipFile, zinfo: ZipInfo, data: bytes, compressor=None, compresslevel=None
+):
+    """
+    Writes an entry whose content has already been read into a zip archive, with the
+    compressor backend if one is given, or with the archive's compression otherwise.
+
+    :param z                The zip archive, which must be open for writing
+    :param zinfo            The entry's `ZipInfo`, as returned by `get_zip_info`
+    :param data             The content of the entry
+    :param compressor       An optional `Compressor` backend, used instead of `zlib`
+    :param compresslevel    The deflate compression level, by default the archive's
+    """
+    compresslevel = compresslevel if compresslevel is not None else z.compresslevel
+
+    if compressor is None:
+        zinfo.compress_type = z.compression
+        set_compress_level(zinfo, compresslevel)
+        z.writestr(zinfo, data)
+        return
+
+    zinfo.compress_type = ZIP_DEFLATED
+    zinfo.CRC = compressor.crc32(data)
+    zinfo.file_size = len(data)
+
+    compressed = compressor.compress(data, compresslevel)
+    write_raw_entry(z, zinfo, BytesIO(compressed), len(compressed))
+
+
+def write_file(z: ZipFile, filename: str, arcname: str, date_time=None):
+    """
+    Writes a file into a zip archive like `ZipFile.write`, with the archive's
+    compression, but with the entry's metadata normalized as described in
+    `get_zip_info`.
+    """
+    zinfo = get_zip_info(filename, arcname, date_time)
+    zinfo.compress_type = z.compression
+    set_compress_level(zinfo, z.compresslevel)
+
+    with open(filename, "rb") as src, z.open(zinfo, "w") as dest:
+        copyfileobj(src, dest, 1024 * 1024)
+
+
+def read_file_entry(filename: str, arcname: str, max_size: int, date_time=None):
+    """
+    Reads a file and its `ZipInfo` for `write_data`, if it is at most `max_size` bytes.
+    This is called ahead of the compressor, from the threads of `prefetch`.
+
+    :return A tuple with the `ZipInfo` and the content of the file, or `None` if the
+            file is too large
+    """
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size > max_size:
+            return None
+        data = f.read()
+
+    return (get_zip_info(filename, arcname, date_time), data)
+
+
+def get_zip_info(filename: str, arcname: str, date_time=None) -> ZipInfo:
+    """
+    Creates the `ZipInfo` of a file.  If `date_time` is given, the metadata does not
+    depend on the file system or the platform: the entry has that timestamp, and is
+    readable by everyone and executable only if the file is executable by its owner.
+
+    :param filename     The path of the file
+    :param arcname      The name of the file within the archive
+    :param date_time    The entry's timestamp, as a tuple of six integers, or `None` to
+                        use the file's modification time and permissions
+    """
+    zinfo = ZipInfo.from_file(filename, arcname)
+
+    if date_time is not None:
+        mode = 0o755 if os.stat(filename).st_mode & stat.S_IXUSR else 0o644
+        zinfo.date_time = date_time
+        zinfo.external_attr = (stat.S_IFREG | mode) << 16
+        zinfo.create_system = 3
+
+    return zinfo
+
+
+def get_reproducible_date_time():
+    """
+    Returns the timestamp of the entries of reproducible archives: the time of the
+    `SOURCE_DATE_EPOCH` environment variable if it is set, clamped to the range which
+    zip files can store, or `ReproducibleDateTime` otherwise.
+    """
+    source_date_epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if not source_date_epoch:
+        return ReproducibleDateTime
+
+    date_time = tuple(time.gmtime(int(source_date_epoch))[:6])
+    return max(ReproducibleDateTime, min(date_time, (2107, 12, 31, 23, 59, 58)))
+
+
+def write_raw_entry(z: ZipFile, zinfo: ZipInfo, source, compress_size: int):
+    """
+    Writes an entry whose data has already been compressed into a zip archive, without
+    decompressing and compressing it again.  `zinfo` must have its `compress_type`,
+    `CRC` and `file_size` set to match the compressed data.  If the internals of
+    `ZipFile` which this relies on are missing, the data is decompressed and written
+    with the public API instead.
+
+    :param z                The zip archive, which must be open for writing
+    :param zinfo            The entry's `ZipInfo`
+    :param source           A readable binary file object of the compressed data
+    :param compress_size    The number of bytes of compressed data
+    """
+    if not all(hasattr(z, name) for name in ZipFileInternals):
+        write_decompressed_entry(z, zinfo, source)
+        return
+
+    zinfo.compress_size = compress_size
+    zinfo.flag_bits = 0x00
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+    write_raw_header_and_data(z, zinfo, source)
+
+
+def write_decompressed_entry(z: ZipFile, zinfo: ZipInfo, source):
+    """
+    Writes an entry from its compressed data by decompressing it, for `ZipFile`
+    implementations without the internals used by `write_raw_entry`
+    """
+    if zinfo.compress_type == ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-15)
+    elif zinfo.compress_type != ZIP_STORED:
+        raise NotImplementedError(f"Unsupported compression: {zinfo.compress_type}")
+
+    with z.open(zinfo, "w") as dest:
+        for chunk in iter(lambda: source.read(LargeFileChunkSize), b""):
+            if zinfo.compress_type == ZIP_DEFLATED:
+                chunk = decompressor.decompress(chunk)
+            dest.write(chunk)
+        if zinfo.compress_type == ZIP_DEFLATED:
+            dest.write(decompressor.flush())
+
+
+def is_deflate_stream_of(filename: str, crc: int, file_size: int) -> bool:
+    """
+    Returns whether a file is a complete raw deflate stream of data with the given
+    CRC-32 and size, by decompressing it in chunks
+    """
+    decompressor = zlib.decompressobj(-15)
+    (actual_crc, actual_size) = (0, 0)
+
+    try:
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(LargeFileChunkSize), b""):
+                while chunk and not decompressor.eof:
+                    data = decompressor.decompress(chunk, LargeFileChunkSize)
+                    actual_crc = zlib.crc32(data, actual_crc)
+                    actual_size += len(data)
+                    if actual_size > file_size:
+                        return False
+                    chunk = decompressor.unconsumed_tail
+                if decompressor.unused_data or chunk:
+                    return False
+            data = decompressor.flush()
+    except zlib.error:
+        return False
+
+    actual_crc = zlib.crc32(data, actual_crc)
+    actual_size += len(data)
+    return decompressor.eof and (actual_crc, actual_size) == (crc, file_size)
+
+
+def copy_raw_entry(z: ZipFile, source: ZipFile, zinfo: ZipInfo):
+    """
+    Copies an entry from one zip archive into another as its compressed bytes, without
+    decompressing and compressing it again.  The entry keeps its name, timestamp,
+    permissions and compression method.
+
+    :param z        The zip archive, which must be open for writing
+    :param source   The zip archive to copy from, which must be open for reading
+    :param zinfo    The `ZipInfo` of the entry in `source`
+    """
+    copied = ZipInfo(zinfo.filename, zinfo.date_time)
+    copied.compress_type = zinfo.compress_type
+    copied.CRC = zinfo.CRC
+    copied.file_size = zinfo.file_size
+    copied.external_attr = zinfo.external_attr
+    copied.create_system = zinfo.create_system
+
+    write_raw_entry(z, copied, open_raw_entry(source, zinfo), zinfo.compress_size)
+
+
+class SectionReader:
+    """
+    A readable binary file object over the next `size` bytes of another file object
+    """
+
+    def __init__(self, fp, size: int):
+        self.fp = fp
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fp.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def compress_file(filename: str, dest, compresslevel=9):
+    """
+    Compresses a file into a raw deflate stream, as stored in zip archives.
+
+    :return A tuple with the CRC-32, the size, and the compressed size of the file
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    (crc, file_size, compress_size) = (0, 0, 0)
+
+    with open(filename, "rb") as src:
+        for chunk in iter(lambda: src.read(LargeFileChunkSize), b""):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            data = compressor.compress(chunk)
+            compress_size += len(data)
+            dest.write(data)
+
+    data = compressor.flush()
+    dest.write(data)
+    return (crc, file_size, compress_size + len(data))
+
+
+def hash_file(filename: str):
+    """
+    Reads a file once to compute its content digest and CRC-32.
+
+    :return A tuple with the hex SHA-256 digest, the CRC-32, and the size of the file
+    """
+    sha256 = hashlib.sha256()
+    (crc, file_size) = (0, 0)
+
+    with open(filename, "rb") as src:
+        for chunk in iter(lambda: src.read(1024 * 1024), b""):
+            sha256.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+
+    return (sha256.hexdigest(), crc, file_size)
+
+
+def is_compressible(data) -> bool:
+    """
+    Estimates whether data is worth compressing by compressing samples from its start,
+    middle and end at a fast compression level
+    """
+    size = len(data)
+    if size <= CompressibilitySampleSize * 3:
+        samples = [data[:]]
+    else:
+        middle = (size - CompressibilitySampleSize) // 2
+        samples = [
+            data[offset : offset + CompressibilitySampleSize]
+            for offset in [0, middle, size - CompressibilitySampleSize]
+        ]
+
+    raw_size = sum(len(sample) for sample in samples)
+    compressed_size = sum(len(zlib.compress(sample, 1)) for sample in samples)
+    return compressed_size < raw_size * CompressibilityRatio
+
+
+def is_large_file(filename: str, threshold) -> bool:
+    """
+    Returns `True` if a file should be written with `write_large_file`
+    """
+    return threshold is not None and os.stat(filename).st_size >= max(threshold, 1)
+
+
+def advise(m: mmap.mmap, option: str, start=0, length=None):
+    """
+    Calls `madvise` on a memory map if it is supported by the platform
+    """
+    if hasattr(m, "madvise") and hasattr(mmap, option):
+        length = length if length is not None else len(m)
+        m.madvise(getattr(mmap, option), start, min(length, len(m) - start))
+
+
+# The functions below are the only ones which use the internals of `zipfile`.  They are
+# tested with every supported version of Python, see `tox.ini`.
+
+ZipFileInternals = [
+    "_lock",
+    "_writing",
+    "_seekable",
+    "_writecheck",
+    "_didModify",
+    "start_dir",
+    "fp",
+    "filelist",
+    "NameToInfo",
+]
+"""
+The attributes of `ZipFile` used by `write_raw_header_and_data`, which exist from
+Python 3.7 to 3.13
+"""
+
+
+def write_raw_header_and_data(z: ZipFile, zinfo: ZipInfo, source):
+    """
+    Writes the local header of an entry and its compressed data, and adds the entry to
+    the central directory.  This mirrors `ZipFile.open(zinfo, "w")`, but as the sizes
+    and CRC are known in advance the header is written once, before the data.
+    """
+    zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+
+    with z._lock:
+        if z._writing:
+            raise ValueError(
+                "Can't write to ZIP archive while an open writing handle exists"
+            )
+        if z._seekable:
+            z.fp.seek(z.start_dir)
+        zinfo.header_offset = z.fp.tell()
+        z._writecheck(zinfo)
+        z._didModify = True
+
+        z.fp.write(zinfo.FileHeader(zip64))
+        copyfileobj(source, z.fp, 1024 * 1024)
+
+        z.start_dir = z.fp.tell()
+        z.filelist.append(zinfo)
+        z.NameToInfo[zinfo.filename] = zinfo
+
+
+def open_raw_entry(source: ZipFile, zinfo: ZipInfo) -> "SectionReader":
+    """
+    Returns a readable binary file object over the compressed data of an entry of a
+    zip archive open for reading
+    """
+    # The local header's extra field may differ from the central directory's, so its
+    # length is read from the header itself
+    source.fp.seek(zinfo.header_offset)
+    header = source.fp.read(sizeFileHeader)
+    (name_length, extra_length) = struct.unpack("<HH", header[26:30])
+    source.fp.seek(zinfo.header_offset + sizeFileHeader + name_length + extra_length)
+    return SectionReader(source.fp, zinfo.compress_size)
+
+
+def set_compress_level(zinfo: ZipInfo, compresslevel: Optional[int]):
+    """
+    Sets the compression level of an entry, which is public from Python 3.13
+    """
+    if hasattr(zinfo, "compress_level"):
+        zinfo.compress_level = compresslevel
+    else:
+        zinfo._compresslevel = compresslevel
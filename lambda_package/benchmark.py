@@ -0,0 +1,227 @@
+import zipfile
+from os import environ
+from re import compile
+from shutil import rmtree
+from subprocess import PIPE, run
+from tempfile import mkdtemp
+from typing import List, NamedTuple, Optional
+
+from docker import from_env
+
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import Path
+from lambda_package.layers import get_layer_outputs
+from lambda_package.requirements import (
+    DockerImagePrefix,
+    get_workspace_directory,
+    normalize_version,
+)
+from lambda_package.tree_shaking import get_handler_module
+
+"""
+The functions in this file measure the cold-start import time of a built package.  The
+function and layer zips are unpacked into a scratch directory which mimics the
+`/var/task` and `/opt/python` layout of the Lambda runtime, and the handler module is
+imported in a fresh interpreter with `-X importtime`.
+"""
+
+ImportTimeMarker = "lambda_package_import_start"
+"""
+A marker written to stderr just before the handler is imported, so that the modules
+imported during interpreter start-up can be told apart from the handler's imports
+"""
+
+ImportTimeRegex = compile("^import time:\\s+([0-9]+) \\|\\s+([0-9]+) \\|( +)(\\S+)$")
+"""
+Regex for parsing a line of the `-X importtime` output
+"""
+
+
+class ModuleImportTime(NamedTuple):
+    """
+    The import time of a single module, in microseconds
+    """
+
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+class ImportTimeReport(NamedTuple):
+    """
+    The result of importing a handler module in a fresh interpreter
+    """
+
+    module: str
+    total_us: int
+    modules: List[ModuleImportTime]
+
+
+def benchmark_package(
+    configuration: Configuration,
+    output: Optional[str] = None,
+    layer_output: Optional[str] = None,
+    repeat: int = 3,
+) -> ImportTimeReport:
+    """
+    Measures the time taken to import the handler module of a built package.  The
+    import is repeated `repeat` times, each in a fresh interpreter, and the fastest
+    run is returned to reduce noise.
+
+    :param configuration    The packager configuration, which must contain `handler`.
+    :param output           The function zip, defaulting to `configuration.output`.
+    :param layer_output     The layer zip, defaulting to `configuration.layer_output`,
+                            or the list of layer zips if the requirements are split
+                            across several layers.
+    :param repeat           The number of times the import is measured.
+    """
+    if not configuration.handler:
+        raise ValueError("A handler must be configured to benchmark the package")
+
+    output = output if output else configuration.output
+    if not layer_output and configuration.layer_count > 1:
+        layer_output = [
+            str(path)
+            for path in get_layer_outputs(
+                configuration.layer_output, configuration.layer_count
+            )
+            if path.exists()
+        ]
+    layer_output = layer_output if layer_output else configuration.layer_output
+    module = get_handler_module(configuration.handler)
+
+    workspace_dir = get_workspace_directory(configuration)
+    scratch_dir = Path(mkdtemp(prefix="import_time_", dir=str(workspace_dir)))
+    try:
+        unpack_package(scratch_dir, output=output, layer_output=layer_output)
+        reports = [
+            parse_import_time(module, run_import_time(configuration, scratch_dir))
+            for i in range(max(repeat, 1))
+        ]
+    finally:
+        rmtree(scratch_dir, ignore_errors=True)
+
+    return min(reports, key=lambda report: report.total_us)
+
+
+def unpack_package(scratch_dir: Path, output=None, layer_output=None):
+    """
+    Extracts the function zip into `var/task` and the layer zip into `opt/python`
+    inside `scratch_dir`.  Layers which already contain a top-level `python` directory
+    are extracted into `opt`, as Lambda would.  `layer_output` may also be a list of
+    layer zips, which are extracted in order.
+    """
+    task_dir = scratch_dir.joinpath("var", "task")
+    opt_dir = scratch_dir.joinpath("opt")
+    task_dir.mkdir(parents=True)
+    opt_dir.joinpath("python").mkdir(parents=True)
+
+    if output:
+        with zipfile.ZipFile(output) as z:
+            z.extractall(task_dir)
+
+    layer_outputs = layer_output if isinstance(layer_output, list) else [layer_output]
+    for layer_output in filter(None, layer_outputs):
+        with zipfile.ZipFile(layer_output) as z:
+            has_python_dir = all(
+                name.startswith("python/") for name in z.namelist() if name
+            )
+            z.extractall(opt_dir if has_python_dir else opt_dir.joinpath("python"))
+
+
+def run_import_time(configuration: Configuration, scratch_dir: Path) -> str:
+    """
+    Imports the handler module with `-X importtime` and returns the interpreter's
+    stderr.  If `use_docker` is `True`, the interpreter of the Lambda Docker image is
+    used, otherwise the local interpreter for the configured Python version is used.
+    """
+    module = get_handler_module(configuration.handler)
+    python_version = normalize_version(configuration.python_version)
+    script = f"import sys; sys.stderr.write('{ImportTimeMarker}\\n'); import {module}"
+
+    if configuration.use_docker:
+        client = from_env()
+        vols = {
+            str(scratch_dir.joinpath("var", "task")): {
+                "bind": "/var/task",
+                "mode": "z",
+            },
+            str(scratch_dir.joinpath("opt", "python")): {
+                "bind": "/opt/python",
+                "mode": "z",
+            },
+        }
+        stderr = client.containers.run(
+            f"{DockerImagePrefix}{python_version}",
+            ["python", "-X", "importtime", "-c", script],
+            volumes=vols,
+            working_dir="/var/task",
+            environment={"PYTHONPATH": "/var/task:/opt/python"},
+            stdout=False,
+            stderr=True,
+            remove=True,
+        )
+        return stderr.decode()
+
+    task_dir = scratch_dir.joinpath("var", "task")
+    python_path = f"{task_dir}:{scratch_dir.joinpath('opt', 'python')}"
+    result = run(
+        [f"python{python_version}", "-X", "importtime", "-c", script],
+        cwd=str(task_dir),
+        env={**environ, "PYTHONPATH": python_path},
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{result.stderr}")
+
+    return result.stderr
+
+
+def parse_import_time(module: str, stderr: str) -> ImportTimeReport:
+    """
+    Parses the output of `-X importtime` into an `ImportTimeReport`.  Only the modules
+    imported after the start marker are included, and the total is the sum of the
+    cumulative times of the top-level imports.
+    """
+    lines = stderr.splitlines()
+    if ImportTimeMarker in lines:
+        lines = lines[lines.index(ImportTimeMarker) + 1 :]
+
+    modules = []
+    for line in lines:
+        m = ImportTimeRegex.match(line)
+        if m:
+            modules.append(
+                ModuleImportTime(
+                    name=m.group(4),
+                    self_us=int(m.group(1)),
+                    cumulative_us=int(m.group(2)),
+                    depth=(len(m.group(3)) - 1) // 2,
+                )
+            )
+
+    total_us = sum(m.cumulative_us for m in modules if m.depth == 0)
+    return ImportTimeReport(module=module, total_us=total_us, modules=modules)
+
+
+def compare_import_times(baseline: ImportTimeReport, current: ImportTimeReport):
+    """
+    Compares the self time of each module between two reports.
+
+    :return A list of `(name, baseline_us, current_us)` tuples, sorted by the absolute
+            difference between the two builds.  Modules which are only imported by
+            one of the builds have a time of `None` in the other.
+    """
+    baseline_times = {m.name: m.self_us for m in baseline.modules}
+    current_times = {m.name: m.self_us for m in current.modules}
+    names = list(baseline_times) + [n for n in current_times if n not in baseline_times]
+
+    differences = [
+        (name, baseline_times.get(name), current_times.get(name)) for name in names
+    ]
+    return sorted(
+        differences, key=lambda d: abs((d[2] or 0) - (d[1] or 0)), reverse=True
+    )
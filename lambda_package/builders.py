@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from shlex import split
+from threading import Condition, Lock
+from typing import Dict, List, Set, Tuple
+
+from docker import from_env
+from docker.errors import APIError, ContainerError, NotFound
+
+from lambda_package.events import Events
+
+"""
+The classes in this file keep Docker containers running between requirement builds.
+Starting a container from the Lambda build image takes seconds, which is often longer
+than installing a few pinned requirements from the pip cache.  A builder container is
+started once for each image, with the workspace and the build cache mounted at the
+same paths as on the host, and each build runs inside it with `docker exec`.  The
+containers outlive the process which started them, so that later processes reuse them,
+and each one exits by itself once it has been idle for a while.
+"""
+
+BuilderLabel = "lambda-package.builder"
+"""
+The label of builder containers, whose value identifies their image and volumes, so
+that running containers can be found again by later processes
+"""
+
+BuildsDir = "/lambda-package-builds"
+"""
+The directory of a builder container in which each running build creates a file named
+after its process ID.  Its modification time is that of the start or end of the last
+build.  It is outside of the mounted directories, which may include the host's `/tmp`,
+so that each container has its own.
+"""
+
+KeepAliveScript = (
+    f"mkdir -p -m 1777 {BuildsDir}; "
+    f'while [ -n "$(ls -A {BuildsDir})" ] || '
+    f"[ $(($(date +%s) - $(stat -c %Y {BuildsDir}))) -lt {{idle_timeout}} ]; "
+    "do sleep {interval}; done"
+)
+"""
+The command of a builder container, which keeps it running until no build has run in
+it for `idle_timeout` seconds
+"""
+
+BuildScript = (
+    f'marker={BuildsDir}/$$; touch "$marker"; "$@"; status=$?; rm -f "$marker"; '
+    'exit "$status"'
+)
+"""
+The script which wraps each build in a builder container, so that the container is not
+stopped while the build runs
+"""
+
+_default_pool = None
+
+
+class BuilderPool:
+    """
+    A pool of long-lived builder containers.  Containers are keyed by their image and
+    volumes, and up to `size` containers of each key serve builds concurrently.  Further
+    builds wait for a container to become free.  A container which is not running any
+    build exits by itself after `idle_timeout` seconds, so containers are checked to be
+    running before they are reused.
+
+    :param client           The Docker client, or `None` to connect from the
+                            environment when the first container is started
+    :param size             The maximum number of containers of each key
+    :param idle_timeout     The number of seconds after which idle containers exit
+    """
+
+    def __init__(self, client=None, size: int = 1, idle_timeout: float = 300):
+        self.client = client
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.condition = Condition()
+        self.idle: Dict[Tuple, List[object]] = {}
+        self.counts: Dict[Tuple, int] = {}
+        self.container_ids: Set[str] = set()
+        self.start_lock = Lock()
+
+    @contextmanager
+    def acquire(self, image: str, volumes: dict):
+        """
+        Returns a running builder container for the duration of a `with` block.  If
+        none of the pool is free and the pool is not full, a running builder container
+        with the same image and volumes is reused, such as one started by an earlier
+        process, or else a new one is started.  A container on which the Docker API
+        fails is dropped rather than returned to the pool.
+        """
+        key = (image, tuple(sorted(volumes)))
+
+        with self.condition:
+            while not self.idle.get(key) and self.counts.get(key, 0) >= self.size:
+                self.condition.wait()
+            if self.idle.get(key):
+                container = self.idle[key].pop()
+            else:
+                (container, self.counts[key]) = (None, self.counts.get(key, 0) + 1)
+
+        try:
+            if container is not None and not is_running(container):
+                with self.condition:
+                    self.container_ids.discard(container.id)
+                container = None
+            if container is None:
+                container = self.find_or_start(image, volumes)
+            yield container
+        except APIError:
+            self.discard(key, container)
+            raise
+        except BaseException:
+            if container is None:
+                self.discard(key, container)
+            else:
+                self.release(key, container)
+            raise
+        else:
+            self.release(key, container)
+
+    def find_or_start(self, image: str, volumes: dict):
+        """
+        Returns a running builder container for the image and volumes which is not
+        used by this pool, such as one started by an earlier process, or else starts
+        one.  Containers are found and started one at a time, so that no two builds of
+        the pool adopt the same container.
+        """
+        label = f"{BuilderLabel}={get_builder_key(image, volumes)}"
+        with self.start_lock:
+            if self.client is None:
+                self.client = from_env()
+            running = self.client.containers.list(filters={"label": label})
+            containers = [c for c in running if c.id not in self.container_ids]
+            container = containers[0] if containers else self.start(image, volumes)
+            with self.condition:
+                self.container_ids.add(container.id)
+            return container
+
+    def start(self, image: str, volumes: dict):
+        script = KeepAliveScript.format(
+            idle_timeout=int(self.idle_timeout),
+            interval=max(1, min(int(self.idle_timeout), 10)),
+        )
+        return self.client.containers.run(
+            image,
+            ["sh", "-c", script],
+            volumes=volumes,
+            labels={BuilderLabel: get_builder_key(image, volumes)},
+            auto_remove=True,
+            detach=True,
+        )
+
+    def release(self, key: Tuple, container):
+        with self.condition:
+            self.idle.setdefault(key, []).append(container)
+            self.condition.notify()
+
+    def discard(self, key: Tuple, container):
+        with self.condition:
+            self.counts[key] -= 1
+            if container is not None:
+                self.container_ids.discard(container.id)
+            self.condition.notify()
+        if container is not None:
+            remove_container(container)
+
+    def close(self):
+        """
+        Removes every idle container of the pool, rather than waiting for them to exit
+        by themselves.  Containers in use are left running.
+        """
+        with self.condition:
+            removed = [c for containers in self.idle.values() for c in containers]
+            for (key, containers) in self.idle.items():
+                self.counts[key] -= len(containers)
+            self.container_ids -= {c.id for c in removed}
+            self.idle = {}
+            self.condition.notify_all()
+
+        for container in removed:
+            remove_container(container)
+
+
+def get_builder_pool(size: int = 1, idle_timeout: float = 300) -> BuilderPool:
+    """
+    Returns the builder pool shared by the builds of this process, creating it on first
+    use with the given size and idle timeout.  Its containers are left running when the
+    process exits, for later processes to reuse.
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = BuilderPool(size=size, idle_timeout=idle_timeout)
+    return _default_pool
+
+
+def get_builder_key(image: str, volumes: dict) -> str:
+    """
+    Returns the value of the label of the builder containers of an image and volumes
+    """
+    return hashlib.sha256(
+        json.dumps([image, volumes], sort_keys=True).encode()
+    ).hexdigest()
+
+
+def run_in_builder(
+    pool: BuilderPool,
+    image: str,
+    command,
+    volumes: dict,
+    events: Events = None,
+):
+    """
+    Runs a command in a builder container of the pool, emitting each line of its
+    output as a `log` event if `events` is given.  The command runs as the current
+    user, so that the files it creates in the mounted workspace can be removed, and is
+    wrapped by `BuildScript`.
+
+    :raises ContainerError if the command fails
+    """
+    user = f"{os.getuid()}:{os.getgid()}" if hasattr(os, "getuid") else ""
+    args = split(command) if isinstance(command, str) else list(command)
+
+    for retry in [True, False]:
+        started = False
+        try:
+            with pool.acquire(image, volumes) as container:
+                api = pool.client.api
+                exec_id = api.exec_create(
+                    container.id,
+                    ["sh", "-c", BuildScript, "sh"] + args,
+                    user=user,
+                    environment={"HOME": "/tmp"},
+                )["Id"]
+                output = api.exec_start(exec_id, stream=True)
+                started = True
+
+                # The output arrives in chunks, which are split into lines
+                buffer = b""
+                for chunk in output:
+                    if events is None:
+                        continue
+                    (*lines, buffer) = (buffer + chunk).split(b"\n")
+                    for line in lines:
+                        message = line.decode(errors="replace") + "\n"
+                        events.emit("log", message=message)
+                if events is not None and buffer:
+                    events.emit("log", message=buffer.decode(errors="replace"))
+
+                exit_code = api.exec_inspect(exec_id)["ExitCode"]
+                if exit_code:
+                    raise ContainerError(container, exit_code, command, image, None)
+            return
+        except APIError:
+            # The container may have exited when idle after it was checked to be
+            # running, before the build started, so the build is retried once in
+            # another container
+            if started or not retry:
+                raise
+
+
+def is_running(container) -> bool:
+    """
+    Returns whether a container is still running, as builder containers exit by
+    themselves when idle
+    """
+    try:
+        container.reload()
+    except NotFound:
+        return False
+    return container.status == "running"
+
+
+def remove_container(container):
+    try:
+        container.remove(force=True)
+    except APIError:
+        pass
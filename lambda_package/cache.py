@@ -0,0 +1,381 @@
+import errno
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from shutil import copyfileobj, rmtree
+from tempfile import gettempdir, mkdtemp, mkstemp
+from typing import List, NamedTuple, Optional
+
+from lambda_package.configuration import Configuration
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+"""
+The functions in this file manage the shared build cache.  The cache is a directory
+which may be used by several processes at once, so writes are made atomically by
+renaming temporary files into place, and entries are protected by file locks.  The
+last access time of each entry is recorded in its modification time, so that the least
+recently used entries can be evicted when the cache grows beyond its size limit.
+
+An entry is either a top-level directory of the cache, such as a pip cache directory,
+or a child of a namespace directory, such as a single wheel in the wheel store.
+"""
+
+CacheDirName = "lambda_package_cache"
+"""
+The name of the shared cache directory
+"""
+
+LocksDirName = ".locks"
+"""
+The name of the cache directory containing the lock files
+"""
+
+TempDirName = ".tmp"
+"""
+The name of the cache directory in which entries are prepared before being renamed
+into place
+"""
+
+NamespaceMarker = ".namespace"
+"""
+The name of the marker file which identifies namespace directories
+"""
+
+LockHeldErrors = {errno.EWOULDBLOCK, errno.EAGAIN, errno.EACCES}
+"""
+The error numbers with which acquiring a lock fails because another process holds it
+"""
+
+
+class CacheEntry(NamedTuple):
+    """
+    An entry in the cache, with its size in bytes and last access time
+    """
+
+    name: str
+    path: Path
+    size: int
+    last_access: float
+
+
+class FileLock:
+    """
+    A lock which is shared between processes, based on `flock` on a lock file.  Shared
+    locks may be held by several processes at once, while an exclusive lock may only be
+    held by a single process.  If `blocking` is `False`, acquiring a lock which is held
+    by another process raises `BlockingIOError`.  Other errors, such as locks not being
+    supported by the filesystem, are raised as they are.
+    """
+
+    def __init__(self, path: Path, shared=False, blocking=True):
+        self.path = path
+        self.shared = shared
+        self.blocking = blocking
+        self.file = None
+
+    def __enter__(self):
+        os.makedirs(str(self.path.parent), exist_ok=True)
+        self.file = open(str(self.path), "a+")
+
+        try:
+            if fcntl:
+                operation = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                if not self.blocking:
+                    operation |= fcntl.LOCK_NB
+                fcntl.flock(self.file.fileno(), operation)
+            else:  # pragma: no cover
+                mode = msvcrt.LK_LOCK if self.blocking else msvcrt.LK_NBLCK
+                msvcrt.locking(self.file.fileno(), mode, 1)
+        except OSError as e:
+            self.file.close()
+            # `msvcrt.locking` fails with `EACCES` when the lock is held
+            if e.errno in LockHeldErrors:
+                raise BlockingIOError(
+                    e.errno, f"Cache lock {self.path} is held by another process"
+                )
+            raise
+
+        return self
+
+    def __exit__(self, *args):
+        if fcntl:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+
+
+class Cache:
+    """
+    A cache directory shared between builds and processes.  See the module
+    documentation for details.
+    """
+
+    def __init__(self, root: Path, size_limit: Optional[int] = None):
+        self.root = root
+        self.size_limit = size_limit
+
+    def lock(self, name: str, shared=False, blocking=True) -> FileLock:
+        """
+        Returns a lock on the given entry name
+        """
+        lock_name = name.replace("/", "_").replace("\\", "_")
+        return FileLock(
+            self.root.joinpath(LocksDirName, f"{lock_name}.lock"), shared, blocking
+        )
+
+    @contextmanager
+    def use(self, *parts: str):
+        """
+        Returns a cache directory for the duration of a `with` block, creating it if it
+        does not exist.  The directory is protected from eviction while in use, and its
+        last access time is updated.
+        """
+        self.create_namespace(*parts)
+        path = self.root.joinpath(*parts)
+
+        with self.lock("/".join(parts), shared=True):
+            os.makedirs(str(path), exist_ok=True)
+            touch(path)
+            yield path
+
+    def get(self, *parts: str) -> Optional[Path]:
+        """
+        Returns the path of an entry and updates its last access time, or returns
+        `None` if the entry does not exist.  The entry may be evicted once this returns,
+        so entries which are read should be used with `read` instead.
+        """
+        with self.read(*parts) as path:
+            return path
+
+    @contextmanager
+    def read(self, *parts: str):
+        """
+        Returns the path of an entry for the duration of a `with` block, or `None` if
+        the entry does not exist, and updates its last access time.  The entry is
+        protected from eviction while in use.
+        """
+        path = self.root.joinpath(*parts)
+
+        with self.lock("/".join(parts), shared=True):
+            if not path.exists():
+                yield None
+                return
+
+            touch(path)
+            yield path
+
+    def create_temp_file(self) -> Path:
+        """
+        Creates an empty temporary file in the cache directory, which can later be
+        moved into place with `put_file(..., move=True)`
+        """
+        temp_dir = self.root.joinpath(TempDirName)
+        os.makedirs(str(temp_dir), exist_ok=True)
+
+        (fd, temp_path) = mkstemp(dir=str(temp_dir))
+        os.close(fd)
+        return Path(temp_path)
+
+    def put_file(self, source, *parts: str, move=False) -> Path:
+        """
+        Atomically adds a file to the cache, replacing any existing entry.
+
+        :param source   The path of the file to add, or a readable binary file object.
+        :param parts    The name of the entry, such as `("layers", digest)`.
+        :param move     If `True`, `source` is a file created by `create_temp_file`
+                        which is moved into place instead of being copied.
+        """
+        self.create_namespace(*parts)
+        path = self.root.joinpath(*parts)
+
+        if move:
+            os.replace(str(source), str(path))
+            return path
+
+        temp_path = str(self.create_temp_file())
+        try:
+            with open(temp_path, "wb") as dest:
+                if hasattr(source, "read"):
+                    copyfileobj(source, dest, 1024 * 1024)
+                else:
+                    with open(str(source), "rb") as src:
+                        copyfileobj(src, dest, 1024 * 1024)
+            os.replace(temp_path, str(path))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        return path
+
+    def put_directory(self, build, *parts: str) -> Path:
+        """
+        Atomically adds a directory to the cache.  The directory is built in a
+        temporary location by calling `build` with its path, and is then renamed into
+        place.  If another process adds the same entry first, its copy is kept.
+        """
+        self.create_namespace(*parts)
+        path = self.root.joinpath(*parts)
+        temp_dir = self.root.joinpath(TempDirName)
+        os.makedirs(str(temp_dir), exist_ok=True)
+
+        build_dir = Path(mkdtemp(dir=str(temp_dir)))
+        try:
+            build(build_dir)
+            os.rename(str(build_dir), str(path))
+        except OSError:
+            if not path.is_dir():
+                raise
+        finally:
+            rmtree(str(build_dir), ignore_errors=True)
+
+        touch(path)
+        return path
+
+    def create_namespace(self, *parts: str):
+        """
+        Creates the namespace directory of an entry with more than one path component
+        """
+        if len(parts) > 1:
+            namespace_dir = self.root.joinpath(parts[0])
+            os.makedirs(str(namespace_dir), exist_ok=True)
+            namespace_dir.joinpath(NamespaceMarker).touch()
+
+    def entries(self) -> List[CacheEntry]:
+        """
+        Returns all the entries in the cache, least recently used first
+        """
+        entries = []
+        for (name, path) in self.iter_entry_paths():
+            try:
+                last_access = path.stat().st_mtime
+            except OSError:
+                continue
+            entries.append(CacheEntry(name, path, get_size(path), last_access))
+
+        return sorted(entries, key=lambda entry: entry.last_access)
+
+    def iter_entry_paths(self):
+        """
+        Yields the name and path of each entry in the cache
+        """
+        if not self.root.is_dir():
+            return
+
+        for child in sorted(self.root.iterdir()):
+            if child.name.startswith("."):
+                continue
+            if child.joinpath(NamespaceMarker).exists():
+                for grandchild in sorted(child.iterdir()):
+                    if grandchild.name != NamespaceMarker:
+                        yield (f"{child.name}/{grandchild.name}", grandchild)
+            else:
+                yield (child.name, child)
+
+    def prune(self, size_limit: Optional[int] = None) -> List[CacheEntry]:
+        """
+        Evicts the least recently used entries until the cache is no larger than
+        `size_limit` bytes, which defaults to the cache's own size limit.  Entries which
+        are in use by another process are skipped, and if another process is already
+        pruning the cache, nothing is done.
+
+        :return The list of evicted entries
+        """
+        size_limit = size_limit if size_limit is not None else self.size_limit
+        if size_limit is None:
+            return []
+
+        try:
+            with self.lock(".prune", blocking=False):
+                return self.evict(size_limit)
+        except BlockingIOError:
+            return []
+
+    def clear(self) -> List[CacheEntry]:
+        """
+        Evicts every entry which is not in use by another process
+        """
+        with self.lock(".prune"):
+            return self.evict(0)
+
+    def evict(self, size_limit: int) -> List[CacheEntry]:
+        """
+        Removes entries, least recently used first, until the cache is no larger than
+        `size_limit` bytes
+        """
+        entries = self.entries()
+        total_size = sum(entry.size for entry in entries)
+        evicted = []
+
+        for entry in entries:
+            if total_size <= size_limit:
+                break
+
+            try:
+                with self.lock(entry.name, blocking=False):
+                    remove_path(entry.path)
+            except BlockingIOError:
+                continue
+
+            total_size -= entry.size
+            evicted.append(entry)
+
+        return evicted
+
+
+def get_cache(configuration: Configuration) -> Cache:
+    """
+    Returns the build cache for the given configuration.  The cache is located in
+    `cache_dir`, or in the system temp directory if no cache directory is configured.
+    """
+    root = (
+        Path(configuration.cache_dir)
+        if configuration.cache_dir
+        else Path(gettempdir()).joinpath(CacheDirName)
+    )
+    return Cache(root, configuration.cache_size_limit)
+
+
+def touch(path: Path):
+    """
+    Records an access to a cache entry by updating its modification time
+    """
+    try:
+        os.utime(str(path), (time.time(), time.time()))
+    except OSError:
+        pass
+
+
+def get_size(path: Path) -> int:
+    """
+    Returns the total size in bytes of a file, or of all the files in a directory
+    """
+    if not path.is_dir():
+        return path.stat().st_size
+
+    size = 0
+    for (root_dir, _, files) in os.walk(str(path)):
+        for file in files:
+            try:
+                size += os.lstat(os.path.join(root_dir, file)).st_size
+            except OSError:
+                pass
+
+    return size
+
+
+def remove_path(path: Path):
+    """
+    Removes a file or directory
+    """
+    if path.is_dir() and not path.is_symlink():
+        rmtree(str(path), ignore_errors=True)
+    else:
+        try:
+            path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,131 @@
+import logging
+import zlib
+from typing import Callable, Dict
+
+"""
+The classes in this file are the deflate compressor backends used to write zip entries.
+Every backend produces a standard raw deflate stream, so the zip files can be read by
+Lambda whichever backend wrote them.  The accelerated backends depend on optional
+packages: `isal` for Intel's ISA-L, and `deflate` for libdeflate.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class Compressor:
+    """
+    The interface of a deflate compressor backend.  Backends are registered in
+    `Compressors` by name, and raise `ImportError` when they are constructed if their
+    package is not installed.
+    """
+
+    name = ""
+
+    def compress(self, data, level: int) -> bytes:
+        """
+        Compresses a bytes-like object into a raw deflate stream.  `level` is a zlib
+        compression level from 0 to 9, which is mapped to the backend's own levels.
+        """
+        raise NotImplementedError()
+
+    def crc32(self, data) -> int:
+        """
+        Returns the CRC-32 of a bytes-like object
+        """
+        return zlib.crc32(data)
+
+
+class ZlibCompressor(Compressor):
+    """
+    The standard library's `zlib`
+    """
+
+    name = "zlib"
+
+    def compress(self, data, level: int) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+
+
+class IsalCompressor(Compressor):
+    """
+    Intel's ISA-L, through the `isal` package.  ISA-L has four compression levels, which
+    are much faster than zlib's but compress slightly less.
+    """
+
+    name = "isal"
+
+    def __init__(self):
+        from isal import isal_zlib
+
+        self.isal_zlib = isal_zlib
+
+    def compress(self, data, level: int) -> bytes:
+        isal_level = min(self.isal_zlib.ISAL_BEST_COMPRESSION, (level + 2) // 3)
+        compressor = self.isal_zlib.compressobj(isal_level, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+
+    def crc32(self, data) -> int:
+        return self.isal_zlib.crc32(data)
+
+
+class LibdeflateCompressor(Compressor):
+    """
+    libdeflate, through the `deflate` package.  libdeflate compresses whole buffers
+    rather than streams, and is faster than zlib at every level while compressing as
+    well or better.
+    """
+
+    name = "libdeflate"
+
+    def __init__(self):
+        import deflate
+
+        self.deflate = deflate
+
+    def compress(self, data, level: int) -> bytes:
+        return self.deflate.deflate_compress(data, level)
+
+    def crc32(self, data) -> int:
+        return self.deflate.crc32(data)
+
+
+Compressors: Dict[str, Callable[[], Compressor]] = {
+    "zlib": ZlibCompressor,
+    "isal": IsalCompressor,
+    "libdeflate": LibdeflateCompressor,
+}
+"""
+The compressor backends, by name.  Further backends can be added to this dictionary.
+"""
+
+AutoCompressors = ["libdeflate", "isal", "zlib"]
+"""
+The backends tried by the `"auto"` compressor, in order of preference
+"""
+
+
+def get_compressor(name: str) -> Compressor:
+    """
+    Returns the compressor backend with the given name, or the first installed backend
+    in `AutoCompressors` if the name is `"auto"`.  If the backend's package is not
+    installed, a warning is logged and `zlib` is used instead.
+    """
+    if name == "auto":
+        for auto_name in AutoCompressors:
+            try:
+                return Compressors[auto_name]()
+            except ImportError:
+                continue
+
+    if name not in Compressors:
+        raise ValueError(
+            f"Invalid compressor: '{name}'. "
+            f"Compressor must be one of: auto, {', '.join(Compressors)}"
+        )
+
+    try:
+        return Compressors[name]()
+    except ImportError:
+        logger.warning(f"The {name} compressor is not installed, using zlib instead")
+        return ZlibCompressor()
@@ -15,8 +15,62 @@ ValidKeys = [
     "layer_output",
     "use_docker",
     "python_version",
+    "handler",
+    "workspace",
+    "workspace_size_limit",
+    "walker",
+    "walker_threads",
+    "large_file_threshold",
+    "cache_dir",
+    "cache_size_limit",
+    "remote_cache",
+    "remote_cache_timeout",
+    "remote_cache_min_size",
+    "parallel_downloads",
+    "index_url",
+    "wheel_store",
+    "build_method",
+    "architecture",
+    "output_dir",
+    "compressor",
+    "image_output",
+    "image_base",
+    "reproducible",
+    "read_ahead",
+    "read_ahead_threads",
+    "tree_shaking",
+    "tree_shaking_keep",
+    "incremental_layer",
+    "layer_count",
+    "layer_size_limit",
+    "layer_history",
+    "builder_pool",
+    "builder_pool_size",
+    "builder_idle_timeout",
+    "dedupe",
 ]
 
+Walkers = ["sequential", "threaded"]
+"""
+The valid values of the `walker` parameter
+"""
+
+BuildMethods = ["docker", "local", "platform"]
+"""
+The valid values of the `build_method` parameter
+"""
+
+Architectures = ["x86_64", "arm64"]
+"""
+The valid values of the `architecture` parameter
+"""
+
+DedupePolicies = ["layer", "function"]
+"""
+The valid values of the `dedupe` parameter: the package whose copies of duplicate files
+are kept
+"""
+
 
 class Configuration:
     """
@@ -58,6 +112,223 @@ class Configuration:
     The Python version used by Docker to package the requirements.
     """
 
+    handler: Optional[str]
+    """
+    The Lambda handler, in the form `module.function`.  Used to find the module which
+    is imported when measuring the cold-start import time of the package.
+    """
+
+    workspace: Optional[str]
+    """
+    The directory in which temporary build directories are created, such as a tmpfs
+    mount like `/dev/shm`.  Defaults to the system temp directory.
+    """
+
+    workspace_size_limit: Optional[int]
+    """
+    The number of bytes which must be free in the workspace for it to be used.  If less
+    space is available, or the build fails in the workspace, the build falls back to
+    the system temp directory on disk.
+    """
+
+    walker: str
+    """
+    The method used to find the source files: `"sequential"`, or `"threaded"` to scan
+    directories in parallel, which is faster on high-latency filesystems like NFS.
+    """
+
+    walker_threads: int
+    """
+    The number of threads used by the `"threaded"` walker.
+    """
+
+    large_file_threshold: Optional[int]
+    """
+    Files of at least this many bytes are zipped using memory-mapped reads, and are
+    stored uncompressed if they do not compress well.  `None` disables this.
+    """
+
+    cache_dir: Optional[str]
+    """
+    The directory of the build cache, which may be shared by several processes.
+    Defaults to a directory in the system temp directory.
+    """
+
+    cache_size_limit: Optional[int]
+    """
+    The maximum size of the build cache in bytes.  The least recently used entries are
+    evicted after each build to keep the cache within this limit.  `None` means no
+    limit.
+    """
+
+    remote_cache: Optional[str]
+    """
+    The URL of a remote cache shared between machines, such as
+    `https://cache.example.com/lambda`.  Prebuilt layer zips and compressed zip entries
+    are downloaded from it before building locally, and uploaded to it after a build.
+    """
+
+    remote_cache_timeout: float
+    """
+    The timeout in seconds of remote cache requests.  Failed requests are treated as
+    cache misses.
+    """
+
+    remote_cache_min_size: int
+    """
+    Only files of at least this many bytes have their compressed zip entries shared
+    through the remote cache, as smaller files are faster to compress than to download.
+    """
+
+    parallel_downloads: Optional[int]
+    """
+    The number of requirements downloaded at the same time into a wheelhouse before
+    they are installed.  `None` disables the download stage, so that pip downloads the
+    requirements one at a time during the install.
+    """
+
+    index_url: Optional[str]
+    """
+    The URL of the Python package index used to download requirements, instead of pip's
+    default index.
+    """
+
+    wheel_store: bool
+    """
+    Whether requirements built without Docker are installed from a store of unpacked
+    wheels in the build cache, by hardlinking their files, instead of being extracted
+    by pip in each build.  The requirements file must be fully pinned.
+    """
+
+    build_method: Optional[str]
+    """
+    How the requirements are built: `"docker"` in a Lambda Docker image, `"local"` with
+    the local pip, or `"platform"` by installing wheels for the Lambda platform with the
+    local pip, using Docker only for requirements which have no such wheel.  `None`
+    uses `"docker"` or `"local"` depending on `use_docker`.
+    """
+
+    architecture: str
+    """
+    The instruction set architecture of the Lambda function, `"x86_64"` or `"arm64"`.
+    Used to select wheels by the `"platform"` build method.
+    """
+
+    output_dir: Optional[str]
+    """
+    A directory into which the package is written without compression, for use with a
+    local Lambda emulator.  The files are placed in `var/task` and the requirements in
+    `opt/python`, and are updated incrementally on later runs.
+    """
+
+    compressor: str
+    """
+    The deflate compressor used to write zip entries: `"zlib"`, `"isal"` or
+    `"libdeflate"`, or `"auto"` for the fastest one installed.  The accelerated
+    compressors require the optional `isal` or `deflate` packages.
+    """
+
+    image_output: Optional[str]
+    """
+    A directory into which a container image is written in the OCI image layout, with
+    the requirements and the source files in separate layers in `/var/task`.  The layers
+    are reproducible, so the requirements layer is unchanged when only the source
+    changes.
+    """
+
+    image_base: Optional[str]
+    """
+    A directory containing the base of the container image in the OCI image layout,
+    such as `public.ecr.aws/lambda/python` copied with `skopeo`.  `None` builds the
+    image from scratch.
+    """
+
+    reproducible: bool
+    """
+    If `True`, zip files are byte-for-byte reproducible: entries are sorted by name, and
+    have the same timestamp, taken from the `SOURCE_DATE_EPOCH` environment variable if
+    it is set, and normalized permissions.  Identical inputs then give the same
+    `CodeSha256`, so unchanged functions need not be deployed again.
+    """
+
+    read_ahead: Optional[int]
+    """
+    The number of files read ahead of the compressor while writing zips, so that reads
+    overlap with compression on network filesystems and cold page caches.  `None`
+    disables reading ahead.
+    """
+
+    read_ahead_threads: int
+    """
+    The number of threads reading files ahead of the compressor
+    """
+
+    tree_shaking: bool
+    """
+    If `True`, the Python modules of the source files and requirements which cannot be
+    imported from the `handler` module, according to their import statements, are left
+    out of the package.  Requires `handler`.
+    """
+
+    tree_shaking_keep: Optional[List[str]]
+    """
+    Patterns of module names which are always kept by tree shaking, along with the
+    modules they import, such as `"botocore.*"`.  Used for modules which are imported
+    dynamically.
+    """
+
+    incremental_layer: bool
+    """
+    Whether the previous `layer_output` zip is updated when only some of the pins in a
+    fully pinned requirements file change, by installing only the added or changed
+    distributions and copying the other entries from the previous zip.
+    """
+
+    layer_count: int
+    """
+    The number of layer zips the requirements are split across.  With more than one,
+    the layers are written next to `layer_output`, as `layer-1.zip`, `layer-2.zip` and
+    so on, with the distributions which change least often in the first layers.
+    """
+
+    layer_size_limit: Optional[int]
+    """
+    The maximum total size in bytes of the unzipped files of each layer, when the
+    requirements are split across several layers
+    """
+
+    layer_history: Optional[str]
+    """
+    The file in which the versions and layers of the distributions of previous builds
+    are recorded, when the requirements are split across several layers.  Defaults to
+    a file next to `layer_output`, such as `layer.history.json`.
+    """
+
+    builder_pool: bool
+    """
+    Whether Docker builds run in long-lived builder containers, which are started once
+    and reused by later builds, including those of later processes, instead of in a new
+    container for each build.  Not supported on Windows.
+    """
+
+    builder_pool_size: int
+    """
+    The maximum number of builder containers of each Python version, which serve
+    concurrent builds
+    """
+
+    builder_idle_timeout: int
+    """
+    The number of seconds after which idle builder containers exit
+    """
+
+    dedupe: Optional[str]
+    """
+    Which copy of the files shipped in both the `output` package and the `layer_output`
+    layer, with the same contents, is kept: `"layer"` removes them from the function
+    package, and `"function"` removes them from the layer.  `None` keeps both copies.
+    """
+
     def __init__(
         self,
         output: Optional[str] = None,
@@ -66,6 +337,39 @@ class Configuration:
         layer_output: Optional[str] = None,
         use_docker: Optional[bool] = True,
         python_version: Optional[str] = python_version(),
+        handler: Optional[str] = None,
+        workspace: Optional[str] = None,
+        workspace_size_limit: Optional[int] = 1024 * 1024 * 1024,
+        walker: str = "sequential",
+        walker_threads: int = 16,
+        large_file_threshold: Optional[int] = 64 * 1024 * 1024,
+        cache_dir: Optional[str] = None,
+        cache_size_limit: Optional[int] = 10 * 1024 * 1024 * 1024,
+        remote_cache: Optional[str] = None,
+        remote_cache_timeout: float = 10.0,
+        remote_cache_min_size: int = 1024 * 1024,
+        parallel_downloads: Optional[int] = None,
+        index_url: Optional[str] = None,
+        wheel_store: bool = False,
+        build_method: Optional[str] = None,
+        architecture: str = "x86_64",
+        output_dir: Optional[str] = None,
+        compressor: str = "zlib",
+        image_output: Optional[str] = None,
+        image_base: Optional[str] = None,
+        reproducible: bool = False,
+        read_ahead: Optional[int] = None,
+        read_ahead_threads: int = 4,
+        tree_shaking: bool = False,
+        tree_shaking_keep: Optional[List[str]] = None,
+        incremental_layer: bool = False,
+        layer_count: int = 1,
+        layer_size_limit: Optional[int] = None,
+        layer_history: Optional[str] = None,
+        builder_pool: bool = False,
+        builder_pool_size: int = 1,
+        builder_idle_timeout: int = 300,
+        dedupe: Optional[str] = None,
     ):
         self.output = output
         self.exclude = exclude
@@ -73,6 +377,39 @@ class Configuration:
         self.layer_output = layer_output
         self.use_docker = use_docker
         self.python_version = python_version
+        self.handler = handler
+        self.workspace = workspace
+        self.workspace_size_limit = workspace_size_limit
+        self.walker = walker
+        self.walker_threads = walker_threads
+        self.large_file_threshold = large_file_threshold
+        self.cache_dir = cache_dir
+        self.cache_size_limit = cache_size_limit
+        self.remote_cache = remote_cache
+        self.remote_cache_timeout = remote_cache_timeout
+        self.remote_cache_min_size = remote_cache_min_size
+        self.parallel_downloads = parallel_downloads
+        self.index_url = index_url
+        self.wheel_store = wheel_store
+        self.build_method = build_method
+        self.architecture = architecture
+        self.output_dir = output_dir
+        self.compressor = compressor
+        self.image_output = image_output
+        self.image_base = image_base
+        self.reproducible = reproducible
+        self.read_ahead = read_ahead
+        self.read_ahead_threads = read_ahead_threads
+        self.tree_shaking = tree_shaking
+        self.tree_shaking_keep = tree_shaking_keep
+        self.incremental_layer = incremental_layer
+        self.layer_count = layer_count
+        self.layer_size_limit = layer_size_limit
+        self.layer_history = layer_history
+        self.builder_pool = builder_pool
+        self.builder_pool_size = builder_pool_size
+        self.builder_idle_timeout = builder_idle_timeout
+        self.dedupe = dedupe
 
     @staticmethod
     def create_from_config_file():
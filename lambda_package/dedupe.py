@@ -0,0 +1,132 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from zipfile import ZipFile
+
+from lambda_package.archive import hash_file
+
+"""
+The functions in this file remove the files which are shipped in both the function
+package and its layer, such as a vendored copy of a requirement.  Lambda extracts both
+onto the Python path, so only one of the copies is ever imported.  Files are compared by
+their path within the package and their contents, so that a patched copy is kept.
+
+Files are removed by top-level package: a package, or a top-level module, is only
+removed from a package when every one of its files there is duplicated in the other.
+Removing some of the modules of a package would break their imports, as Python only
+searches the first directory of a regular package on the path.
+"""
+
+logger = logging.getLogger(__name__)
+
+ContentsChunkSize = 1024 * 1024
+"""
+The number of bytes read at a time when hashing a zip entry
+"""
+
+
+class DedupeReport(NamedTuple):
+    """
+    The number and total size of the duplicate files removed by `dedupe_paths`, and the
+    number of files at the same path in both packages with different contents
+    """
+
+    removed_files: int
+    removed_bytes: int
+    conflicts: int
+
+
+def dedupe_paths(
+    zip_paths: List[Tuple[Path, Path]],
+    layer_paths: Optional[List[Tuple[Path, Path]]],
+    policy: str,
+    layer_zip: Optional[str] = None,
+) -> Tuple[List[Tuple[Path, Path]], List[Tuple[Path, Path]], DedupeReport]:
+    """
+    Removes the files which are in both the function package and the layer, with the
+    same contents, from one of them.
+
+    :param zip_paths    Tuples of the source path of each file of the function package
+                        and its path within the package
+    :param layer_paths  The same for the layer, or `None` if the layer zip was not
+                        built from the installed requirements, for example because it
+                        was fetched from the cache
+    :param policy       `"layer"` to keep the copies of the layer and remove those of
+                        the function package, or `"function"` to remove those of the
+                        layer, which requires `layer_paths`
+    :param layer_zip    The layer zip, which is read if `layer_paths` is `None`
+    :return A tuple with the remaining paths of the function package, those of the
+            layer, and a report
+    """
+    files = {path[1].as_posix(): path for path in zip_paths}
+    if layer_paths is not None:
+        layer_files = {path[1].as_posix(): path for path in layer_paths}
+        overlap = files.keys() & layer_files.keys()
+        layer_digests = get_file_digests(layer_files, overlap)
+    else:
+        with ZipFile(layer_zip) as z:
+            overlap = files.keys() & set(z.namelist())
+            layer_digests = get_zip_digests(z, overlap)
+
+    digests = get_file_digests(files, overlap)
+    duplicates = {name for name in overlap if digests[name] == layer_digests[name]}
+    for name in sorted(overlap - duplicates):
+        logger.warning(f"{name} differs between the package and the layer")
+
+    if policy == "function":
+        removed = get_removed_names(layer_files, duplicates)
+        layer_paths = [
+            path for path in layer_paths if path[1].as_posix() not in removed
+        ]
+    else:
+        removed = get_removed_names(files, duplicates)
+        zip_paths = [path for path in zip_paths if path[1].as_posix() not in removed]
+
+    report = DedupeReport(
+        removed_files=len(removed),
+        removed_bytes=sum(digests[name][1] for name in removed),
+        conflicts=len(overlap) - len(duplicates),
+    )
+    return (zip_paths, layer_paths, report)
+
+
+def get_removed_names(names, duplicates: Set[str]) -> Set[str]:
+    """
+    Returns the duplicate files of the top-level packages and modules whose files are
+    all duplicates
+    """
+    partial = {get_top_level(name) for name in names if name not in duplicates}
+    return {name for name in duplicates if get_top_level(name) not in partial}
+
+
+def get_top_level(name: str) -> str:
+    return name.split("/", 1)[0]
+
+
+def get_file_digests(
+    files: Dict[str, Tuple[Path, Path]], names: Set[str]
+) -> Dict[str, Tuple[str, int]]:
+    """
+    Returns the SHA-256 digest and the size of some of the files, by their path within
+    the package
+    """
+    digests = {}
+    for name in names:
+        (digest, _, size) = hash_file(str(files[name][0]))
+        digests[name] = (digest, size)
+    return digests
+
+
+def get_zip_digests(z: ZipFile, names: Set[str]) -> Dict[str, Tuple[str, int]]:
+    """
+    Returns the SHA-256 digest and the size of some of the entries of a zip, by name
+    """
+    digests = {}
+    for name in names:
+        digest = hashlib.sha256()
+        with z.open(name) as f:
+            for chunk in iter(lambda: f.read(ContentsChunkSize), b""):
+                digest.update(chunk)
+        digests[name] = (digest.hexdigest(), z.getinfo(name).file_size)
+    return digests
@@ -0,0 +1,217 @@
+import sys
+import time
+from contextlib import contextmanager
+from threading import Lock, RLock
+from typing import Callable, List, NamedTuple, Optional
+
+"""
+The classes in this file let callers follow the progress of a build.  Functions which
+support events take an optional `events` parameter, and only emit events when it is not
+`None`, so that the cost of the hooks is a single check when nobody is listening.
+Events are delivered to listeners in batches, rather than one function call per file.
+"""
+
+
+class Event(NamedTuple):
+    """
+    An event emitted during a build.  The `kind` is one of:
+
+    - `phase_start` and `phase_end`: a phase of the build, given by `phase`, such as
+      `find_paths`, `build_requirements` or `zip_package`.  `total` is the number of
+      files the phase will process, if it is known.
+    - `directory_scanned`: `path` is a directory whose files have been listed, and
+      `total` is the number of files it contains which are not excluded.
+    - `file_compressed`: `path` has been added to a zip with `raw_bytes` and
+      `compressed_bytes`.
+    - `log`: `message` is a line of output from pip or Docker.
+    - `tree_shaken`: tree shaking removed `total` modules, of `raw_bytes` bytes in
+      total.
+    - `deduplicated`: deduplication removed `total` files, of `raw_bytes` bytes in
+      total, from the artifact given by `message`, either `package` or `layer`.
+    """
+
+    kind: str
+    phase: Optional[str] = None
+    path: Optional[str] = None
+    total: Optional[int] = None
+    raw_bytes: Optional[int] = None
+    compressed_bytes: Optional[int] = None
+    message: Optional[str] = None
+    timestamp: float = 0
+
+
+class Events:
+    """
+    Collects events and delivers them to listeners in batches.  A batch is delivered
+    when it reaches `batch_size` events, when `flush_interval` seconds have passed since
+    the last delivery, and at the start and end of each phase.  Listeners are called
+    with a list of `Event` objects.  Events may be emitted from several threads, such as
+    the workers of the threaded walker and of parallel downloads, but batches are
+    delivered one at a time and in order, so listeners need not be thread-safe.
+    """
+
+    def __init__(
+        self,
+        listeners: List[Callable[[List[Event]], None]] = None,
+        batch_size: int = 256,
+        flush_interval: float = 0.25,
+    ):
+        self.listeners = list(listeners) if listeners else []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch = []
+        self.last_flush = time.monotonic()
+        self.lock = Lock()
+        # A listener which emits events delivers them from within its own call
+        self.dispatch_lock = RLock()
+
+    def add_listener(self, listener: Callable[[List[Event]], None]):
+        self.listeners.append(listener)
+
+    def emit(self, kind: str, **fields):
+        """
+        Adds an event to the current batch, delivering the batch if it is due
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.batch.append(Event(kind, timestamp=now, **fields))
+            due = (
+                len(self.batch) >= self.batch_size
+                or now - self.last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Delivers the current batch of events to the listeners
+        """
+        with self.dispatch_lock:
+            with self.lock:
+                (batch, self.batch) = (self.batch, [])
+                self.last_flush = time.monotonic()
+
+            if batch:
+                for listener in self.listeners:
+                    listener(batch)
+
+    @contextmanager
+    def phase(self, name: str, total: Optional[int] = None):
+        """
+        Emits the start and end events of a phase around a `with` block
+        """
+        self.emit("phase_start", phase=name, total=total)
+        self.flush()
+        try:
+            yield self
+        finally:
+            self.emit("phase_end", phase=name)
+            self.flush()
+
+
+@contextmanager
+def optional_phase(events: Optional[Events], name: str, total: Optional[int] = None):
+    """
+    Calls `events.phase`, or does nothing if `events` is `None`
+    """
+    if events is None:
+        yield None
+    else:
+        with events.phase(name, total) as phase_events:
+            yield phase_events
+
+
+class ProgressBar:
+    """
+    A listener which displays the progress of a build on a stream, by default stderr.
+    On a terminal a single line is redrawn; otherwise a line is printed at the end of
+    each phase and at most every `interval` seconds, which suits CI logs.  Log events
+    are printed as they arrive.
+    """
+
+    def __init__(self, stream=None, interval: float = 5.0, width: int = 30):
+        self.stream = stream if stream else sys.stderr
+        self.is_terminal = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self.interval = interval
+        self.width = width
+        self.phase = None
+        self.total = None
+        self.files = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.last_print = 0.0
+
+    def __call__(self, events: List[Event]):
+        for event in events:
+            if event.kind == "phase_start":
+                (self.phase, self.total) = (event.phase, event.total)
+                (self.files, self.raw_bytes, self.compressed_bytes) = (0, 0, 0)
+            elif event.kind == "file_compressed":
+                self.files += 1
+                self.raw_bytes += event.raw_bytes
+                self.compressed_bytes += event.compressed_bytes
+            elif event.kind == "directory_scanned":
+                self.files += event.total
+            elif event.kind == "log":
+                self.write_line(event.message.rstrip())
+            elif event.kind == "tree_shaken":
+                self.write_line(format_tree_shaking_report(event))
+            elif event.kind == "deduplicated":
+                self.write_line(format_dedupe_report(event))
+
+        finished = events[-1].kind == "phase_end"
+        if (
+            self.is_terminal
+            or finished
+            or time.monotonic() - self.last_print > self.interval
+        ):
+            self.print_progress(finished)
+
+    def print_progress(self, finished: bool):
+        if self.phase is None:
+            return
+
+        status = f"{self.phase}: {self.files} files"
+        if self.total:
+            filled = int(self.width * min(self.files / self.total, 1))
+            bar = "#" * filled + "-" * (self.width - filled)
+            status = f"{self.phase}: [{bar}] {self.files}/{self.total} files"
+        if self.raw_bytes:
+            status += (
+                f", {self.raw_bytes / 1048576:.1f} MB"
+                f" -> {self.compressed_bytes / 1048576:.1f} MB"
+            )
+        if finished:
+            status += ", done"
+
+        if self.is_terminal:
+            self.stream.write(f"\r\033[K{status}" + ("\n" if finished else ""))
+        else:
+            self.stream.write(f"{status}\n")
+        self.stream.flush()
+        self.last_print = time.monotonic()
+
+    def write_line(self, line: str):
+        if self.is_terminal:
+            self.stream.write("\r\033[K")
+        self.stream.write(f"{line}\n")
+
+
+def format_tree_shaking_report(event: Event) -> str:
+    """
+    Describes a `tree_shaken` event
+    """
+    return (
+        f"Tree shaking removed {event.total} modules, "
+        f"saving {event.raw_bytes / 1048576:.1f} MB"
+    )
+
+
+def format_dedupe_report(event: Event) -> str:
+    """
+    Describes a `deduplicated` event
+    """
+    return (
+        f"Deduplication removed {event.total} files from the {event.message}, "
+        f"saving {event.raw_bytes / 1048576:.1f} MB"
+    )
@@ -0,0 +1,293 @@
+import gzip
+import hashlib
+import json
+import os
+import stat
+import tarfile
+from pathlib import Path
+from tempfile import mkstemp
+from typing import List, NamedTuple, Optional, Tuple
+
+from lambda_package.wheels import link_file
+
+"""
+The functions in this file write container images for Lambda in the OCI image layout,
+without a Docker daemon.  The image is the base image, followed by a layer with the
+requirements and a layer with the source files, both in `/var/task`.  Layers are
+deterministic tar files: their entries are sorted, and their timestamps, owners and
+permissions are normalized, so that a layer whose files have not changed has the same
+digest, and is reused by registries and by the Lambda runtime.  The resulting directory
+can be pushed with tools such as `skopeo` or `crane`.
+"""
+
+TaskDir = "var/task"
+"""
+The directory of the function code in Lambda images
+"""
+
+ManifestMediaType = "application/vnd.oci.image.manifest.v1+json"
+ConfigMediaType = "application/vnd.oci.image.config.v1+json"
+LayerMediaType = "application/vnd.oci.image.layer.v1.tar+gzip"
+IndexMediaTypes = [
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+]
+
+ImageArchitectures = {"x86_64": "amd64", "arm64": "arm64"}
+"""
+The OCI architecture name of each Lambda architecture
+"""
+
+
+class Descriptor(NamedTuple):
+    """
+    An OCI content descriptor, and the uncompressed digest of a layer
+    """
+
+    media_type: str
+    digest: str
+    size: int
+    diff_id: Optional[str] = None
+
+    def to_json(self):
+        return {"mediaType": self.media_type, "digest": self.digest, "size": self.size}
+
+
+class HashingWriter:
+    """
+    A writable file object which computes the SHA-256 digest and size of the data
+    written through it
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+    @property
+    def digest(self) -> str:
+        return f"sha256:{self.sha256.hexdigest()}"
+
+
+def write_image(
+    output_dir: Path,
+    layers: List[List[Tuple[Path, Path]]],
+    base_dir: Optional[Path] = None,
+    architecture: str = "x86_64",
+    handler: Optional[str] = None,
+    mtime: int = 0,
+) -> Descriptor:
+    """
+    Writes an image in the OCI image layout.  Blobs which already exist in the output
+    directory, such as an unchanged requirements layer, are kept.
+
+    :param output_dir       The directory of the OCI image layout
+    :param layers           The files of each layer, as lists of tuples with the source
+                            path of each file and its path relative to `/var/task`
+    :param base_dir         An optional OCI image layout containing the base image,
+                            such as `public.ecr.aws/lambda/python` copied with `skopeo`
+    :param architecture     The Lambda architecture, `x86_64` or `arm64`
+    :param handler          The Lambda handler, which is set as the image's command
+    :param mtime            The timestamp of every file in the layers
+    :return The descriptor of the image manifest
+    """
+    blobs_dir = output_dir.joinpath("blobs", "sha256")
+    blobs_dir.mkdir(parents=True, exist_ok=True)
+
+    if base_dir is not None:
+        (base_manifest, base_config) = read_base_image(base_dir, architecture)
+        for layer in base_manifest["layers"]:
+            copy_blob(base_dir, blobs_dir, layer["digest"])
+    else:
+        base_manifest = {"layers": []}
+        base_config = {"rootfs": {"type": "layers", "diff_ids": []}, "history": []}
+
+    descriptors = [write_layer(blobs_dir, paths, mtime) for paths in layers]
+
+    config = dict(base_config)
+    config["architecture"] = ImageArchitectures[architecture]
+    config["os"] = "linux"
+    config["rootfs"] = {
+        "type": "layers",
+        "diff_ids": base_config["rootfs"]["diff_ids"]
+        + [d.diff_id for d in descriptors],
+    }
+    if "history" in base_config:
+        config["history"] = base_config["history"] + [
+            {"created_by": "lambda-package"} for _ in descriptors
+        ]
+    if handler:
+        config["config"] = {**base_config.get("config", {}), "Cmd": [handler]}
+
+    config_descriptor = write_json_blob(blobs_dir, config, ConfigMediaType)
+    manifest = {
+        "schemaVersion": 2,
+        "mediaType": ManifestMediaType,
+        "config": config_descriptor.to_json(),
+        "layers": base_manifest["layers"] + [d.to_json() for d in descriptors],
+    }
+    manifest_descriptor = write_json_blob(blobs_dir, manifest, ManifestMediaType)
+
+    write_json(output_dir.joinpath("oci-layout"), {"imageLayoutVersion": "1.0.0"})
+    write_json(
+        output_dir.joinpath("index.json"),
+        {
+            "schemaVersion": 2,
+            "manifests": [
+                {
+                    **manifest_descriptor.to_json(),
+                    "annotations": {"org.opencontainers.image.ref.name": "latest"},
+                }
+            ],
+        },
+    )
+    return manifest_descriptor
+
+
+def write_layer(
+    blobs_dir: Path, paths: List[Tuple[Path, Path]], mtime: int = 0
+) -> Descriptor:
+    """
+    Writes a deterministic gzipped tar layer containing the given files in `/var/task`,
+    along with their parent directories.
+    """
+    files = {
+        f"{TaskDir}/{Path(zip_path).as_posix()}": path for (path, zip_path) in paths
+    }
+    directories = set()
+    for name in files:
+        parent = name.rsplit("/", 1)[0]
+        while parent and parent not in directories:
+            directories.add(parent)
+            parent = parent.rsplit("/", 1)[0] if "/" in parent else ""
+
+    (fd, temp_path) = mkstemp(dir=str(blobs_dir))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            compressed = HashingWriter(f)
+            with gzip.GzipFile(
+                filename="", mode="wb", fileobj=compressed, mtime=0
+            ) as gzip_file:
+                uncompressed = HashingWriter(gzip_file)
+                with tarfile.open(
+                    fileobj=uncompressed, mode="w|", format=tarfile.PAX_FORMAT
+                ) as tar:
+                    for name in sorted(directories | set(files)):
+                        if name in files:
+                            add_file(tar, name, files[name], mtime)
+                        else:
+                            add_directory(tar, name, mtime)
+
+        digest = compressed.digest
+        os.replace(temp_path, str(blobs_dir.joinpath(digest.split(":")[1])))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return Descriptor(LayerMediaType, digest, compressed.size, uncompressed.digest)
+
+
+def add_file(tar: tarfile.TarFile, name: str, path: Path, mtime: int):
+    """
+    Adds a file to a tar, with normalized metadata.  The file is executable if its
+    source is executable by its owner.
+    """
+    file_stat = os.stat(str(path))
+    info = tarfile.TarInfo(name)
+    info.size = file_stat.st_size
+    info.mode = 0o755 if file_stat.st_mode & stat.S_IXUSR else 0o644
+    info.mtime = mtime
+
+    with open(str(path), "rb") as f:
+        tar.addfile(info, f)
+
+
+def add_directory(tar: tarfile.TarFile, name: str, mtime: int):
+    """
+    Adds a directory to a tar, with normalized metadata
+    """
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.DIRTYPE
+    info.mode = 0o755
+    info.mtime = mtime
+    tar.addfile(info)
+
+
+def read_base_image(base_dir: Path, architecture: str):
+    """
+    Reads the manifest and configuration of the image in an OCI image layout.  If the
+    layout contains a multi-platform index, the image for the architecture is used.
+
+    :return A tuple with the manifest and the image configuration
+    """
+    index = read_json(base_dir.joinpath("index.json"))
+    descriptor = index["manifests"][0]
+
+    while descriptor.get("mediaType") in IndexMediaTypes:
+        manifests = read_blob_json(base_dir, descriptor["digest"])["manifests"]
+        matching = [
+            m
+            for m in manifests
+            if m.get("platform", {}).get("architecture")
+            == ImageArchitectures[architecture]
+        ]
+        if not matching:
+            raise ValueError(f"The base image has no {architecture} image")
+        descriptor = matching[0]
+
+    manifest = read_blob_json(base_dir, descriptor["digest"])
+    config = read_blob_json(base_dir, manifest["config"]["digest"])
+    return (manifest, config)
+
+
+def copy_blob(source_dir: Path, blobs_dir: Path, digest: str):
+    """
+    Links a blob of another OCI image layout into the blobs directory, if it is not
+    already there
+    """
+    target = blobs_dir.joinpath(digest.split(":")[1])
+    if not target.exists():
+        link_file(str(get_blob_path(source_dir, digest)), str(target))
+
+
+def write_json_blob(blobs_dir: Path, value, media_type: str) -> Descriptor:
+    """
+    Writes a JSON document as a blob
+    """
+    data = dump_json(value)
+    digest = hashlib.sha256(data).hexdigest()
+    blobs_dir.joinpath(digest).write_bytes(data)
+    return Descriptor(media_type, f"sha256:{digest}", len(data))
+
+
+def write_json(path: Path, value):
+    path.write_bytes(dump_json(value))
+
+
+def dump_json(value) -> bytes:
+    """
+    Serializes JSON deterministically, so that identical documents have the same digest
+    """
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+
+
+def read_json(path: Path):
+    with open(str(path), "rb") as f:
+        return json.load(f)
+
+
+def read_blob_json(layout_dir: Path, digest: str):
+    return read_json(get_blob_path(layout_dir, digest))
+
+
+def get_blob_path(layout_dir: Path, digest: str) -> Path:
+    (algorithm, value) = digest.split(":")
+    return layout_dir.joinpath("blobs", algorithm, value)
@@ -0,0 +1,332 @@
+import csv
+import io
+import json
+import posixpath
+import re
+from pathlib import Path
+from shlex import quote
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from zipfile import ZipFile
+
+from lambda_package.configuration import Configuration
+from lambda_package.requirements import (
+    HashOptionRegex,
+    get_build_method,
+    normalize_version,
+    read_requirement_specs,
+)
+
+"""
+The functions in this file update a requirements layer zip when only some of the pins in
+a fully pinned requirements file change, instead of installing and compressing every
+distribution again.  The pins which the previous layer was built from are stored in the
+zip's comment.  They are compared with the new pins and with the distributions recorded
+in the layer's `.dist-info` directories, so that only the added or changed distributions
+are installed.  The files of the removed and replaced distributions are found from their
+`RECORD` files, and the entries of every other file are copied from the previous zip as
+they are, without being decompressed.
+"""
+
+PinRegex = re.compile(
+    r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*===?\s*([^\s;]+)\s*(;.*)?$"
+)
+"""
+Matches a requirement pinned to a single version, such as `requests==2.31.0`, capturing
+its name, extras, version and environment marker
+"""
+
+VersionRegex = re.compile(
+    r"""
+    ^\s*v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:[-_.]?(?P<pre_label>alpha|a|beta|b|preview|pre|c|rc)[-_.]?(?P<pre>[0-9]+)?)?
+    (?:-(?P<implicit_post>[0-9]+)
+       |[-_.]?(?P<post_label>post|rev|r)[-_.]?(?P<post>[0-9]+)?)?
+    (?:[-_.]?(?P<dev_label>dev)[-_.]?(?P<dev>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+"""
+Matches a version in any of the spellings allowed by PEP 440, capturing its segments
+"""
+
+PreReleaseLabels = {"alpha": "a", "beta": "b", "c": "rc", "pre": "rc", "preview": "rc"}
+"""
+The normalized form of the alternative spellings of pre-release labels
+"""
+
+ScriptsRecordPrefix = "../../bin/"
+"""
+The prefix of the `RECORD` entries of scripts.  `pip install -t` installs into a
+temporary home directory, whose scripts directory `bin` is two levels above its library
+directory `lib/python`, and then moves `bin` into the target directory.
+"""
+
+LayerStateVersion = 1
+"""
+Included in the state stored in the layer zip's comment, to be changed whenever its
+format changes
+"""
+
+MaxCommentSize = 0xFFFF
+"""
+The largest comment a zip file can store.  Layers whose state does not fit are always
+built from scratch.
+"""
+
+
+class LayerState(NamedTuple):
+    """
+    The requirements a layer zip was built from, as stored in its comment
+    """
+
+    pins: Dict[str, str]
+    options: List[str]
+    build: List[str]
+
+
+class LayerUpdate(NamedTuple):
+    """
+    The changes needed to bring a layer up to date with new pins.  `install_specs` are
+    the requirement specifiers to install, `installed` are the names of the
+    distributions whose files are taken from that install, and `removed` are the names
+    of the distributions whose files are dropped from the previous layer.
+    """
+
+    install_specs: List[str]
+    installed: Set[str]
+    removed: Set[str]
+
+
+def read_pins(requirements_path: str) -> Optional[Tuple[Dict[str, str], List[str]]]:
+    """
+    Reads a fully pinned requirements file, such as the output of `pip-compile`.
+
+    :return A tuple of the specifier of each requirement, by its canonical name, and
+            the file's global options, or `None` if any requirement is not pinned to a
+            single version, the file includes other files, or it has hashes
+    """
+    with open(requirements_path) as f:
+        if HashOptionRegex.search(f.read().replace("\\\n", " ")):
+            # The distributions installed by an update are installed without their
+            # dependencies' hashes, so hash-checking mode would reject them
+            return None
+
+    split_requirements = read_requirement_specs(requirements_path)
+    if split_requirements is None:
+        return None
+
+    (specs, options) = split_requirements
+    pins = {}
+    for spec in specs:
+        match = PinRegex.match(spec)
+        if match is None:
+            return None
+        pins[canonicalize_name(match.group(1))] = spec
+
+    return (pins, options)
+
+
+def get_layer_state(configuration: Configuration) -> Optional[LayerState]:
+    """
+    Returns the state of a layer built from the configured requirements, or `None` if
+    the requirements are not fully pinned, as described in `read_pins`
+    """
+    requirements = read_pins(configuration.requirements)
+    if requirements is None:
+        return None
+
+    (pins, options) = requirements
+    return LayerState(pins, options, get_build_key(configuration))
+
+
+def get_build_key(configuration: Configuration) -> List[str]:
+    """
+    Returns the settings which, if changed, mean that a layer must be built from scratch
+    """
+    return [
+        normalize_version(configuration.python_version),
+        configuration.architecture,
+        get_build_method(configuration),
+        configuration.index_url or "",
+        "reproducible" if configuration.reproducible else "",
+    ]
+
+
+def read_layer_state(z: ZipFile) -> Optional[LayerState]:
+    """
+    Returns the state stored in a layer zip's comment, or `None` if it has none
+    """
+    try:
+        state = json.loads(z.comment.decode())
+    except ValueError:
+        return None
+
+    if not isinstance(state, dict) or state.get("version") != LayerStateVersion:
+        return None
+    return LayerState(state["pins"], state["options"], state["build"])
+
+
+def format_layer_state(state: LayerState) -> bytes:
+    """
+    Returns the comment which stores a layer's state, or an empty comment if the state
+    is too large to store
+    """
+    comment = json.dumps(
+        {"version": LayerStateVersion, **state._asdict()},
+        sort_keys=True,
+        separators=(",", ":"),
+    ).encode()
+    return comment if len(comment) <= MaxCommentSize else b""
+
+
+def store_layer_state(configuration: Configuration):
+    """
+    Stores the state of the configured requirements in the comment of the layer zip,
+    once it has been built from scratch, if the requirements are fully pinned
+    """
+    layer_state = get_layer_state(configuration)
+    if layer_state is not None:
+        with ZipFile(configuration.layer_output, "a") as z:
+            z.comment = format_layer_state(layer_state)
+
+
+def plan_layer_update(
+    previous_pins: Dict[str, str], pins: Dict[str, str], versions: Dict[str, str]
+) -> LayerUpdate:
+    """
+    Compares the pins of a previous layer and the new pins.  A distribution is installed
+    if its specifier has changed, or if the version recorded in the previous layer does
+    not match its pin, as compared by `canonicalize_version`.  Distributions whose pins
+    have an environment marker may not be installed at all, so they are only installed
+    when their specifier changes.
+
+    :param previous_pins    The specifiers the previous layer was built from, by name
+    :param pins             The new specifiers, by name
+    :param versions         The version of each distribution in the previous layer, as
+                            returned by `read_record_owners`
+    """
+    install_specs = []
+    for (name, spec) in pins.items():
+        match = PinRegex.match(spec)
+        version = versions.get(name)
+        if spec != previous_pins.get(name) or (
+            not match.group(4)
+            and (
+                version is None
+                or canonicalize_version(version) != canonicalize_version(match.group(3))
+            )
+        ):
+            install_specs.append(spec)
+
+    installed = {canonicalize_name(PinRegex.match(s).group(1)) for s in install_specs}
+    removed = {name for name in previous_pins if name not in pins} | installed
+    return LayerUpdate(install_specs, installed, removed)
+
+
+def write_update_requirements(
+    path: Path, update: LayerUpdate, options: List[str]
+) -> Path:
+    """
+    Writes a requirements file with the global options of the original file and the
+    specifiers to install.  Dependencies of the specifiers are installed as well, but
+    only the files of the specified distributions are used.
+    """
+    path.write_text(
+        " ".join(quote(option) for option in options)
+        + "\n"
+        + "".join(f"{spec}\n" for spec in update.install_specs)
+    )
+    return path
+
+
+def read_record_owners(
+    paths: Iterable[str], open_file: Callable[[str], io.BufferedIOBase]
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Reads the `RECORD` files of the `.dist-info` directories in an install directory or
+    a layer zip.
+
+    :param paths        The `/`-separated paths of the files, relative to the install
+                        directory
+    :param open_file    A function which opens one of the paths for binary reading
+    :return A tuple with the version of each distribution, and the name of the
+            distribution which owns each path, both keyed by canonical name.  Scripts
+            are owned at their path in the install directory, such as `bin/foo`.
+    """
+    (versions, owners) = ({}, {})
+
+    for path in paths:
+        (dist_info, _, filename) = path.partition("/")
+        if filename != "RECORD" or not dist_info.endswith(".dist-info"):
+            continue
+
+        (name, _, version) = dist_info[: -len(".dist-info")].rpartition("-")
+        name = canonicalize_name(name)
+        versions[name] = version
+        owners[path] = name
+
+        with io.TextIOWrapper(open_file(path), encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if row and row[0].startswith(ScriptsRecordPrefix):
+                    owners[f"bin/{row[0][len(ScriptsRecordPrefix):]}"] = name
+                # Other files installed outside the directory are skipped
+                elif row and not row[0].startswith(("..", "/")):
+                    owners[posixpath.normpath(row[0])] = name
+
+    return (versions, owners)
+
+
+def get_owner(owners: Dict[str, str], path: str) -> Optional[str]:
+    """
+    Returns the name of the distribution which owns a path.  Bytecode files which are
+    not recorded belong to the distribution of their source file.
+    """
+    owner = owners.get(path)
+    if owner is None and path.endswith(".pyc"):
+        (directory, _, filename) = path.rpartition("/")
+        if directory == "__pycache__" or directory.endswith("/__pycache__"):
+            source = f"{filename.split('.')[0]}.py"
+            owner = owners.get(posixpath.join(posixpath.dirname(directory), source))
+    return owner
+
+
+def canonicalize_name(name: str) -> str:
+    """
+    Normalizes a distribution name as described in PEP 503
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def canonicalize_version(version: str) -> str:
+    """
+    Normalizes a version as described in PEP 440, without the trailing zeros of its
+    release segment, so that versions which are equal, such as `2.31` and `2.31.0`,
+    have the same form.  Versions which do not follow PEP 440 are only lowercased.
+    """
+    match = VersionRegex.match(version)
+    if match is None:
+        return version.strip().lower()
+
+    release = [int(part) for part in match.group("release").split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    canonical = ".".join(str(part) for part in release)
+    if match.group("epoch") and int(match.group("epoch")):
+        canonical = f"{int(match.group('epoch'))}!{canonical}"
+    if match.group("pre_label"):
+        label = match.group("pre_label").lower()
+        label = PreReleaseLabels.get(label, label)
+        canonical += f"{label}{int(match.group('pre') or 0)}"
+    if match.group("implicit_post") or match.group("post_label"):
+        post = match.group("implicit_post") or match.group("post") or 0
+        canonical += f".post{int(post)}"
+    if match.group("dev_label"):
+        canonical += f".dev{int(match.group('dev') or 0)}"
+    if match.group("local"):
+        canonical += "+" + re.sub(r"[-_]", ".", match.group("local").lower())
+    return canonical
@@ -1,16 +1,71 @@
+import os
 import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from copy import copy as copy_object
+from itertools import chain, groupby
 from os import walk
 from pathlib import Path
-from shutil import rmtree
-from typing import List, Tuple
+from shutil import copyfile, rmtree
+from threading import Thread
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
 import pathspec
 
-from lambda_package.configuration import Configuration
-from lambda_package.requirements import build_requirements
+from lambda_package.archive import (
+    copy_raw_entry,
+    get_reproducible_date_time,
+    is_large_file,
+    read_file_entry,
+    write_cached_file,
+    write_compressed_file,
+    write_data,
+    write_file,
+    write_large_file,
+)
+from lambda_package.compressors import Compressors, get_compressor
+from lambda_package.configuration import (
+    Architectures,
+    BuildMethods,
+    Configuration,
+    DedupePolicies,
+    Walkers,
+)
+from lambda_package.dedupe import dedupe_paths
+from lambda_package.events import Events, optional_phase
+from lambda_package.image import write_image
+from lambda_package.incremental import (
+    format_layer_state,
+    get_build_key,
+    get_layer_state,
+    get_owner,
+    plan_layer_update,
+    read_layer_state,
+    read_record_owners,
+    store_layer_state,
+    write_update_requirements,
+)
+from lambda_package.layers import (
+    MaxLayerCount,
+    get_history_path,
+    get_layer_outputs,
+    get_previous_keys,
+    plan_layers,
+    read_history,
+    record_layers,
+    remove_stale_layer_outputs,
+    write_history,
+)
+from lambda_package.prefetch import ReadAheadMaxFileSize, prefetch
+from lambda_package.remote_cache import get_artifact_cache, get_layer_cache_key
+from lambda_package.requirements import (
+    build_requirements,
+    create_temp_requirements_directory,
+)
+from lambda_package.sync import LayerDirPath, TaskDirPath, sync_directory
+from lambda_package.tree_shaking import shake_paths
 
 
-def package(root_path=".", configuration: Configuration = None):
+def package(root_path=".", configuration: Configuration = None, events: Events = None):
     """
     Creates a zip package of the given directory, while excluding any files which
     have been specified in the exclude patterns.
@@ -22,10 +77,22 @@ def package(root_path=".", configuration: Configuration = None):
     attempt to read patterns from the `.gitignore` file.
 
     If no output file is specified in the configuration then the zip package will not be
-    generated, but the included files will still be returned.
+    generated, but the included files will still be returned.  If an output directory
+    is specified, the files are also written into it, in the layout of the Lambda
+    runtime, with the requirements in `opt/python` as if they were a layer.  If an image
+    output is specified, a container image is written in the OCI image layout, with the
+    requirements and the source files in separate layers.  If tree shaking is enabled,
+    the Python modules which the handler cannot import are left out of every output.
+    If incremental layer updates are enabled, the previous layer zip is updated for the
+    changed pins when possible, instead of being built from scratch.
+    If the layer count is more than one, the requirements are split across several
+    layer zips, and the layers whose files have not changed are not written again.
+    If deduplication is enabled, the files which are in both the function package and
+    the layer with the same contents are removed from one of them.
 
     :param root_path        The path of the directory to package up
     :param configuration    The packager configuration.  See the `Configuration` class.
+    :param events           An optional `Events` object which receives progress events.
     :return A tuple with two elements:
         files_list  A list of pathlib files which did not meet the exclusion criteria
         files_tree  A recursive tuple in the form `(name, dirs, files)`,
@@ -34,40 +101,255 @@ def package(root_path=".", configuration: Configuration = None):
     """
 
     configuration = validate_configuration(configuration)
+    return run_package(root_path, configuration, events)
 
-    (source_paths, source_tree) = find_paths(
-        root_path=Path(root_path), excludes=configuration.exclude
+
+def stream_package(
+    root_path=".", configuration: Configuration = None, events: Events = None
+):
+    """
+    Creates the same zip packages as `package`, but streams the files from the
+    directory walks into the zips as they are found, without collecting them into
+    lists, so that memory use does not grow with the number of files.  The files are
+    therefore not returned.  Each directory is walked once beforehand to count its
+    files, so that the phases have totals.
+
+    The output directory, image outputs, tree shaking, split layers, deduplication and
+    the `"threaded"` walker need every file at once, so if any of them is configured
+    the files are collected as by `package`.
+
+    :param root_path        The path of the directory to package up
+    :param configuration    The packager configuration.  See the `Configuration` class.
+    :param events           An optional `Events` object which receives progress events.
+    """
+    configuration = validate_configuration(configuration)
+    run_package(root_path, configuration, events, stream=True)
+
+
+def run_package(
+    root_path,
+    configuration: Configuration,
+    events: Events = None,
+    stream=False,
+    build: Callable[[Configuration, Events], Path] = None,
+):
+    """
+    Creates the packages of `package`, `stream_package` and `package_async`, which
+    differ only in whether the files are collected into lists or streamed as
+    `PathStream` objects, and in how the requirements are built
+
+    :param build    The function which builds the requirements, called with the
+                    configuration and the events, or `None` for `build_requirements`
+    :return The `(files_list, files_tree)` tuple of `package`, or a tuple of `None`
+            values if the files were streamed
+    """
+    stream = stream and not (
+        configuration.output_dir
+        or configuration.image_output
+        or configuration.tree_shaking
+        or configuration.layer_count > 1
+        or configuration.dedupe
+        or configuration.walker != "sequential"
     )
-    zip_paths = get_zip_package_paths(paths=source_paths, root_dir=root_path)
+
+    (source_paths, source_tree) = (None, None)
+    with optional_phase(events, "find_paths"):
+        if stream:
+            zip_paths = PathStream.walk(
+                lambda events: iter_paths(
+                    Path(root_path), configuration.exclude, events
+                ),
+                root_path,
+                events,
+            )
+        else:
+            (source_paths, source_tree) = find_source_paths(
+                root_path, configuration, events
+            )
+            zip_paths = get_zip_package_paths(paths=source_paths, root_dir=root_path)
 
     will_build_requirements = configuration.requirements and (
-        configuration.output or configuration.layer_output
+        configuration.output
+        or configuration.layer_output
+        or configuration.output_dir
+        or configuration.image_output
     )
 
-    if will_build_requirements:
-        requirements_dir = build_requirements(configuration)
-        requirements_files = get_files_in_directory(requirements_dir)
-        requirements_zip_paths = get_zip_package_paths(
-            paths=requirements_files, root_dir=requirements_dir
+    if configuration.layer_output:
+        remove_stale_layer_outputs(
+            configuration.layer_output, configuration.layer_count
         )
 
-        if configuration.layer_output:
-            zip_package(
-                paths=requirements_zip_paths,
-                fp=configuration.layer_output,
-            )
-        else:
-            zip_paths.extend(requirements_zip_paths)
+    # A prebuilt layer can be reused from the local or remote cache, unless its files
+    # are needed for the output directory, the image, tree shaking or deduplication
+    # against the function package, or are split across several layers
+    if (
+        will_build_requirements
+        and configuration.layer_output
+        and configuration.layer_count == 1
+        and not configuration.output_dir
+        and not configuration.image_output
+        and not configuration.tree_shaking
+        and configuration.dedupe != "function"
+        and fetch_cached_layer(configuration)
+    ):
+        will_build_requirements = False
+
+    if (
+        will_build_requirements
+        and configuration.incremental_layer
+        and not configuration.output_dir
+        and not configuration.image_output
+        and not configuration.tree_shaking
+        and configuration.dedupe != "function"
+    ):
+        if update_layer(configuration, events):
+            store_cached_layer(configuration)
+            will_build_requirements = False
+
+    requirements_dir = None
+    try:
+        requirements_zip_paths = []
+        if will_build_requirements:
+            with optional_phase(events, "build_requirements"):
+                requirements_dir = (build or build_requirements)(configuration, events)
+            if stream:
+                requirements_zip_paths = PathStream.walk(
+                    lambda _: iter_files_in_directory(requirements_dir),
+                    requirements_dir,
+                )
+            else:
+                requirements_zip_paths = get_zip_package_paths(
+                    paths=get_files_in_directory(requirements_dir),
+                    root_dir=requirements_dir,
+                )
+
+        if configuration.tree_shaking:
+            with optional_phase(events, "tree_shaking"):
+                ((zip_paths, requirements_zip_paths), report) = shake_paths(
+                    [zip_paths, requirements_zip_paths],
+                    configuration.handler,
+                    configuration.tree_shaking_keep,
+                )
+            if events is not None:
+                events.emit(
+                    "tree_shaken",
+                    total=report.removed_modules,
+                    raw_bytes=report.removed_bytes,
+                )
+
+        if configuration.dedupe and configuration.layer_output:
+            # Without installed requirements, the layer was reused and is read instead
+            with optional_phase(events, "dedupe"):
+                (zip_paths, requirements_zip_paths, report) = dedupe_paths(
+                    zip_paths,
+                    requirements_zip_paths if will_build_requirements else None,
+                    configuration.dedupe,
+                    configuration.layer_output,
+                )
+            if events is not None:
+                events.emit(
+                    "deduplicated",
+                    total=report.removed_files,
+                    raw_bytes=report.removed_bytes,
+                    message="layer"
+                    if configuration.dedupe == "function"
+                    else "package",
+                )
+
+        if configuration.output_dir:
+            with optional_phase(events, "sync_package", len(zip_paths)):
+                sync_directory(
+                    zip_paths, Path(configuration.output_dir).joinpath(*TaskDirPath)
+                )
 
-    if configuration.output:
-        zip_package(paths=zip_paths, fp=configuration.output)
+        image_layers = [zip_paths]
 
-    if will_build_requirements:
-        rmtree(requirements_dir)
+        if will_build_requirements:
+            if configuration.output_dir:
+                with optional_phase(events, "sync_layer", len(requirements_zip_paths)):
+                    sync_directory(
+                        requirements_zip_paths,
+                        Path(configuration.output_dir).joinpath(*LayerDirPath),
+                    )
+
+            # The requirements layer comes first, so that it is reused when only the
+            # source files change
+            image_layers.insert(0, requirements_zip_paths)
+
+            if configuration.layer_output and configuration.layer_count > 1:
+                zip_layers(requirements_zip_paths, configuration, events)
+            elif configuration.layer_output:
+                with optional_phase(events, "zip_layer", len(requirements_zip_paths)):
+                    zip_package(
+                        paths=requirements_zip_paths,
+                        fp=configuration.layer_output,
+                        configuration=configuration,
+                        events=events,
+                    )
+                # A layer without some of its files can only be used by this function
+                if (
+                    not configuration.tree_shaking
+                    and configuration.dedupe != "function"
+                ):
+                    if configuration.incremental_layer:
+                        store_layer_state(configuration)
+                    store_cached_layer(configuration)
+            else:
+                zip_paths = zip_paths + requirements_zip_paths
+
+        if configuration.image_output:
+            with optional_phase(events, "write_image"):
+                write_image(
+                    output_dir=Path(configuration.image_output),
+                    layers=image_layers,
+                    base_dir=Path(configuration.image_base)
+                    if configuration.image_base
+                    else None,
+                    architecture=configuration.architecture,
+                    handler=configuration.handler,
+                )
+
+        if configuration.output:
+            with optional_phase(events, "zip_package", len(zip_paths)):
+                zip_package(
+                    paths=zip_paths,
+                    fp=configuration.output,
+                    configuration=configuration,
+                    events=events,
+                )
+    finally:
+        if requirements_dir is not None:
+            # The build directory is removed in the background so that it does not
+            # block the caller.  The interpreter waits for the thread to finish before
+            # exiting.
+            Thread(
+                target=rmtree,
+                args=(str(requirements_dir),),
+                kwargs={"ignore_errors": True},
+            ).start()
 
     return (source_paths, source_tree)
 
 
+def find_source_paths(root_path, configuration: Configuration, events: Events = None):
+    """
+    Finds the files to package in `root_path`, using the configured walker.  See
+    `find_paths` for the return value.
+    """
+    if configuration.walker == "threaded":
+        return find_paths_threaded(
+            root_path=Path(root_path),
+            excludes=configuration.exclude,
+            max_workers=configuration.walker_threads,
+            events=events,
+        )
+
+    return find_paths(
+        root_path=Path(root_path), excludes=configuration.exclude, events=events
+    )
+
+
 def validate_configuration(configuration: Configuration) -> Configuration:
     """
     Validates the configuration.  If configuration is `None`, it will be
@@ -80,11 +362,95 @@ def validate_configuration(configuration: Configuration) -> Configuration:
     if not configuration.exclude:
         configuration.exclude = read_gitignore()
 
+    if configuration.walker not in Walkers:
+        raise ValueError(
+            f"Invalid walker: '{configuration.walker}'. "
+            f"Walker must be one of: {', '.join(Walkers)}"
+        )
+
+    if configuration.build_method and configuration.build_method not in BuildMethods:
+        raise ValueError(
+            f"Invalid build method: '{configuration.build_method}'. "
+            f"Build method must be one of: {', '.join(BuildMethods)}"
+        )
+
+    if (
+        configuration.compressor != "auto"
+        and configuration.compressor not in Compressors
+    ):
+        raise ValueError(
+            f"Invalid compressor: '{configuration.compressor}'. "
+            f"Compressor must be one of: auto, {', '.join(Compressors)}"
+        )
+
+    if configuration.architecture not in Architectures:
+        raise ValueError(
+            f"Invalid architecture: '{configuration.architecture}'. "
+            f"Architecture must be one of: {', '.join(Architectures)}"
+        )
+
     if configuration.layer_output and not configuration.requirements:
         raise ValueError(
             "Layer output parameter cannot be given without requirements parameter"
         )
 
+    if not 1 <= configuration.layer_count <= MaxLayerCount:
+        raise ValueError(
+            f"Invalid layer count: '{configuration.layer_count}'. "
+            f"Layer count must be between 1 and {MaxLayerCount}"
+        )
+
+    if configuration.builder_pool_size < 1:
+        raise ValueError(
+            f"Invalid builder pool size: '{configuration.builder_pool_size}'. "
+            "Builder pool size must be at least 1"
+        )
+
+    # Builder containers mount the workspace at its host path, which is not a valid
+    # path in a Linux container on Windows
+    if configuration.builder_pool and os.name == "nt":
+        raise ValueError("Builder pool parameter cannot be given on Windows")
+
+    if configuration.layer_count > 1 and not configuration.layer_output:
+        raise ValueError(
+            "Layer count parameter cannot be given without layer output parameter"
+        )
+
+    if configuration.incremental_layer and configuration.layer_count > 1:
+        raise ValueError(
+            "Incremental layer parameter cannot be given with more than one layer"
+        )
+
+    if configuration.incremental_layer and not configuration.layer_output:
+        raise ValueError(
+            "Incremental layer parameter cannot be given without layer output parameter"
+        )
+
+    if configuration.dedupe and configuration.dedupe not in DedupePolicies:
+        raise ValueError(
+            f"Invalid dedupe policy: '{configuration.dedupe}'. "
+            f"Dedupe policy must be one of: {', '.join(DedupePolicies)}"
+        )
+
+    if configuration.dedupe and not configuration.layer_output:
+        raise ValueError(
+            "Dedupe parameter cannot be given without layer output parameter"
+        )
+
+    if configuration.tree_shaking and not configuration.handler:
+        raise ValueError(
+            "Tree shaking parameter cannot be given without handler parameter"
+        )
+
+    if (
+        configuration.image_base
+        and not Path(configuration.image_base).joinpath("index.json").exists()
+    ):
+        raise ValueError(
+            f"Invalid image base: '{configuration.image_base}'. "
+            "Image base must be a directory in the OCI image layout"
+        )
+
     return configuration
 
 
@@ -105,13 +471,16 @@ def read_gitignore():
     return excludes
 
 
-def find_paths(root_path, excludes):
+def find_paths(root_path, excludes, events: Events = None):
     """
     Files all files in the `root_path` directory, excluding those which are covered by
-    the exlusion patterns.
+    the exlusion patterns.  This collects the output of `walk_paths` into a list and a
+    tree; use `iter_paths` to process the files without holding them in memory.
 
     :param root_path     The directory to be searched, as a `pathlib` path
     :param excludes      A list of .gitignore exclude patterns, or a pathspec
+    :param events        An optional `Events` object which receives a
+                         `directory_scanned` event for each directory
     :return A tuple with two elements:
         files_list  A list of pathlib files which did not meet the exclusion criteria
         files_tree  A recursive tuple in the form `(name, dirs, files)`,
@@ -120,24 +489,131 @@ def find_paths(root_path, excludes):
     """
     files_list = []
     files_tree = (root_path.name, [], [])
+    trees = {root_path: files_tree}
 
-    exclude_spec = (
-        excludes
-        if isinstance(excludes, pathspec.PathSpec)
-        else pathspec.PathSpec.from_lines("gitwildmatch", excludes)
-    )
+    for (parent, path, is_dir) in walk_paths(
+        root_path, get_exclude_spec(excludes), events
+    ):
+        parent_tree = trees[parent]
+        if is_dir:
+            trees[path] = (path.name, [], [])
+            parent_tree[1].append(trees[path])
+        else:
+            parent_tree[2].append(path)
+            files_list.append(path)
+
+    return (files_list, files_tree)
+
+
+def iter_paths(root_path, excludes, events: Events = None) -> Iterator[Path]:
+    """
+    Yields the files in the `root_path` directory which are not covered by the
+    exclusion patterns, in the same order as `find_paths`, while the directory is
+    walked.  Only the listing of the directories being walked is held in memory.
+
+    :param root_path     The directory to be searched, as a `pathlib` path
+    :param excludes      A list of .gitignore exclude patterns, or a pathspec
+    :param events        An optional `Events` object, as for `find_paths`
+    """
+    for (_, path, is_dir) in walk_paths(root_path, get_exclude_spec(excludes), events):
+        if not is_dir:
+            yield path
+
+
+def walk_paths(
+    root_path: Path, exclude_spec: pathspec.PathSpec, events: Events = None
+) -> Iterator[Tuple[Path, Path, bool]]:
+    """
+    Walks a directory depth-first, yielding a tuple for each entry which is not
+    excluded, with the directory containing it, its path, and whether it is a
+    directory.  A directory is yielded before its contents, and a `directory_scanned`
+    event is emitted once its contents have been yielded.
+    """
+    total = 0
 
     for subpath in root_path.iterdir():
         if not exclude_spec.match_file(subpath):
             if subpath.is_dir():
-                (sub_files_list, sub_files_tree) = find_paths(subpath, exclude_spec)
+                yield (root_path, subpath, True)
+                yield from walk_paths(subpath, exclude_spec, events)
+            else:
+                total += 1
+                yield (root_path, subpath, False)
+
+    if events is not None:
+        events.emit("directory_scanned", path=str(root_path), total=total)
+
+
+def find_paths_threaded(root_path, excludes, max_workers=16, events: Events = None):
+    """
+    Finds all files in the `root_path` directory, excluding those which are covered by
+    the exclusion patterns, by scanning directories concurrently in a thread pool.  This
+    is faster than `find_paths` on high-latency filesystems such as NFS or EFS, where
+    each directory listing is a network round trip.  The results are identical to those
+    of `find_paths`, and in the same order.
+
+    :param root_path     The directory to be searched, as a `pathlib` path
+    :param excludes      A list of .gitignore exclude patterns, or a pathspec
+    :param max_workers   The maximum number of directories scanned at the same time
+    :param events        An optional `Events` object, as for `find_paths`
+    :return The same `(files_list, files_tree)` tuple as `find_paths`
+    """
+    exclude_spec = get_exclude_spec(excludes)
+    listings = {}
+
+    def scan(path):
+        return [
+            (subpath, subpath.is_dir())
+            for subpath in path.iterdir()
+            if not exclude_spec.match_file(subpath)
+        ]
+
+    # Scan each subdirectory as soon as its parent's listing is available
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(scan, root_path): root_path}
+        while pending:
+            (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                listings[path] = future.result()
+                for (subpath, is_dir) in listings[path]:
+                    if is_dir:
+                        pending[executor.submit(scan, subpath)] = subpath
+                if events is not None:
+                    events.emit(
+                        "directory_scanned",
+                        path=str(path),
+                        total=sum(not is_dir for (_, is_dir) in listings[path]),
+                    )
+
+    # Assemble the results in the same depth-first order as `find_paths`
+    def assemble(path):
+        files_list = []
+        files_tree = (path.name, [], [])
+
+        for (subpath, is_dir) in listings[path]:
+            if is_dir:
+                (sub_files_list, sub_files_tree) = assemble(subpath)
                 files_tree[1].append(sub_files_tree)
                 files_list.extend(sub_files_list)
             else:
                 files_tree[2].append(subpath)
                 files_list.append(subpath)
 
-    return (files_list, files_tree)
+        return (files_list, files_tree)
+
+    return assemble(root_path)
+
+
+def get_exclude_spec(excludes) -> pathspec.PathSpec:
+    """
+    Returns a pathspec for a list of .gitignore exclude patterns.  If `excludes` is
+    already a pathspec, it is returned unchanged.
+    """
+    if isinstance(excludes, pathspec.PathSpec):
+        return excludes
+
+    return pathspec.PathSpec.from_lines("gitwildmatch", excludes)
 
 
 def get_files_in_directory(dir_name: str):
@@ -145,14 +621,17 @@ def get_files_in_directory(dir_name: str):
     Returns a list of all the files in the given directory.  Recursively searches
     subdirectories.
     """
-    filenames = []
+    return list(iter_files_in_directory(dir_name))
 
-    for entry in walk(dir_name):
-        root_dir = entry[0]
-        dir_files = entry[2]
-        filenames.extend([Path(root_dir).joinpath(file) for file in dir_files])
 
-    return filenames
+def iter_files_in_directory(dir_name: str) -> Iterator[Path]:
+    """
+    Yields all the files in the given directory while it is walked, as for
+    `get_files_in_directory`
+    """
+    for (root_dir, _, dir_files) in walk(dir_name):
+        for file in dir_files:
+            yield Path(root_dir).joinpath(file)
 
 
 def get_zip_package_paths(paths: List[Path], root_dir=None) -> List[Tuple[Path, Path]]:
@@ -161,17 +640,419 @@ def get_zip_package_paths(paths: List[Path], root_dir=None) -> List[Tuple[Path,
     the destination path within the package zip file.  The destination paths are
     simply the source paths but relative to `root_dir`.
     """
-    return [(path, path.relative_to(root_dir)) for path in paths]
+    return list(iter_zip_package_paths(paths, root_dir))
+
+
+def iter_zip_package_paths(
+    paths: Iterable[Path], root_dir=None
+) -> Iterator[Tuple[Path, Path]]:
+    """
+    Yields the tuples of `get_zip_package_paths` lazily, for any iterable of paths
+    """
+    for path in paths:
+        yield (path, path.relative_to(root_dir))
 
 
-def zip_package(paths: List[Path], fp, compression=zipfile.ZIP_DEFLATED):
+class PathStream:
     """
-    Takes a list of Path objects and compress those files into a zip archive
+    The zip package paths of a directory, as returned by `get_zip_package_paths`, but
+    which walks the directory again each time it is iterated instead of holding the
+    paths in memory.  Its length is the number of files counted by the first walk, and
+    adding another `PathStream` chains their walks.
     """
 
+    def __init__(
+        self, iter_zip_paths: Callable[[], Iterator[Tuple[Path, Path]]], total
+    ):
+        self.iter_zip_paths = iter_zip_paths
+        self.total = total
+
+    @classmethod
+    def walk(
+        cls,
+        iter_files: Callable[[Optional[Events]], Iterable[Path]],
+        root_dir,
+        events: Events = None,
+    ) -> "PathStream":
+        """
+        Counts the files yielded by `iter_files`, which is called with `events` for the
+        first walk and with `None` for the walks of each iteration, so that directory
+        events are only emitted once
+
+        :param iter_files   A function which walks the directory
+        :param root_dir     The directory to which the zip paths are relative
+        :param events       An optional `Events` object for the first walk
+        """
+        total = sum(1 for _ in iter_files(events))
+        return cls(lambda: iter_zip_package_paths(iter_files(None), root_dir), total)
+
+    def __iter__(self) -> Iterator[Tuple[Path, Path]]:
+        return self.iter_zip_paths()
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __add__(self, other: "PathStream") -> "PathStream":
+        return PathStream(lambda: chain(self, other), self.total + other.total)
+
+
+def sort_zip_package_paths(paths: List[Tuple[Path, Path]]) -> List[Tuple[Path, Path]]:
+    """
+    Sorts a list of tuples returned by `get_zip_package_paths` by their destination
+    path, independently of the platform's path separator
+    """
+    return sorted(paths, key=lambda path: Path(path[1]).as_posix())
+
+
+def zip_package(
+    paths: Iterable[Tuple[Path, Path]],
+    fp,
+    compression=zipfile.ZIP_DEFLATED,
+    configuration: Configuration = None,
+    events: Events = None,
+):
+    """
+    Takes a list of Path objects and compress those files into a zip archive.  Files
+    larger than the configured `large_file_threshold` are written using memory-mapped
+    reads, and are stored uncompressed if they do not compress well.  If `events` is
+    given, a `file_compressed` event is emitted for each file.  `paths` may be any
+    iterable, such as the output of `iter_zip_package_paths`, and is consumed lazily.
+
+    If the configuration is reproducible, the entries are sorted by name and their
+    metadata is normalized, so that the same files always produce the same zip.  The
+    paths are then collected into a list to be sorted.
+    """
+    if configuration is not None and configuration.reproducible:
+        paths = sort_zip_package_paths(paths)
+
     with zipfile.ZipFile(
         file=fp, mode="w", compression=compression, compresslevel=9
     ) as z:
-        for path in paths:
-            (local_path, zip_path) = path
+        write_package_entries(z, paths, configuration, events)
+
+
+def write_package_entries(
+    z: zipfile.ZipFile,
+    paths: Iterable[Tuple[Path, Path]],
+    configuration: Configuration = None,
+    events: Events = None,
+):
+    """
+    Writes files into an open zip archive, as described in `zip_package`.
+    """
+    configuration = configuration if configuration else Configuration()
+    is_deflated = z.compression == zipfile.ZIP_DEFLATED
+    large_file_threshold = configuration.large_file_threshold if is_deflated else None
+    cached_entry_threshold = (
+        configuration.remote_cache_min_size
+        if is_deflated and configuration.remote_cache
+        else None
+    )
+    artifact_cache = (
+        get_artifact_cache(configuration)
+        if cached_entry_threshold is not None
+        else None
+    )
+    compressor = (
+        get_compressor(configuration.compressor)
+        if is_deflated and configuration.compressor != "zlib"
+        else None
+    )
+    date_time = get_reproducible_date_time() if configuration.reproducible else None
+
+    if configuration.read_ahead:
+        # Only files which would be written from memory anyway are read ahead
+        max_size = min(
+            [ReadAheadMaxFileSize]
+            + [
+                max(threshold, 1) - 1
+                for threshold in [cached_entry_threshold, large_file_threshold]
+                if threshold is not None
+            ]
+        )
+        entries = prefetch(
+            paths,
+            lambda path: read_file_entry(
+                str(path[0]), str(path[1]), max_size, date_time
+            ),
+            depth=configuration.read_ahead,
+            threads=configuration.read_ahead_threads,
+        )
+    else:
+        entries = ((path, None) for path in paths)
+
+    for (path, entry) in entries:
+        (local_path, zip_path) = path
+        if entry is not None:
+            (zinfo, data) = entry
+            write_data(z, zinfo, data, compressor)
+        elif is_large_file(str(local_path), cached_entry_threshold):
+            write_cached_file(
+                z,
+                artifact_cache,
+                str(local_path),
+                str(zip_path),
+                z.compresslevel,
+                date_time,
+            )
+        elif is_large_file(str(local_path), large_file_threshold):
+            write_large_file(
+                z, str(local_path), str(zip_path), z.compresslevel, date_time
+            )
+        elif compressor is not None:
+            write_compressed_file(
+                z,
+                compressor,
+                str(local_path),
+                str(zip_path),
+                z.compresslevel,
+                date_time,
+            )
+        elif date_time is not None:
+            write_file(z, str(local_path), str(zip_path), date_time)
+        else:
             z.write(filename=str(path[0]), arcname=str(path[1]))
+
+        if events is not None:
+            zinfo = z.filelist[-1]
+            events.emit(
+                "file_compressed",
+                path=zinfo.filename,
+                raw_bytes=zinfo.file_size,
+                compressed_bytes=zinfo.compress_size,
+            )
+
+
+def update_layer(configuration: Configuration, events: Events = None) -> bool:
+    """
+    Updates the previous layer zip at `layer_output` for the configured requirements,
+    as described in the `incremental` module.  Only the added or changed distributions
+    are installed and compressed, and the entries of the other files are copied from
+    the previous zip.
+
+    :return `True` if the layer is up to date, or `False` if it must be built from
+            scratch, because there is no previous layer, it was built differently, or
+            the requirements are not fully pinned
+    """
+    layer_path = Path(configuration.layer_output)
+    layer_state = get_layer_state(configuration)
+    if layer_state is None or not layer_path.is_file():
+        return False
+
+    with zipfile.ZipFile(str(layer_path)) as previous:
+        previous_state = read_layer_state(previous)
+        if (
+            previous_state is None
+            or previous_state.options != layer_state.options
+            or previous_state.build != layer_state.build
+        ):
+            return False
+
+        (versions, owners) = read_record_owners(previous.namelist(), previous.open)
+        update = plan_layer_update(previous_state.pins, layer_state.pins, versions)
+        if not update.removed and not update.install_specs:
+            return True
+
+        (update_dir, requirements_dir) = (None, None)
+        temp_path = layer_path.with_name(f".{layer_path.name}.update")
+        try:
+            new_paths = []
+            if update.install_specs:
+                update_dir = create_temp_requirements_directory(configuration, "update")
+                update_configuration = copy_object(configuration)
+                update_configuration.requirements = str(
+                    write_update_requirements(
+                        update_dir.joinpath("requirements.txt"),
+                        update,
+                        layer_state.options,
+                    )
+                )
+                with optional_phase(events, "build_requirements"):
+                    requirements_dir = build_requirements(update_configuration, events)
+
+                install_paths = get_zip_package_paths(
+                    get_files_in_directory(requirements_dir), requirements_dir
+                )
+                (_, install_owners) = read_record_owners(
+                    [path[1].as_posix() for path in install_paths],
+                    lambda path: open(str(requirements_dir.joinpath(path)), "rb"),
+                )
+
+                # Unrecorded files which the previous layer lacks, such as bytecode
+                # compiled after the install, are added as well
+                previous_names = set(previous.namelist())
+                for path in install_paths:
+                    name = path[1].as_posix()
+                    owner = get_owner(install_owners, name)
+                    if owner in update.installed or (
+                        owner is None and name not in previous_names
+                    ):
+                        new_paths.append(path)
+
+            new_names = {path[1].as_posix() for path in new_paths}
+            entries = [
+                (zinfo.filename, zinfo, None)
+                for zinfo in previous.infolist()
+                if get_owner(owners, zinfo.filename) not in update.removed
+                and zinfo.filename not in new_names
+            ] + [(path[1].as_posix(), None, path) for path in new_paths]
+            if configuration.reproducible:
+                entries.sort(key=lambda entry: entry[0])
+
+            with optional_phase(events, "zip_layer", len(entries)):
+                with zipfile.ZipFile(
+                    str(temp_path), "w", zipfile.ZIP_DEFLATED, compresslevel=9
+                ) as z:
+                    # Runs of copied entries and of new files are written in turn
+                    for (is_copied, run) in groupby(
+                        entries, lambda e: e[1] is not None
+                    ):
+                        if is_copied:
+                            for (_, zinfo, _) in run:
+                                copy_raw_entry(z, previous, zinfo)
+                        else:
+                            write_package_entries(
+                                z, [entry[2] for entry in run], configuration, events
+                            )
+                    z.comment = format_layer_state(layer_state)
+        except BaseException:
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+        finally:
+            for directory in [update_dir, requirements_dir]:
+                if directory is not None:
+                    rmtree(str(directory), ignore_errors=True)
+
+    temp_path.replace(layer_path)
+
+    if events is not None:
+        events.emit(
+            "log",
+            message=(
+                f"Updated the layer: installed {len(update.installed)} and removed "
+                f"{len(update.removed - update.installed)} distributions\n"
+            ),
+        )
+    return True
+
+
+def zip_layers(
+    paths: List[Tuple[Path, Path]], configuration: Configuration, events: Events = None
+) -> List[Path]:
+    """
+    Splits the requirements across `layer_count` layer zips, as described in the
+    `layers` module, and updates the layer history.  Layers whose files have not
+    changed since the last build are not written again.  A `log` event describes each
+    layer.
+
+    :param paths            The requirements, as returned by `get_zip_package_paths`
+    :param configuration    The packager configuration
+    :param events           An optional `Events` object which receives progress events
+    :return The paths of the layer zips, leaving out layers with no files
+    """
+    history_path = get_history_path(
+        configuration.layer_output, configuration.layer_history
+    )
+    history = read_history(history_path)
+    previous_keys = get_previous_keys(history)
+    # The settings which change the bytes of the zips are part of the layer keys too
+    zip_settings = [
+        configuration.compressor,
+        str(configuration.large_file_threshold),
+        "reproducible" if configuration.reproducible else "",
+    ]
+    plan = plan_layers(
+        paths,
+        history,
+        configuration.layer_count,
+        configuration.layer_size_limit,
+        get_build_key(configuration) + zip_settings,
+    )
+
+    layer_outputs = []
+    for (index, output) in enumerate(
+        get_layer_outputs(configuration.layer_output, configuration.layer_count)
+    ):
+        if not plan.layers[index]:
+            # A layer left over from a build with more files is removed
+            if output.exists():
+                output.unlink()
+            continue
+
+        is_reused = (
+            index < len(previous_keys)
+            and previous_keys[index] == plan.keys[index]
+            and output.is_file()
+        )
+        if not is_reused:
+            with optional_phase(events, "zip_layer", len(plan.layers[index])):
+                zip_package(
+                    paths=plan.layers[index],
+                    fp=str(output),
+                    configuration=configuration,
+                    events=events,
+                )
+
+        if events is not None:
+            events.emit(
+                "log",
+                message=(
+                    f"{output.name}: {len(plan.distributions[index])} distributions, "
+                    f"{plan.sizes[index] / 1048576:.1f} MB, "
+                    f"{'unchanged' if is_reused else 'written'}\n"
+                ),
+            )
+        layer_outputs.append(output)
+
+    record_layers(history, plan)
+    write_history(history_path, history)
+    return layer_outputs
+
+
+def fetch_cached_layer(configuration: Configuration) -> bool:
+    """
+    Copies a previously built layer zip for the configured requirements to
+    `layer_output`, from the local build cache or the remote cache.  Layers are only
+    cached when a remote cache is configured.
+
+    :return Whether a cached layer was found
+    """
+    if not configuration.remote_cache:
+        return False
+
+    artifact_cache = get_artifact_cache(configuration)
+    with artifact_cache.fetch(
+        "layers", get_layer_cache_key(configuration), is_valid_zip
+    ) as cached_layer:
+        if cached_layer is None:
+            return False
+        copyfile(str(cached_layer), configuration.layer_output)
+        return True
+
+
+def is_valid_zip(path: Path) -> bool:
+    """
+    Returns whether a file is a zip whose entries all match their CRC, such that a
+    truncated or corrupted download is not used as a layer
+    """
+    if not zipfile.is_zipfile(str(path)):
+        return False
+    try:
+        with zipfile.ZipFile(str(path)) as z:
+            return z.testzip() is None
+    except (zipfile.BadZipFile, OSError, EOFError):
+        return False
+
+
+def store_cached_layer(configuration: Configuration):
+    """
+    Adds the built layer zip to the local build cache and the remote cache
+    """
+    if configuration.remote_cache:
+        artifact_cache = get_artifact_cache(configuration)
+        artifact_cache.store(
+            "layers",
+            get_layer_cache_key(configuration),
+            Path(configuration.layer_output),
+        )
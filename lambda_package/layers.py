@@ -0,0 +1,284 @@
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from lambda_package.archive import hash_file
+from lambda_package.incremental import get_owner, read_record_owners
+
+"""
+The functions in this file split the requirements across several layer zips.  Each
+installed distribution is assigned to a layer, so that large distributions which rarely
+change, such as `numpy`, are kept apart from those which change often.  How often each
+distribution changes is estimated from a history of previous builds, which also records
+the layer of each distribution, so that distributions stay in their layer from one
+build to the next.  A layer whose files have not changed, by their contents, and whose
+zip settings have not changed either, is not written again, and so is reused
+byte-for-byte.
+"""
+
+logger = logging.getLogger(__name__)
+
+MaxLayerCount = 5
+"""
+The largest number of layers a Lambda function can use
+"""
+
+VolatileChangeRate = 0.25
+"""
+Distributions whose version changed in at least this fraction of the builds since they
+were first seen are assigned to the last layer
+"""
+
+LayerHistoryVersion = 1
+"""
+Included in the layer history file, to be changed whenever its format changes
+"""
+
+
+class LayerPlan(NamedTuple):
+    """
+    The files of each layer, as tuples of their source path and their path within the
+    layer, the names of the distributions of each layer, the total size of the files of
+    each layer, and a key which changes whenever the files of a layer change
+    """
+
+    layers: List[List[Tuple[Path, Path]]]
+    distributions: List[List[str]]
+    sizes: List[int]
+    keys: List[str]
+
+
+def get_layer_outputs(layer_output: str, count: int) -> List[Path]:
+    """
+    Returns the paths of the layer zips, such as `layer-1.zip` and `layer-2.zip` for a
+    `layer_output` of `layer.zip`, or `layer_output` itself for a single layer
+    """
+    path = Path(layer_output)
+    if count == 1:
+        return [path]
+    return [path.with_name(f"{path.stem}-{i + 1}{path.suffix}") for i in range(count)]
+
+
+def remove_stale_layer_outputs(layer_output: str, count: int):
+    """
+    Removes the layer zips of a previous build with more layers, such as `layer-3.zip`
+    when there are now two layers, or any split layer when there is now a single one,
+    so that they are not deployed along with the current layers
+    """
+    path = Path(layer_output)
+    pattern = re.compile(rf"{re.escape(path.stem)}-([0-9]+){re.escape(path.suffix)}")
+    for stale_path in path.parent.glob(f"{path.stem}-*{path.suffix}"):
+        match = pattern.fullmatch(stale_path.name)
+        if match and (count == 1 or int(match.group(1)) > count):
+            stale_path.unlink()
+
+
+def get_history_path(layer_output: str, layer_history: Optional[str] = None) -> Path:
+    """
+    Returns the path of the layer history file, which defaults to a file next to the
+    layer zips, such as `layer.history.json` for a `layer_output` of `layer.zip`
+    """
+    if layer_history:
+        return Path(layer_history)
+    path = Path(layer_output)
+    return path.with_name(f"{path.stem}.history.json")
+
+
+def read_history(path: Path) -> dict:
+    """
+    Reads the layer history file, or returns an empty history if it does not exist or
+    was written by another version
+    """
+    try:
+        history = json.loads(path.read_text())
+    except (OSError, ValueError):
+        history = None
+
+    if not isinstance(history, dict) or history.get("version") != LayerHistoryVersion:
+        return {"version": LayerHistoryVersion, "distributions": {}, "layers": []}
+    return history
+
+
+def write_history(path: Path, history: dict):
+    path.write_text(json.dumps(history, indent=2, sort_keys=True) + "\n")
+
+
+def update_history(history: dict, versions: Dict[str, str]) -> Dict[str, float]:
+    """
+    Records the versions of the distributions of a build in the history, and returns
+    the rate at which each distribution has changed: the fraction of the builds since
+    it was first seen in which its version changed.  Distributions which are no longer
+    installed are forgotten.
+    """
+    previous = history["distributions"]
+    (distributions, rates) = ({}, {})
+
+    for (name, version) in versions.items():
+        entry = dict(previous.get(name, {"version": version, "seen": 0, "changes": 0}))
+        if entry["version"] != version:
+            entry["changes"] += 1
+        entry["version"] = version
+        entry["seen"] += 1
+        distributions[name] = entry
+        rates[name] = entry["changes"] / (entry["seen"] - 1) if entry["seen"] > 1 else 0
+
+    history["distributions"] = distributions
+    return rates
+
+
+def get_previous_layers(history: dict) -> Dict[str, int]:
+    """
+    Returns the index of the layer each distribution was assigned to by the last build
+    """
+    return {
+        name: index
+        for (index, layer) in enumerate(history["layers"])
+        for name in layer["distributions"]
+    }
+
+
+def assign_layers(
+    sizes: Dict[str, int],
+    rates: Dict[str, float],
+    previous: Dict[str, int],
+    count: int,
+    size_limit: Optional[int] = None,
+) -> List[List[str]]:
+    """
+    Assigns distributions to layers.  Each distribution stays in its previous layer if
+    it still fits within `size_limit`, unless it has become volatile, as defined by
+    `VolatileChangeRate`, in which case it moves to the last layer.  The other
+    distributions are placed from the most stable and largest to the least stable, into
+    the first layer with room for them, so that the first layers hold the heavy stable
+    distributions.  Without a size limit, the layers before the last are filled up to an
+    even share of the total size.  Volatile distributions are placed into the last
+    layer.  A distribution which fits nowhere is placed into the smallest layer.
+
+    :param sizes        The size of the installed files of each distribution, by name
+    :param rates        The change rate of each distribution, from `update_history`
+    :param previous     The previous layer of each distribution, by name
+    :param count        The number of layers
+    :param size_limit   The maximum total size of the files of a layer, if any
+    :return The names of the distributions of each layer
+    """
+    share = -(-sum(sizes.values()) // count)
+    targets = [size_limit or share] * (count - 1) + [size_limit]
+    (layers, fills) = ([[] for _ in range(count)], [0] * count)
+
+    def fits(index: int, size: int, limit: Optional[int]) -> bool:
+        # An empty layer takes any distribution within the size limit
+        within_limit = size_limit is None or fills[index] + size <= size_limit
+        if not fills[index]:
+            return within_limit
+        return within_limit and (limit is None or fills[index] + size <= limit)
+
+    def place(name: str, index: int):
+        layers[index].append(name)
+        fills[index] += sizes[name]
+
+    unassigned = []
+    for name in sorted(sizes):
+        index = previous.get(name)
+        is_volatile = rates.get(name, 0) >= VolatileChangeRate
+        if (
+            index is not None
+            and index < count
+            and not (is_volatile and index < count - 1)
+            and fits(index, sizes[name], size_limit)
+        ):
+            place(name, index)
+        else:
+            unassigned.append(name)
+
+    unassigned.sort(key=lambda name: (rates.get(name, 0), -sizes[name], name))
+    for name in unassigned:
+        start = count - 1 if rates.get(name, 0) >= VolatileChangeRate else 0
+        for index in range(start, count):
+            if fits(index, sizes[name], targets[index]):
+                place(name, index)
+                break
+        else:
+            if size_limit is not None:
+                logger.warning(f"{name} does not fit within the layer size limit")
+            place(name, fills.index(min(fills)))
+
+    return [sorted(layer) for layer in layers]
+
+
+def plan_layers(
+    paths: List[Tuple[Path, Path]],
+    history: dict,
+    count: int,
+    size_limit: Optional[int] = None,
+    build_key: List[str] = None,
+) -> LayerPlan:
+    """
+    Splits the requirements across `count` layers, as described in `assign_layers`,
+    and records the versions of the build in the history.  Files which belong to no
+    distribution, such as scripts, are placed into the last layer.
+
+    :param paths        Tuples of the source path of each installed file and its path
+                        within the layer, as returned by `get_zip_package_paths`
+    :param history      The history returned by `read_history`, which is updated
+    :param count        The number of layers
+    :param size_limit   The maximum total size of the files of a layer, if any
+    :param build_key    Settings which change the installed files or the layer zips,
+                        such as the Python version or the compressor, and are included
+                        in the layer keys along with the contents of the files
+    """
+    files = {path[1].as_posix(): path for path in paths}
+    (versions, owners) = read_record_owners(
+        files, lambda name: open(str(files[name][0]), "rb")
+    )
+
+    (distribution_files, sizes) = ({}, {name: 0 for name in versions})
+    for (name, path) in files.items():
+        owner = get_owner(owners, name)
+        (digest, _, size) = hash_file(str(path[0]))
+        distribution_files.setdefault(owner, []).append((name, path, size, digest))
+        if owner is not None:
+            sizes[owner] += size
+
+    rates = update_history(history, versions)
+    distributions = assign_layers(
+        sizes, rates, get_previous_layers(history), count, size_limit
+    )
+
+    (layers, layer_sizes, keys) = ([], [], [])
+    for (index, names) in enumerate(distributions):
+        layer_files = [f for name in names for f in distribution_files.get(name, [])]
+        if index == count - 1:
+            layer_files += distribution_files.get(None, [])
+        layer_files.sort(key=lambda f: f[0])
+
+        digest = hashlib.sha256("\0".join(build_key or []).encode())
+        for (name, _, size, file_digest) in layer_files:
+            digest.update(f"\0{name}\0{size}\0{file_digest}".encode())
+        for name in names:
+            digest.update(f"\0{name}=={versions[name]}".encode())
+
+        layers.append([path for (_, path, _, _) in layer_files])
+        layer_sizes.append(sum(size for (_, _, size, _) in layer_files))
+        keys.append(digest.hexdigest())
+
+    return LayerPlan(layers, distributions, layer_sizes, keys)
+
+
+def record_layers(history: dict, plan: LayerPlan):
+    """
+    Records the distributions and the key of each layer in the history
+    """
+    history["layers"] = [
+        {"distributions": names, "key": key}
+        for (names, key) in zip(plan.distributions, plan.keys)
+    ]
+
+
+def get_previous_keys(history: dict) -> List[Optional[str]]:
+    """
+    Returns the key of each layer written by the last build
+    """
+    return [layer.get("key") for layer in history["layers"]]
@@ -0,0 +1,53 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple, TypeVar
+
+"""
+The functions in this file read files ahead of the compressor.  On network filesystems
+and cold page caches, reading each file and then compressing it leaves the disk idle
+while the CPU compresses, and the CPU idle while the disk reads.  A small thread pool
+reads the next files into a bounded queue, so that reads overlap with compression.
+"""
+
+ReadAheadMaxFileSize = 4 * 1024 * 1024
+"""
+Files larger than this many bytes are not read ahead, to bound the memory held by the
+queue.  They are read by the compressor as before.
+"""
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+def prefetch(
+    items: Iterable[Item], read: Callable[[Item], Result], depth: int, threads: int = 4
+) -> Iterator[Tuple[Item, Result]]:
+    """
+    Calls `read` on each item in a thread pool, and yields a tuple of each item and its
+    result, in the order of `items`.  At most `depth` items are read ahead of the one
+    being consumed, and `items` is consumed lazily.  Exceptions raised by `read` are
+    raised when their item is reached.
+
+    :param items    The items to read, such as the paths returned by
+                    `iter_zip_package_paths`
+    :param read     The function which reads an item
+    :param depth    The maximum number of items read or waiting in the queue
+    :param threads  The number of threads reading items
+    """
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        try:
+            for item in items:
+                pending.append((item, executor.submit(read, item)))
+                if len(pending) >= depth:
+                    (next_item, future) = pending.popleft()
+                    yield (next_item, future.result())
+
+            while pending:
+                (next_item, future) = pending.popleft()
+                yield (next_item, future.result())
+        finally:
+            # Reads which have not started are dropped if the consumer stops early
+            for (_, future) in pending:
+                future.cancel()
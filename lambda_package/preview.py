@@ -0,0 +1,143 @@
+from typing import Iterator, NamedTuple, Optional
+
+from lambda_package.lambda_package import Path, get_exclude_spec
+
+"""
+The functions in this file walk a source directory lazily to preview the files which
+would be packaged.  Unlike `find_paths`, entries are yielded while the directory is
+being walked, so that large trees can be displayed without first being loaded in full.
+"""
+
+
+class TreeEntry(NamedTuple):
+    """
+    A single entry of a tree preview.  `kind` is either `"dir"`, `"file"` or
+    `"summary"`, the latter being a directory which has been collapsed into a count of
+    its files and their total size.
+    """
+
+    path: Path
+    depth: int
+    kind: str
+    size: Optional[int] = None
+    file_count: Optional[int] = None
+
+
+def iter_tree(
+    root_path: Path,
+    excludes,
+    max_depth: Optional[int] = None,
+    collapse: Optional[int] = None,
+) -> Iterator[TreeEntry]:
+    """
+    Walks `root_path` and yields a `TreeEntry` for every file and directory which is
+    not excluded.  Subdirectories are yielded before the files of a directory, and
+    directories with no included files are skipped.
+
+    :param root_path    The directory to be searched, as a `pathlib` path
+    :param excludes     A list of .gitignore exclude patterns, or a pathspec
+    :param max_depth    The number of directory levels to display.  Directories below
+                        this level are collapsed.  `None` means no limit.
+    :param collapse     Directories which contain more than this number of entries are
+                        collapsed.  `None` means directories are never collapsed.
+    """
+    exclude_spec = get_exclude_spec(excludes)
+    children = list_directory(root_path, exclude_spec)
+
+    if collapse is not None and len(children) > collapse:
+        yield summarize_directory(root_path, children, 0, exclude_spec)
+    else:
+        yield from iter_children(children, 0, exclude_spec, max_depth, collapse)
+
+
+def iter_children(children, depth, exclude_spec, max_depth, collapse):
+    """
+    Yields the entries of a directory listing, recursing into subdirectories
+    """
+    for (path, is_dir) in children:
+        if is_dir:
+            yield from iter_subdirectory(path, depth, exclude_spec, max_depth, collapse)
+
+    for (path, is_dir) in children:
+        if not is_dir:
+            yield TreeEntry(path=path, depth=depth, kind="file", size=get_size(path))
+
+
+def iter_subdirectory(path, depth, exclude_spec, max_depth, collapse):
+    """
+    Yields the entry of a subdirectory followed by its contents, or a single summary
+    entry if the subdirectory is collapsed.  The entry of the subdirectory itself is
+    only yielded once it is known to contain at least one file.
+    """
+    children = list_directory(path, exclude_spec)
+    too_deep = max_depth is not None and depth + 1 >= max_depth
+    too_large = collapse is not None and len(children) > collapse
+
+    if too_deep or too_large:
+        summary = summarize_directory(path, children, depth, exclude_spec)
+        if summary.file_count > 0:
+            yield summary
+        return
+
+    entries = iter_children(children, depth + 1, exclude_spec, max_depth, collapse)
+    first_entry = next(entries, None)
+    if first_entry is not None:
+        yield TreeEntry(path=path, depth=depth, kind="dir")
+        yield first_entry
+        yield from entries
+
+
+def list_directory(path, exclude_spec):
+    """
+    Returns a list of `(path, is_dir)` tuples for the entries of a directory which are
+    not excluded
+    """
+    return [
+        (subpath, subpath.is_dir())
+        for subpath in path.iterdir()
+        if not exclude_spec.match_file(subpath)
+    ]
+
+
+def summarize_directory(path, children, depth, exclude_spec) -> TreeEntry:
+    """
+    Counts the files in a directory and their total size, recursing into
+    subdirectories, and returns them as a single summary entry
+    """
+    file_count = 0
+    size = 0
+    stack = [children]
+
+    while stack:
+        for (subpath, is_dir) in stack.pop():
+            if is_dir:
+                stack.append(list_directory(subpath, exclude_spec))
+            else:
+                file_count += 1
+                size += get_size(subpath)
+
+    return TreeEntry(
+        path=path, depth=depth, kind="summary", size=size, file_count=file_count
+    )
+
+
+def get_size(path) -> int:
+    """
+    Returns the size of a file in bytes, or 0 if it cannot be read
+    """
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def format_size(size: int) -> str:
+    """
+    Formats a number of bytes as a human-readable string
+    """
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
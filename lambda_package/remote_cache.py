@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+from http.client import HTTPException
+from pathlib import Path
+from shutil import copyfileobj
+from typing import Callable, Dict, Optional, Type
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from lambda_package.cache import Cache, get_cache
+from lambda_package.configuration import Configuration
+from lambda_package.requirements import get_build_method, normalize_version
+
+"""
+The functions in this file share build artifacts between machines through a remote
+cache, such as prebuilt layer zips and compressed zip entries.  Artifacts are content
+addressed: their key is a digest of the inputs which produced them, so any machine which
+would build the same inputs can download the artifact instead.  Remote failures are
+logged and treated as cache misses, so the build always falls back to building locally.
+"""
+
+logger = logging.getLogger(__name__)
+
+LayerCacheVersion = "2"
+"""
+Included in the layer cache key, to be changed whenever the layer output format changes
+"""
+
+
+class RemoteCache:
+    """
+    The interface of a remote cache backend.  Backends are registered in
+    `RemoteCacheBackends` by URL scheme, and are constructed with the URL and timeout.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+
+    def get(self, key: str, dest: Path) -> bool:
+        """
+        Downloads the artifact with the given key into `dest`.  Returns `False` if the
+        artifact does not exist or could not be downloaded.
+        """
+        raise NotImplementedError()
+
+    def put(self, key: str, source: Path) -> bool:
+        """
+        Uploads the file `source` as the artifact with the given key.  Returns `False`
+        if the upload failed.
+        """
+        raise NotImplementedError()
+
+
+class HttpRemoteCache(RemoteCache):
+    """
+    A remote cache using a simple HTTP protocol: artifacts are downloaded with
+    `GET <url>/<key>` and uploaded with `PUT <url>/<key>`, where a `404` response
+    means the artifact does not exist.  This is compatible with most static file
+    servers and object stores, such as nginx with WebDAV or S3 presigned URLs.
+    """
+
+    def get(self, key: str, dest: Path) -> bool:
+        try:
+            with urlopen(self.get_url(key), timeout=self.timeout) as response:
+                with open(str(dest), "wb") as f:
+                    copyfileobj(response, f, 1024 * 1024)
+                    size = f.tell()
+                length = response.headers.get("Content-Length")
+            if length is not None and int(length) != size:
+                logger.warning(
+                    f"Remote cache download of {key} failed: "
+                    f"received {size} of {length} bytes"
+                )
+                return False
+            return True
+        except HTTPError as e:
+            if e.code != 404:
+                logger.warning(f"Remote cache download of {key} failed: {e}")
+        except (OSError, HTTPException, ValueError) as e:
+            logger.warning(f"Remote cache download of {key} failed: {e}")
+
+        return False
+
+    def put(self, key: str, source: Path) -> bool:
+        try:
+            with open(str(source), "rb") as f:
+                request = Request(
+                    self.get_url(key),
+                    data=f,
+                    method="PUT",
+                    headers={
+                        "Content-Length": str(os.fstat(f.fileno()).st_size),
+                        "Content-Type": "application/octet-stream",
+                    },
+                )
+                with urlopen(request, timeout=self.timeout):
+                    pass
+            return True
+        except (OSError, HTTPException) as e:
+            logger.warning(f"Remote cache upload of {key} failed: {e}")
+            return False
+
+    def get_url(self, key: str) -> str:
+        return f"{self.url.rstrip('/')}/{key}"
+
+
+RemoteCacheBackends: Dict[str, Type[RemoteCache]] = {
+    "http": HttpRemoteCache,
+    "https": HttpRemoteCache,
+}
+"""
+The remote cache backends, by URL scheme.  Further backends can be added to this
+dictionary.
+"""
+
+
+class ArtifactCache:
+    """
+    Combines the local build cache with an optional remote cache.  Artifacts are looked
+    up locally first, then remotely, and remote artifacts are saved to the local cache.
+    """
+
+    def __init__(self, cache: Cache, remote: Optional[RemoteCache] = None):
+        self.cache = cache
+        self.remote = remote
+
+    @contextmanager
+    def fetch(
+        self,
+        namespace: str,
+        key: str,
+        validate: Optional[Callable[[Path], bool]] = None,
+    ):
+        """
+        Returns the local path of an artifact for the duration of a `with` block,
+        downloading it from the remote cache if necessary, or `None` if it is not
+        available.  The artifact is protected from eviction while in use.
+
+        :param validate     An optional function which checks a downloaded artifact.
+                            Artifacts which fail the check are discarded and treated as
+                            cache misses, so that they are built and uploaded again.
+        """
+        with self.cache.read(namespace, key) as path:
+            if path is not None or self.remote is None:
+                yield path
+                return
+
+        self.download(namespace, key, validate)
+        with self.cache.read(namespace, key) as path:
+            yield path
+
+    def download(
+        self, namespace: str, key: str, validate: Optional[Callable[[Path], bool]]
+    ):
+        """
+        Downloads an artifact from the remote cache into the local cache, if it exists
+        and passes the `validate` check
+        """
+        temp_path = self.cache.create_temp_file()
+        if self.remote.get(f"{namespace}/{key}", temp_path):
+            if validate is None or validate(temp_path):
+                self.cache.put_file(temp_path, namespace, key, move=True)
+                return
+            logger.warning(f"Remote cache artifact {namespace}/{key} is invalid")
+
+        temp_path.unlink()
+
+    def store(self, namespace: str, key: str, source: Path, move=False) -> Path:
+        """
+        Adds an artifact to the local cache and uploads it to the remote cache
+        """
+        path = self.cache.put_file(source, namespace, key, move=move)
+        if self.remote is not None:
+            self.remote.put(f"{namespace}/{key}", path)
+
+        return path
+
+
+def get_remote_cache(configuration: Configuration) -> Optional[RemoteCache]:
+    """
+    Returns the remote cache backend for the configured `remote_cache` URL, or `None`
+    if no remote cache is configured
+    """
+    if not configuration.remote_cache:
+        return None
+
+    scheme = urlparse(configuration.remote_cache).scheme
+    if scheme not in RemoteCacheBackends:
+        raise ValueError(
+            f"Invalid remote cache: '{configuration.remote_cache}'. "
+            f"Supported schemes are: {', '.join(RemoteCacheBackends)}"
+        )
+
+    return RemoteCacheBackends[scheme](
+        configuration.remote_cache, configuration.remote_cache_timeout
+    )
+
+
+def get_artifact_cache(configuration: Configuration) -> ArtifactCache:
+    """
+    Returns the artifact cache for the given configuration
+    """
+    return ArtifactCache(get_cache(configuration), get_remote_cache(configuration))
+
+
+def get_layer_cache_key(configuration: Configuration) -> str:
+    """
+    Returns the key of the layer zip built from the configured requirements.  The key is
+    a digest of the requirements file, the Python version, the build method, the
+    package index and whether the zip is reproducible, and the architecture if wheels
+    are selected for it.
+    """
+    sha256 = hashlib.sha256()
+    with open(configuration.requirements, "rb") as f:
+        sha256.update(f.read())
+
+    build_method = get_build_method(configuration)
+    if build_method == "platform":
+        build_method = f"platform-{configuration.architecture}"
+    python_version = normalize_version(configuration.python_version)
+    sha256.update(f"\n{LayerCacheVersion}:{python_version}:{build_method}".encode())
+    sha256.update(f"\n{configuration.index_url or ''}".encode())
+    sha256.update(b"\nreproducible" if configuration.reproducible else b"")
+    return sha256.hexdigest()
@@ -1,14 +1,27 @@
+import hashlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy as copy_object
 from datetime import datetime
+from io import BytesIO
 from random import choice
 from re import compile
-from shutil import copy
+from shlex import quote, split
+from shutil import copy, disk_usage, rmtree, which
 from string import ascii_lowercase
-from subprocess import run
+from subprocess import PIPE, STDOUT, CalledProcessError, Popen, run
 from tempfile import gettempdir
+from typing import List, Optional, Tuple
 
 from docker import from_env
+from docker.errors import ContainerError
 
+from lambda_package.archive import hash_file
+from lambda_package.builders import get_builder_pool, run_in_builder
+from lambda_package.cache import Cache, CacheDirName, get_cache  # noqa: F401
+from lambda_package.events import Events
 from lambda_package.lambda_package import Configuration, Path
+from lambda_package.wheels import link_tree, unpack_wheel
 
 """
 The functions in this file help to build an Lambda's Python requirements into a
@@ -20,9 +33,19 @@ TempDir = gettempdir()
 The root of the directory for creating temporary build directories and the shared cache
 """
 
-CacheDirName = "lambda_package_cache"
+WorkspaceDirName = "lambda_package_workspace"
 """
-The name of the shared cache directory
+The name of the directory created inside a configured workspace, such as `/dev/shm`
+"""
+
+WorkspaceFallbackMessage = "The build failed in the workspace, retrying on disk\n"
+"""
+The `log` event emitted when a failed build is retried in the system temp directory
+"""
+
+BuildErrors = (CalledProcessError, ContainerError, OSError)
+"""
+The errors raised by a failed build, after which a build in the workspace is retried
 """
 
 DockerImagePrefix = "lambci/lambda:build-python"
@@ -35,62 +58,382 @@ VersionRegex = compile("(^[0-9]+\\.[0-9]+)(\\.[0-9]+)?$")
 Regex for parsing the Python version string
 """
 
+CommentRegex = compile("(^|\\s)#.*$")
+"""
+Regex for removing comments from a line of a requirements file
+"""
+
+HashOptionRegex = compile("\\s--hash[=\\s]\\S+")
+"""
+Regex for removing `--hash` options from a requirement specifier
+"""
+
+UnsplittableOptions = [
+    "-r",
+    "--requirement",
+    "-c",
+    "--constraint",
+    "-e",
+    "--editable",
+]
+"""
+Requirements file options which prevent the requirements being downloaded separately
+"""
+
+WheelhouseSpecsName = ".requirements.txt"
+"""
+The name of the file in the wheelhouse which lists the requirements to download,
+separated by null characters
+"""
+
+DockerWheelhouse = "/tmp/wheelhouse"
+"""
+The directory at which the wheelhouse is mounted in the Docker container
+"""
+
+PlatformMachines = {"x86_64": "x86_64", "arm64": "aarch64"}
+"""
+The machine name used in wheel platform tags for each Lambda architecture
+"""
+
+LambdaGlibcVersions = [((3, 12), 34), ((0, 0), 26)]
+"""
+The minor version of glibc in the Lambda runtime of each Python version: Amazon Linux
+2023 from Python 3.12, and Amazon Linux 2 before it
+"""
 
-def build_requirements(configuration: Configuration) -> str:
+WheelStoreVersion = "1"
+"""
+Included in the keys of the wheel store, to be changed whenever the layout of its
+entries changes
+"""
+
+
+def build_requirements(configuration: Configuration, events: Events = None) -> str:
     """
     Builds the `pip` requirements into a temporary directory, and returns a path
-    to that directory.  If `use_docker` is `True`, the requirements are built using
-    a Lambda Docker image.  Otherwise, pip will be called locally.
+    to that directory.  The build method is given by `get_build_method`.  If `events`
+    is given, the output of pip or Docker is emitted line by line as `log` events.
+
+    If the build fails in the workspace, for example because the requirements outgrow
+    a RAM-backed filesystem, it is retried once in the system temp directory.
     """
-    if configuration.use_docker:
-        return build_requirements_docker(configuration)
+    build_method = get_build_method(configuration)
+    if build_method == "docker":
+        build = build_requirements_docker
+    elif build_method == "platform":
+        build = build_requirements_platform
     else:
-        return build_requirements_local(configuration)
+        build = build_requirements_local
+
+    disk_configuration = get_disk_configuration(configuration)
+    try:
+        requirements_dir = build(configuration, events)
+    except BuildErrors:
+        if disk_configuration is None:
+            raise
+        if events is not None:
+            events.emit("log", message=WorkspaceFallbackMessage)
+        requirements_dir = build(disk_configuration, events)
+
+    get_cache(configuration).prune()
+    return requirements_dir
 
 
-def build_requirements_docker(configuration: Configuration):
+def build_requirements_docker(configuration: Configuration, events: Events = None):
     """
-    Builds pip dependencies into a temporary directory using a Docker image
+    Builds pip dependencies into a temporary directory using a Docker image.  If
+    `builder_pool` is set, the build runs in a long-lived builder container instead of
+    a new container.  See the `builders` module.
     """
 
-    temp_dir = create_temp_requirements_directory()
+    temp_dir = create_temp_requirements_directory(configuration)
 
-    # Copy the requirements file into the directory
-    requirements_src_path = Path(configuration.requirements)
-    requirements_dest_path = temp_dir.joinpath(requirements_src_path.name)
-    copy(str(requirements_src_path), str(requirements_dest_path))
+    try:
+        # Copy the requirements file into the directory
+        requirements_src_path = Path(configuration.requirements)
+        requirements_dest_path = temp_dir.joinpath(requirements_src_path.name)
+        copy(str(requirements_src_path), str(requirements_dest_path))
+
+        if configuration.builder_pool:
+            run_docker_build_in_pool(
+                configuration, temp_dir, requirements_dest_path.name, events
+            )
+        else:
+            run_docker_build(
+                configuration, temp_dir, requirements_dest_path.name, events
+            )
+    except BaseException:
+        rmtree(str(temp_dir), ignore_errors=True)
+        raise
+
+    # Remove the copied requirements file
+    requirements_dest_path.unlink()
+
+    return temp_dir
 
-    # Launch the Docker instance to install the requirements
+
+def run_docker_build(
+    configuration: Configuration,
+    temp_dir: Path,
+    requirements_name: str,
+    events: Events = None,
+):
+    """
+    Installs the requirements into `temp_dir` in a new Docker container, which mounts
+    it at `/var/task`
+    """
     client = from_env()
     vols = {str(temp_dir): {"bind": "/var/task", "mode": "z"}}
     python_version = normalize_version(configuration.python_version)
-    cache_dir = get_cache_directory(f"docker_{python_version}")
-
-    client.containers.run(
-        f"{DockerImagePrefix}{python_version}",
-        (
-            f"pip install -t /var/task/ -r /var/task/{requirements_dest_path.name} "
-            f"--cache-dir {cache_dir}"
-        ),
-        volumes=vols,
+    cache = get_cache(configuration)
+
+    with cache.use(f"docker_{python_version}") as cache_dir:
+        image = f"{DockerImagePrefix}{python_version}"
+        (command, wheelhouse) = get_docker_command(
+            configuration, requirements_name, cache_dir, vols
+        )
+
+        try:
+            if events is None:
+                client.containers.run(image, command, volumes=vols)
+            else:
+                # Stream the container's output while it runs, instead of waiting
+                container = client.containers.run(
+                    image, command, volumes=vols, detach=True
+                )
+                try:
+                    exit_status = follow_container(container, events)
+                    if exit_status:
+                        raise ContainerError(
+                            container, exit_status, command, image, None
+                        )
+                finally:
+                    container.remove(force=True)
+        finally:
+            if wheelhouse is not None:
+                rmtree(str(wheelhouse), ignore_errors=True)
+
+
+def run_docker_build_in_pool(
+    configuration: Configuration,
+    temp_dir: Path,
+    requirements_name: str,
+    events: Events = None,
+):
+    """
+    Installs the requirements into `temp_dir` in a builder container of the pool,
+    which mounts the workspace and the cache at their own paths
+    """
+    pool = get_builder_pool(
+        configuration.builder_pool_size, configuration.builder_idle_timeout
     )
+    python_version = normalize_version(configuration.python_version)
+    cache = get_cache(configuration)
+    vols = {
+        str(path): {"bind": str(path), "mode": "z"}
+        for path in [temp_dir.parent, cache.root]
+    }
 
-    # Remove the copied requirements file
-    requirements_dest_path.unlink()
+    with cache.use(f"docker_{python_version}") as cache_dir:
+        (command, wheelhouse) = get_docker_command(
+            configuration, requirements_name, cache_dir, vols, temp_dir
+        )
+        image = f"{DockerImagePrefix}{python_version}"
+        try:
+            run_in_builder(pool, image, command, vols, events)
+        finally:
+            if wheelhouse is not None:
+                rmtree(str(wheelhouse), ignore_errors=True)
 
-    return temp_dir
+
+def get_docker_command(
+    configuration: Configuration,
+    requirements_name: str,
+    cache_dir: Path,
+    vols: dict,
+    task_dir: Optional[Path] = None,
+):
+    """
+    Returns the command which installs the requirements in the Docker container.  If
+    `parallel_downloads` is set, the command first downloads the requirements into a
+    wheelhouse, which is created and added to the volumes `vols`.
+
+    If `task_dir` is given, the requirements are installed into it rather than into
+    `/var/task`, for builder containers which mount the workspace at its own path, and
+    the wheelhouse is used at its own path too.
+
+    :return A tuple with the command, and the wheelhouse directory or `None`
+    """
+    target = quote(str(task_dir)) if task_dir is not None else "/var/task"
+    command = (
+        f"pip install -t {target}/ -r {target}/{requirements_name} "
+        f"--cache-dir {cache_dir}"
+    )
+    command += "".join(f" {quote(o)}" for o in get_index_options(configuration))
+
+    split_requirements = (
+        read_requirement_specs(configuration.requirements)
+        if configuration.parallel_downloads
+        else None
+    )
+    if split_requirements is None:
+        return (command, None)
+
+    # Download the requirements concurrently inside the container, then install them
+    # from the wheelhouse
+    wheelhouse = create_temp_requirements_directory(configuration, "wheelhouse")
+    if task_dir is not None:
+        wheelhouse_path = quote(str(wheelhouse))
+    else:
+        vols[str(wheelhouse)] = {"bind": DockerWheelhouse, "mode": "z"}
+        wheelhouse_path = DockerWheelhouse
+    (specs, options) = split_requirements
+    wheelhouse.joinpath(WheelhouseSpecsName).write_text("\0".join(specs))
+
+    download = " ".join(
+        [
+            f"xargs -0 -P {configuration.parallel_downloads} -I {{}}",
+            f"pip download --no-deps -d {wheelhouse_path}",
+            f"--cache-dir {cache_dir}",
+            *[quote(o) for o in get_index_options(configuration) + options],
+            "'{}'",
+            f"< {wheelhouse_path}/{WheelhouseSpecsName}",
+        ]
+    )
+    find_links = f"--find-links {wheelhouse_path}"
+    script = f"{download}; {command} --no-index {find_links} || {command} {find_links}"
+    return (["sh", "-c", script], wheelhouse)
 
 
-def build_requirements_local(configuration: Configuration):
+def follow_container(container, events: Events = None) -> int:
+    """
+    Waits for a container to exit, emitting each line of its output as a `log` event
+    if `events` is given.
+
+    :return The exit code of the container
+    """
+    if events is not None:
+        for line in container.logs(stream=True, follow=True):
+            events.emit("log", message=line.decode(errors="replace"))
+
+    return container.wait()["StatusCode"]
+
+
+def build_requirements_local(configuration: Configuration, events: Events = None):
     """
     Builds pip dependencies into a temporary directory using the local version of pip
     """
-    temp_dir = create_temp_requirements_directory()
+    temp_dir = create_temp_requirements_directory(configuration)
     python_version = normalize_version(configuration.python_version)
-    cache_dir = get_cache_directory(f"local_{python_version}")
-    run(
-        [
-            f"pip{python_version}",
+    cache = get_cache(configuration)
+    wheelhouse = None
+
+    try:
+        with cache.use(f"local_{python_version}") as cache_dir:
+            pip = f"pip{python_version}"
+            command = get_local_install_command(configuration, temp_dir, cache_dir)
+
+            split_requirements = (
+                read_requirement_specs(configuration.requirements)
+                if configuration.parallel_downloads or configuration.wheel_store
+                else None
+            )
+            if split_requirements is not None and configuration.wheel_store:
+                install_from_wheel_store(
+                    configuration, split_requirements, pip, cache_dir, temp_dir, events
+                )
+            elif split_requirements is not None:
+                wheelhouse = create_temp_requirements_directory(
+                    configuration, "wheelhouse"
+                )
+                download_requirements(
+                    configuration,
+                    split_requirements,
+                    [pip, "download", "--cache-dir", str(cache_dir)],
+                    wheelhouse,
+                    events,
+                )
+
+                # Any requirement which failed to download, or a missing dependency of
+                # an incompletely pinned file, makes the offline install fail, in which
+                # case pip is allowed to use the index as well
+                find_links = ["--find-links", str(wheelhouse)]
+                if run_pip(command + ["--no-index"] + find_links, events):
+                    check_pip(command + find_links, events)
+            else:
+                check_pip(command, events)
+    except BaseException:
+        rmtree(str(temp_dir), ignore_errors=True)
+        raise
+    finally:
+        if wheelhouse is not None:
+            rmtree(str(wheelhouse), ignore_errors=True)
+
+    return temp_dir
+
+
+def get_local_install_command(
+    configuration: Configuration, temp_dir: Path, cache_dir: Path
+) -> List[str]:
+    """
+    Returns the local pip command which installs the requirements into `temp_dir`
+    """
+    python_version = normalize_version(configuration.python_version)
+    return [
+        f"pip{python_version}",
+        "install",
+        "-t",
+        str(temp_dir),
+        "-r",
+        configuration.requirements,
+        "--cache-dir",
+        str(cache_dir),
+    ] + get_index_options(configuration)
+
+
+def build_requirements_platform(configuration: Configuration, events: Events = None):
+    """
+    Builds pip dependencies into a temporary directory without Docker, by installing
+    binary wheels for the Lambda platform with the pip of the current interpreter.
+    Requirements which have no compatible wheel are built using a Docker image, and
+    merged into the directory.  The Docker image is only available for `x86_64`.
+
+    :raises ValueError if some requirements must be built using Docker for `arm64`
+    """
+    temp_dir = create_temp_requirements_directory(configuration)
+
+    try:
+        if install_platform_requirements(configuration, temp_dir, events):
+            return temp_dir
+    except BaseException:
+        rmtree(str(temp_dir), ignore_errors=True)
+        raise
+
+    # The requirements cannot be split, so they are all built using Docker
+    rmtree(str(temp_dir), ignore_errors=True)
+    check_docker_architecture(configuration, [configuration.requirements])
+    return build_requirements_docker(configuration, events)
+
+
+def install_platform_requirements(
+    configuration: Configuration, temp_dir: Path, events: Events = None
+) -> bool:
+    """
+    Installs the requirements into `temp_dir` as described in
+    `build_requirements_platform`
+
+    :return `False` if some requirements have no compatible wheel and the requirements
+            file cannot be split, so that nothing was installed
+    """
+    python_version = normalize_version(configuration.python_version)
+    cache = get_cache(configuration)
+    pip = [sys.executable, "-m", "pip"]
+    platform_options = get_platform_options(configuration)
+    cache_name = f"platform_{python_version}_{configuration.architecture}"
+
+    with cache.use(cache_name) as cache_dir:
+        command = pip + [
             "install",
             "-t",
             str(temp_dir),
@@ -99,36 +442,447 @@ def build_requirements_local(configuration: Configuration):
             "--cache-dir",
             str(cache_dir),
         ]
+        command += get_index_options(configuration) + platform_options
+        if run_pip(command, events) == 0:
+            return True
+
+        # Find the requirements which have no compatible wheel, so that only those are
+        # built using Docker
+        split_requirements = read_requirement_specs(configuration.requirements)
+        if split_requirements is None:
+            return False
+
+        fallback_specs = install_platform_wheels(
+            configuration,
+            split_requirements,
+            pip + ["--cache-dir", str(cache_dir)],
+            platform_options,
+            temp_dir,
+            events,
+        )
+
+    if fallback_specs:
+        check_docker_architecture(configuration, fallback_specs)
+        fallback_dir = create_temp_requirements_directory(configuration, "fallback")
+        try:
+            fallback_requirements = fallback_dir.joinpath("requirements.txt")
+            fallback_requirements.write_text(
+                "\n".join([" ".join(quote(o) for o in split_requirements[1])])
+                + "\n"
+                + "\n".join(fallback_specs)
+                + "\n"
+            )
+            fallback_configuration = copy_object(configuration)
+            fallback_configuration.requirements = str(fallback_requirements)
+
+            docker_dir = build_requirements_docker(fallback_configuration, events)
+            link_tree(docker_dir, temp_dir)
+            rmtree(str(docker_dir), ignore_errors=True)
+        finally:
+            rmtree(str(fallback_dir), ignore_errors=True)
+
+    return True
+
+
+def install_platform_wheels(
+    configuration: Configuration,
+    split_requirements: Tuple[List[str], List[str]],
+    pip: List[str],
+    platform_options: List[str],
+    temp_dir: Path,
+    events: Events = None,
+) -> List[str]:
+    """
+    Downloads the wheels for the Lambda platform of each requirement and of its
+    dependencies, up to `parallel_downloads` requirements at a time, and installs the
+    requirements whose wheels were all found into `temp_dir`.  Each requirement is
+    downloaded into its own directory, as the downloads of shared dependencies would
+    otherwise overwrite each other.
+
+    :return The requirement specifiers which have no compatible wheel, or one of whose
+            dependencies has none
+    :raises CalledProcessError if the wheels which were found cannot be installed
+    """
+    (specs, options) = split_requirements
+    options = get_index_options(configuration) + options + platform_options
+    wheelhouse = create_temp_requirements_directory(configuration, "wheelhouse")
+
+    def download(index_and_spec) -> bool:
+        (index, spec) = index_and_spec
+        command = pip + ["download", "-d", str(wheelhouse.joinpath(str(index)))]
+        return run_pip(command + options + [spec], events) == 0
+
+    try:
+        max_workers = configuration.parallel_downloads or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            found = list(executor.map(download, enumerate(specs)))
+
+        wheel_specs = [spec for (spec, is_found) in zip(specs, found) if is_found]
+        if wheel_specs:
+            command = pip + ["install", "-t", str(temp_dir), "--no-index"]
+            for (index, is_found) in enumerate(found):
+                if is_found:
+                    command += ["--find-links", str(wheelhouse.joinpath(str(index)))]
+            check_pip(command + platform_options + wheel_specs, events)
+    finally:
+        rmtree(str(wheelhouse), ignore_errors=True)
+
+    return [spec for (spec, is_found) in zip(specs, found) if not is_found]
+
+
+def check_docker_architecture(configuration: Configuration, specs: List[str]):
+    """
+    Checks that requirements can be built using the Docker image, whose builds only
+    run on `x86_64`
+
+    :raises ValueError if the configured architecture is not `x86_64`
+    """
+    if configuration.architecture != "x86_64":
+        raise ValueError(
+            f"No {configuration.architecture} wheels found for: {', '.join(specs)}. "
+            "Requirements without a compatible wheel are built using Docker, which "
+            "only supports the x86_64 architecture."
+        )
+
+
+def get_platform_options(configuration: Configuration) -> List[str]:
+    """
+    Returns the pip options which select binary wheels for the Lambda runtime of the
+    configured Python version and architecture
+    """
+    python_version = normalize_version(configuration.python_version)
+    version_tuple = tuple(int(part) for part in python_version.split("."))
+    machine = PlatformMachines[configuration.architecture]
+    glibc_minor = next(
+        glibc for (version, glibc) in LambdaGlibcVersions if version_tuple >= version
     )
-    return temp_dir
+
+    # Wheels may be tagged with any older manylinux version, or its legacy alias
+    platforms = [
+        f"manylinux_2_{minor}_{machine}" for minor in range(glibc_minor, 4, -1)
+    ]
+    platforms += [f"manylinux2014_{machine}"]
+    if machine == "x86_64":
+        platforms += ["manylinux2010_x86_64", "manylinux1_x86_64"]
+
+    abi = f"cp{python_version.replace('.', '')}"
+    abis = [f"{abi}m" if version_tuple < (3, 8) else abi, "abi3", "none"]
+
+    options = ["--only-binary", ":all:", "--implementation", "cp"]
+    options += ["--python-version", python_version]
+    for platform in platforms:
+        options += ["--platform", platform]
+    for abi in abis:
+        options += ["--abi", abi]
+    return options
+
+
+def download_requirements(
+    configuration: Configuration,
+    split_requirements: Tuple[List[str], List[str]],
+    download_command: List[str],
+    wheelhouse: Path,
+    events: Events = None,
+):
+    """
+    Downloads the requirements into a wheelhouse directory, running up to
+    `parallel_downloads` pip processes at the same time.  Each requirement is
+    downloaded without its dependencies, as a pinned requirements file already lists
+    them, so that the downloads are independent of each other.
+
+    :param configuration        The packager configuration
+    :param split_requirements   The specifiers and options of the requirements file, as
+                                returned by `read_requirement_specs`
+    :param download_command     The pip command and arguments to download a package
+    :param wheelhouse           The directory into which packages are downloaded
+    :param events               An optional `Events` object which receives pip's output
+    """
+    commands = get_download_commands(
+        configuration, split_requirements, download_command, wheelhouse
+    )
+    with ThreadPoolExecutor(max_workers=configuration.parallel_downloads) as executor:
+        list(executor.map(lambda command: run_pip(command, events), commands))
+
+
+def get_download_commands(
+    configuration: Configuration,
+    split_requirements: Tuple[List[str], List[str]],
+    download_command: List[str],
+    wheelhouse: Path,
+) -> List[List[str]]:
+    """
+    Returns a pip command for each requirement, which downloads it into the wheelhouse
+    without its dependencies
+    """
+    (specs, options) = split_requirements
+    options = get_index_options(configuration) + options
+    return [
+        download_command + ["--no-deps", "-d", str(wheelhouse)] + options + [spec]
+        for spec in specs
+    ]
+
+
+def install_from_wheel_store(
+    configuration: Configuration,
+    split_requirements: Tuple[List[str], List[str]],
+    pip: str,
+    cache_dir: Path,
+    temp_dir: Path,
+    events: Events = None,
+):
+    """
+    Installs the requirements into `temp_dir` by hardlinking unpacked wheels from the
+    wheel store in the build cache.  Each requirement specifier is mapped to the hash of
+    the wheel it was last downloaded as, so requirements which are already in the store
+    are neither downloaded nor extracted again.  Other requirements are downloaded, up
+    to `parallel_downloads` at a time, and added to the store.  Source distributions,
+    and requirements which could not be downloaded, are installed by pip instead.
+
+    As with `download_requirements`, each requirement is installed without its
+    dependencies, so the requirements file must be fully pinned.
+
+    :param configuration        The packager configuration
+    :param split_requirements   The specifiers and options of the requirements file, as
+                                returned by `read_requirement_specs`
+    :param pip                  The pip executable
+    :param cache_dir            The pip cache directory
+    :param temp_dir             The directory into which requirements are installed
+    :param events               An optional `Events` object which receives pip's output
+    :raises CalledProcessError if pip fails to install the requirements which are not
+            in the wheel store
+    """
+    cache = get_cache(configuration)
+    (specs, options) = split_requirements
+    options = get_index_options(configuration) + options
+    python_version = normalize_version(configuration.python_version)
+    wheelhouse = create_temp_requirements_directory(configuration, "wheelhouse")
+
+    def get_wheel_key(index_and_spec) -> Optional[str]:
+        (index, spec) = index_and_spec
+        spec_key = hashlib.sha256(
+            "\n".join([WheelStoreVersion, python_version, *options, spec]).encode()
+        ).hexdigest()
+
+        with cache.read("wheel_specs", spec_key) as spec_path:
+            wheel_key = spec_path.read_text() if spec_path is not None else None
+        if wheel_key is not None and cache.get("wheels", wheel_key) is not None:
+            return wheel_key
+
+        download_dir = wheelhouse.joinpath(str(index))
+        download_command = [pip, "download", "--cache-dir", str(cache_dir)]
+        download_command += ["--no-deps", "-d", str(download_dir)] + options + [spec]
+        if run_pip(download_command, events):
+            return None
+
+        wheels = list(download_dir.glob("*.whl"))
+        if len(wheels) != 1:
+            return None
+
+        wheel_key = f"{hash_file(str(wheels[0]))[0]}-py{python_version}"
+        if cache.get("wheels", wheel_key) is None:
+            cache.put_directory(
+                lambda build_dir: build_wheel_store_entry(
+                    wheels[0], build_dir, python_version
+                ),
+                "wheels",
+                wheel_key,
+            )
+        cache.put_file(BytesIO(wheel_key.encode()), "wheel_specs", spec_key)
+        return wheel_key
+
+    try:
+        max_workers = configuration.parallel_downloads or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            wheel_keys = list(executor.map(get_wheel_key, enumerate(specs)))
+
+        fallback_specs = [
+            spec
+            for (spec, wheel_key) in zip(specs, wheel_keys)
+            if wheel_key is None
+            or not link_wheel_store_entry(cache, wheel_key, temp_dir)
+        ]
+
+        if fallback_specs:
+            # pip does not merge into existing directories of its target, so the
+            # fallback requirements are installed separately and then linked into place
+            fallback_dir = wheelhouse.joinpath("fallback")
+            check_pip(
+                [pip, "install", "-t", str(fallback_dir), "--no-deps"]
+                + ["--cache-dir", str(cache_dir)]
+                + options
+                + fallback_specs,
+                events,
+            )
+            if fallback_dir.is_dir():
+                link_tree(fallback_dir, temp_dir)
+    finally:
+        rmtree(str(wheelhouse), ignore_errors=True)
+
+
+def build_wheel_store_entry(wheel: Path, build_dir: Path, python_version: str):
+    """
+    Unpacks a wheel into a new wheel store entry, and compiles its bytecode as
+    `pip install` would.  Bytecode compilation is skipped if the interpreter for
+    `python_version` is not available.
+    """
+    python = f"python{python_version}"
+    unpack_wheel(wheel, build_dir, which(python) or f"/usr/bin/env {python}")
+    try:
+        run([python, "-m", "compileall", "-q", str(build_dir)])
+    except OSError:
+        pass
+
+
+def link_wheel_store_entry(cache: Cache, wheel_key: str, temp_dir: Path) -> bool:
+    """
+    Links a wheel store entry into a requirements directory, while holding a shared
+    lock on the entry so that it is not evicted in the meantime.
+
+    :return `False` if the entry no longer exists
+    """
+    with cache.read("wheels", wheel_key) as entry_path:
+        if entry_path is None:
+            return False
+
+        link_tree(entry_path, temp_dir)
+        return True
+
+
+def read_requirement_specs(
+    requirements_path: str,
+) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Splits a requirements file into its requirement specifiers and its global options,
+    such as `--extra-index-url`.  Hash options are removed from the specifiers, as they
+    are checked when the requirements file itself is installed.
+
+    :return A tuple of the list of specifiers and the list of options, or `None` if the
+            file includes other files or editable requirements, and so cannot be split
+    """
+    specs = []
+    options = []
+
+    with open(requirements_path) as f:
+        lines = f.read().replace("\\\n", " ").splitlines()
+
+    for line in lines:
+        line = CommentRegex.sub("", line).strip()
+        if not line:
+            continue
+
+        if line.startswith("-"):
+            if line.split()[0].split("=")[0] in UnsplittableOptions:
+                return None
+            options.extend(split(line))
+        else:
+            specs.append(HashOptionRegex.sub("", f" {line}").strip())
+
+    return (specs, options)
+
+
+def get_index_options(configuration: Configuration) -> List[str]:
+    """
+    Returns the pip options which select the configured package index
+    """
+    return ["--index-url", configuration.index_url] if configuration.index_url else []
 
 
-def create_temp_requirements_directory():
+def check_pip(command: List[str], events: Events = None):
+    """
+    Runs a pip command as `run_pip` does
+
+    :raises CalledProcessError if the command fails
+    """
+    returncode = run_pip(command, events)
+    if returncode:
+        raise CalledProcessError(returncode, command)
+
+
+def run_pip(command: List[str], events: Events = None) -> int:
+    """
+    Runs a pip command, emitting each line of its combined output as a `log` event if
+    `events` is given.
+
+    :return The exit code of the command
+    """
+    if events is None:
+        return run(command).returncode
+
+    with Popen(command, stdout=PIPE, stderr=STDOUT, universal_newlines=True) as p:
+        for line in p.stdout:
+            events.emit("log", message=line)
+
+    if p.returncode:
+        events.emit("log", message=str(CalledProcessError(p.returncode, command)))
+    return p.returncode
+
+
+def create_temp_requirements_directory(
+    configuration: Configuration, prefix="requirements_dir"
+):
     """
     Create a temporary directory in which to install requirements so they can be zipped
     """
-    temp_dir = Path(TempDir).joinpath(generate_temp_directory_name()).absolute()
+    workspace_dir = get_workspace_directory(configuration)
+    temp_dir = workspace_dir.joinpath(generate_temp_directory_name(prefix)).absolute()
     temp_dir.mkdir(parents=True)
     return temp_dir
 
 
-def generate_temp_directory_name():
+def get_disk_configuration(configuration: Configuration) -> Optional[Configuration]:
+    """
+    Returns a copy of the configuration which builds in the system temp directory, if
+    the configuration builds in a workspace, or `None` otherwise
+    """
+    if get_workspace_directory(configuration) == Path(TempDir):
+        return None
+
+    disk_configuration = copy_object(configuration)
+    disk_configuration.workspace = None
+    return disk_configuration
+
+
+def get_workspace_directory(configuration: Configuration) -> Path:
+    """
+    Returns the directory in which temporary build directories are created.  This is
+    the configured `workspace`, which is typically a RAM-backed filesystem such as
+    `/dev/shm`, or the system temp directory if no workspace is configured.  The system
+    temp directory is also used as a fallback if the workspace cannot be created or has
+    less than `workspace_size_limit` bytes of free space.
+    """
+    if configuration.workspace:
+        workspace_dir = Path(configuration.workspace).joinpath(WorkspaceDirName)
+
+        try:
+            workspace_dir.mkdir(parents=True, exist_ok=True)
+            free_space = disk_usage(str(workspace_dir)).free
+        except OSError:
+            return Path(TempDir)
+
+        if free_space >= (configuration.workspace_size_limit or 0):
+            return workspace_dir
+
+    return Path(TempDir)
+
+
+def generate_temp_directory_name(prefix="requirements_dir"):
     """
     Generate a temporary directory name
     """
     random_chars = "".join(choice(ascii_lowercase) for i in range(8))
     timestamp = datetime.now().strftime("%d%m%Y%H%M%S")
-    return f"requirements_dir_{timestamp}_{random_chars}"
+    return f"{prefix}_{timestamp}_{random_chars}"
 
 
-def get_cache_directory(label: str) -> Path:
+def get_build_method(configuration: Configuration) -> str:
     """
-    Returns the full path of a cache directory.  Creates the direcctory if it does
-    not exist.
+    Returns the configured `build_method`, or `"docker"` or `"local"` depending on
+    `use_docker` if no build method is configured
     """
-    path = Path(TempDir).joinpath(CacheDirName).joinpath(label)
-    path.mkdir(parents=True, exist_ok=True)
-    return path
+    if configuration.build_method:
+        return configuration.build_method
+
+    return "docker" if configuration.use_docker else "local"
 
 
 def normalize_version(version_string):
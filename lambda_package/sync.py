@@ -0,0 +1,108 @@
+import os
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+from lambda_package.wheels import link_file
+
+"""
+The functions in this file write packages into a directory instead of a zip file, in
+the layout of the Lambda runtime, so that they can be mounted into a local Lambda
+emulator without compressing and extracting them.  Files are hardlinked from their
+sources where possible, and later runs only update the files which have changed.
+"""
+
+TaskDirPath = ("var", "task")
+"""
+The path of the function code within the output directory
+"""
+
+LayerDirPath = ("opt", "python")
+"""
+The path of the layer's Python packages within the output directory
+"""
+
+
+class SyncResult(NamedTuple):
+    """
+    The number of files updated, left unchanged and removed by `sync_directory`
+    """
+
+    updated: int
+    unchanged: int
+    removed: int
+
+
+def sync_directory(paths: List[Tuple[Path, Path]], dest: Path) -> SyncResult:
+    """
+    Makes the directory `dest` contain exactly the given files.  Files which are
+    already up to date are left alone, and files which are no longer in the package are
+    removed, along with any directories left empty.
+
+    :param paths    A list of tuples with the source path of each file and its path
+                    relative to `dest`, as returned by `get_zip_package_paths`
+    :param dest     The directory to update, which is created if it does not exist
+    """
+    (updated, unchanged) = (0, 0)
+    targets = set()
+
+    for (source, relative_path) in paths:
+        target = os.path.join(str(dest), str(relative_path))
+        targets.add(os.path.normpath(target))
+
+        if is_up_to_date(str(source), target):
+            unchanged += 1
+            continue
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        link_file(str(source), target)
+        updated += 1
+
+    removed = remove_stale_files(dest, targets)
+    return SyncResult(updated, unchanged, removed)
+
+
+def is_up_to_date(source: str, target: str) -> bool:
+    """
+    Returns `True` if `target` is the same file as `source`, or a copy of it with the
+    same size and modification time
+    """
+    try:
+        target_stat = os.stat(target)
+    except OSError:
+        return False
+
+    source_stat = os.stat(source)
+    if (source_stat.st_dev, source_stat.st_ino) == (
+        target_stat.st_dev,
+        target_stat.st_ino,
+    ):
+        return True
+
+    return (
+        source_stat.st_size == target_stat.st_size
+        and source_stat.st_mtime_ns == target_stat.st_mtime_ns
+    )
+
+
+def remove_stale_files(dest: Path, targets) -> int:
+    """
+    Removes the files in `dest` which are not in the set of `targets`, and any
+    directories which are left empty.
+
+    :return The number of files removed
+    """
+    removed = 0
+
+    for (root_dir, dirs, files) in os.walk(str(dest), topdown=False):
+        for file in files:
+            path = os.path.normpath(os.path.join(root_dir, file))
+            if path not in targets:
+                os.unlink(path)
+                removed += 1
+
+        for dir_name in dirs:
+            path = os.path.join(root_dir, dir_name)
+            if not os.path.islink(path) and not os.listdir(path):
+                os.rmdir(path)
+
+    return removed
@@ -0,0 +1,245 @@
+import ast
+import logging
+import os
+from collections import deque
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+"""
+The functions in this file remove the Python modules which the handler can never import
+from a package.  Starting from the handler's module, the imports of each module are
+found by parsing its source, across both the source files and the requirements, and the
+`.py` files of the modules which are never reached are dropped, along with their
+bytecode in `__pycache__` directories, which pip compiles by default.  Other files, such
+as extension modules, data files and package metadata, are always kept, as their imports
+cannot be analysed.  Modules imported dynamically, for example by plugin systems, can be
+kept with an allow-list.  If a module which the handler can reach cannot be parsed, its
+imports are unknown, so no module is removed.
+"""
+
+logger = logging.getLogger(__name__)
+
+DynamicImportFunctions = ["import_module", "__import__"]
+"""
+Calls to these functions with a string literal are followed as imports
+"""
+
+
+class TreeShakingReport(NamedTuple):
+    """
+    The number of modules kept and removed by `shake_paths`, and the size of the files
+    which were removed
+    """
+
+    kept_modules: int
+    removed_modules: int
+    removed_bytes: int
+
+
+def shake_paths(
+    path_lists: List[List[Tuple[Path, Path]]], handler: str, keep: List[str] = None
+) -> Tuple[List[List[Tuple[Path, Path]]], TreeShakingReport]:
+    """
+    Removes the modules which cannot be reached from the handler from lists of package
+    paths, such as the source paths and the requirements paths.  The import graph spans
+    all of the lists.
+
+    :param path_lists   Lists of tuples with the source path of each file and its path
+                        within the package, as returned by `get_zip_package_paths`
+    :param handler      The Lambda handler, such as `app.handler`
+    :param keep         Module names which are always kept along with their imports, as
+                        patterns such as `botocore.*`, for modules imported dynamically
+    :return A tuple with the filtered lists, in the same order, and a report
+    """
+    modules = {}
+    for paths in path_lists:
+        for (local_path, zip_path) in paths:
+            name = get_module_name(zip_path)
+            if name is not None:
+                modules.setdefault(name, Path(local_path))
+
+    roots = [get_handler_module(handler)] + [
+        name
+        for name in modules
+        if any(fnmatchcase(name, pattern) for pattern in keep or [])
+    ]
+    reachable = find_reachable_modules(modules, roots)
+
+    (removed_modules, removed_bytes) = (0, 0)
+    shaken_lists = []
+    for paths in path_lists:
+        shaken_paths = []
+        for path in paths:
+            name = get_module_name(path[1])
+            # Bytecode is only removed along with the source of its module
+            bytecode_name = get_bytecode_module_name(path[1]) if name is None else None
+            if name is not None and name not in reachable:
+                removed_modules += 1
+                removed_bytes += os.stat(str(path[0])).st_size
+            elif bytecode_name in modules and bytecode_name not in reachable:
+                removed_bytes += os.stat(str(path[0])).st_size
+            else:
+                shaken_paths.append(path)
+        shaken_lists.append(shaken_paths)
+
+    kept_modules = len([name for name in modules if name in reachable])
+    report = TreeShakingReport(kept_modules, removed_modules, removed_bytes)
+    return (shaken_lists, report)
+
+
+def find_reachable_modules(modules: Dict[str, Path], roots: List[str]) -> Set[str]:
+    """
+    Returns the names of the modules which can be imported, directly or indirectly, by
+    the root modules.  Importing a module also imports its parent packages.  If one of
+    these modules cannot be parsed, every module is returned, with a warning.
+
+    :param modules  The path of the source file of each module, by name
+    :param roots    The names of the modules the search starts from
+    """
+    reachable = set()
+    queue = deque(roots)
+
+    while queue:
+        name = queue.popleft()
+        if name in reachable:
+            continue
+        reachable.add(name)
+
+        if "." in name:
+            queue.append(name.rpartition(".")[0])
+
+        path = modules.get(name)
+        if path is None:
+            continue
+
+        try:
+            imports = get_imports(path, name)
+        except (SyntaxError, ValueError) as e:
+            logger.warning(
+                f"Could not parse {path}, so tree shaking keeps every module: {e}"
+            )
+            return reachable | set(modules)
+
+        for imported in imports:
+            if imported.endswith(".*"):
+                prefix = imported[:-1]
+                queue.extend(m for m in modules if m.startswith(prefix))
+            else:
+                queue.append(imported)
+
+    return reachable
+
+
+def get_imports(path: Path, name: str) -> Set[str]:
+    """
+    Returns the names of the modules which may be imported by a module, including
+    imports inside functions and `try` blocks.  Names imported with `from` may be
+    attributes rather than modules.  A star import of `a` is returned as `a.*`, as it
+    may import any of the package's submodules.
+
+    :param path     The path of the module's source file
+    :param name     The module's name, used to resolve relative imports
+    :raises SyntaxError, ValueError if the source file cannot be parsed
+    """
+    with open(str(path), "rb") as f:
+        tree = ast.parse(f.read(), filename=str(path))
+
+    is_package = path.stem == "__init__"
+    imports = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = resolve_import(node.module, node.level, name, is_package)
+            if base is None:
+                continue
+            imports.add(base)
+            for alias in node.names:
+                imports.add(f"{base}.{alias.name}")
+        elif (
+            isinstance(node, ast.Call) and get_call_name(node) in DynamicImportFunctions
+        ):
+            imported = get_string_literal(node.args[0]) if node.args else None
+            if imported and not imported.startswith("."):
+                imports.add(imported)
+
+    return imports
+
+
+def resolve_import(
+    module: Optional[str], level: int, name: str, is_package: bool
+) -> Optional[str]:
+    """
+    Returns the absolute name of the module of a `from` import, or `None` if a relative
+    import goes beyond the top-level package
+    """
+    if level == 0:
+        return module
+
+    package_parts = (name if is_package else name.rpartition(".")[0]).split(".")
+    if level - 1 >= len(package_parts):
+        return None
+
+    base_parts = package_parts[: len(package_parts) - (level - 1)]
+    if module:
+        base_parts += module.split(".")
+    return ".".join(base_parts)
+
+
+def get_call_name(node: ast.Call) -> Optional[str]:
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def get_string_literal(node: ast.AST) -> Optional[str]:
+    # Python 3.7 parses string literals as `ast.Str` rather than `ast.Constant`
+    value = getattr(node, "value", getattr(node, "s", None))
+    return value if isinstance(value, str) else None
+
+
+def get_module_name(zip_path) -> Optional[str]:
+    """
+    Returns the name of the module of a `.py` file from its path within the package,
+    or `None` if the file is not an importable Python module
+    """
+    zip_path = Path(zip_path)
+    if zip_path.suffix != ".py":
+        return None
+
+    parts = list(zip_path.parent.parts)
+    if zip_path.stem != "__init__":
+        parts.append(zip_path.stem)
+
+    if not parts or not all(part.isidentifier() for part in parts):
+        return None
+    return ".".join(parts)
+
+
+def get_bytecode_module_name(zip_path) -> Optional[str]:
+    """
+    Returns the name of the module of a bytecode file in a `__pycache__` directory, such
+    as `a.b` for `a/__pycache__/b.cpython-311.pyc`, or `None` for other files
+    """
+    zip_path = Path(zip_path)
+    if zip_path.suffix != ".pyc" or zip_path.parent.name != "__pycache__":
+        return None
+
+    source = zip_path.parent.parent.joinpath(f"{zip_path.name.split('.')[0]}.py")
+    return get_module_name(source)
+
+
+def get_handler_module(handler: str) -> str:
+    """
+    Returns the module name of a Lambda handler string such as `src/app.handler`
+    """
+    if "." not in handler:
+        raise ValueError(
+            f"Invalid handler: '{handler}'. Handler must be in the form module.function"
+        )
+
+    return handler.rsplit(".", 1)[0].replace("/", ".")
@@ -0,0 +1,106 @@
+import os
+from pathlib import Path
+from shutil import copy2, copyfileobj
+from zipfile import ZipFile
+
+"""
+The functions in this file unpack wheels into the wheel store, and assemble requirements
+directories from it.  Each entry of the store is the unpacked content of one wheel, laid
+out as `pip install -t` would install it, and is linked into each build instead of being
+extracted again.
+"""
+
+WheelDataSchemes = {"purelib": [], "platlib": [], "data": [], "scripts": ["bin"]}
+"""
+Where the directories of a wheel's `.data` directory are installed, relative to the
+target directory, as done by `pip install -t`.  Other schemes, such as `headers`, are
+not installed.
+"""
+
+ScriptShebang = b"#!python"
+"""
+The prefix of the first line of the scripts of a wheel which must be run by the Python
+interpreter, which is replaced by the path of the interpreter when installed
+"""
+
+
+def unpack_wheel(wheel: Path, dest: Path, executable: str):
+    """
+    Extracts a wheel into a directory in the same layout as `pip install -t`: the files
+    of the `.data` directory are moved into place, executable permissions are kept, and
+    the `#!python` shebang of scripts is replaced by the interpreter as pip does.
+
+    :param wheel        The path of the `.whl` file
+    :param dest         The directory into which the wheel is extracted
+    :param executable   The interpreter which runs the scripts of the wheel
+    """
+    with ZipFile(str(wheel)) as z:
+        for info in z.infolist():
+            parts = [part for part in info.filename.split("/") if part]
+            if ".." in parts or not parts:
+                raise ValueError(f"Invalid path in wheel {wheel.name}: {info.filename}")
+
+            is_script = False
+            if parts[0].endswith(".data") and len(parts) > 2:
+                if parts[1] not in WheelDataSchemes:
+                    continue
+                is_script = parts[1] == "scripts"
+                parts = WheelDataSchemes[parts[1]] + parts[2:]
+
+            path = dest.joinpath(*parts)
+            if info.is_dir():
+                path.mkdir(parents=True, exist_ok=True)
+                continue
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with z.open(info) as src, open(str(path), "wb") as dst:
+                if is_script:
+                    first_line = src.readline()
+                    if first_line.startswith(ScriptShebang):
+                        first_line = f"#!{executable}{os.linesep}".encode()
+                    dst.write(first_line)
+                copyfileobj(src, dst, 1024 * 1024)
+
+            if (info.external_attr >> 16) & 0o111:
+                path.chmod(0o755)
+
+
+def link_tree(source: Path, dest: Path):
+    """
+    Recreates the directory tree `source` in `dest`, merging it with any existing
+    content, with each file hardlinked rather than copied.
+
+    :return The number of files which had to be copied because they could not be linked
+    """
+    copied = 0
+
+    for (root_dir, _, files) in os.walk(str(source)):
+        target_dir = os.path.join(str(dest), os.path.relpath(root_dir, str(source)))
+        os.makedirs(target_dir, exist_ok=True)
+
+        for file in files:
+            if not link_file(
+                os.path.join(root_dir, file), os.path.join(target_dir, file)
+            ):
+                copied += 1
+
+    return copied
+
+
+def link_file(source: str, dest: str) -> bool:
+    """
+    Hardlinks a file, replacing any existing file.  The file is copied instead, with its
+    modification time, if it cannot be linked, such as when `source` and `dest` are on
+    different filesystems.
+
+    :return `True` if the file was linked, or `False` if it was copied
+    """
+    if os.path.lexists(dest):
+        os.unlink(dest)
+
+    try:
+        os.link(source, dest)
+        return True
+    except OSError:
+        copy2(source, dest)
+        return False
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import time
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Event, Timer
+from unittest import mock
+from unittest.mock import Mock
+
+from lambda_package.aio import build_requirements_async, package_async
+from lambda_package.cache import get_cache
+from lambda_package.configuration import Configuration
+from lambda_package.events import Events
+from lambda_package.requirements import WorkspaceDirName
+
+
+class AioTests(unittest.TestCase):
+    """
+    Unit tests for the `aio` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.requirements = self.root.joinpath("requirements.txt")
+        self.requirements.write_text("toml==0.10.2\n")
+        self.bin_dir = self.root.joinpath("bin")
+        self.bin_dir.mkdir()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_fake_pip(self, script: str):
+        pip = self.bin_dir.joinpath("pip9.9")
+        pip.write_text(f"#!/bin/sh\n{script}\n")
+        pip.chmod(0o755)
+
+    def get_configuration(self, **kwargs):
+        return Configuration(
+            **{
+                "requirements": str(self.requirements),
+                "use_docker": False,
+                "python_version": "9.9",
+                "workspace": str(self.root),
+                "cache_dir": str(self.root.joinpath("cache")),
+                **kwargs,
+            }
+        )
+
+    def get_build_dirs(self):
+        return list(self.root.joinpath(WorkspaceDirName).glob("requirements_dir_*"))
+
+    def test_when_package_async_then_zip_is_written(self):
+        source = self.root.joinpath("src")
+        source.joinpath("pkg").mkdir(parents=True)
+        source.joinpath("pkg", "module.py").write_text("module")
+        source.joinpath("app.py").write_text("app")
+        output = self.root.joinpath("app.zip")
+
+        asyncio.run(
+            package_async(
+                root_path=str(source),
+                configuration=Configuration(exclude=["*.pyc"], output=str(output)),
+            )
+        )
+
+        with zipfile.ZipFile(output) as z:
+            self.assertEqual(sorted(z.namelist()), ["app.py", "pkg/module.py"])
+
+    def test_when_package_async_with_layer_then_pip_runs_in_event_loop(self):
+        self.create_fake_pip('touch "$3/installed.py"')
+        source = self.root.joinpath("src")
+        source.mkdir()
+        source.joinpath("app.py").write_text("app")
+        layer_output = self.root.joinpath("layer.zip")
+
+        with mock.patch.dict(
+            os.environ, {"PATH": f"{self.bin_dir}{os.pathsep}{os.environ['PATH']}"}
+        ), mock.patch(
+            "lambda_package.aio.build_requirements_async",
+            wraps=build_requirements_async,
+        ) as build_mock:
+            asyncio.run(
+                package_async(
+                    root_path=str(source),
+                    configuration=self.get_configuration(
+                        exclude=["*.pyc"], layer_output=str(layer_output)
+                    ),
+                )
+            )
+
+        build_mock.assert_called_once()
+        with zipfile.ZipFile(layer_output) as z:
+            self.assertEqual(z.namelist(), ["installed.py"])
+
+    def test_when_package_async_cancelled_then_pip_is_killed(self):
+        self.create_fake_pip("exec sleep 30")
+        source = self.root.joinpath("src")
+        source.mkdir()
+
+        async def package_and_cancel():
+            task = asyncio.ensure_future(
+                package_async(
+                    root_path=str(source),
+                    configuration=self.get_configuration(
+                        exclude=["*.pyc"],
+                        layer_output=str(self.root.joinpath("layer.zip")),
+                    ),
+                )
+            )
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        with mock.patch.dict(
+            os.environ, {"PATH": f"{self.bin_dir}{os.pathsep}{os.environ['PATH']}"}
+        ):
+            asyncio.run(package_and_cancel())
+
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(self.get_build_dirs(), [])
+        self.assertFalse(self.root.joinpath("layer.zip").exists())
+
+    def test_when_local_build_async_then_pip_output_is_emitted(self):
+        self.create_fake_pip('echo "fake pip $1"\ntouch "$3/installed.py"')
+        batches = []
+        events = Events([batches.append])
+
+        with mock.patch.dict(
+            os.environ, {"PATH": f"{self.bin_dir}{os.pathsep}{os.environ['PATH']}"}
+        ):
+            requirements_dir = asyncio.run(
+                build_requirements_async(self.get_configuration(), events=events)
+            )
+        events.flush()
+
+        self.assertTrue(requirements_dir.joinpath("installed.py").exists())
+        messages = [e.message for batch in batches for e in batch]
+        self.assertIn("fake pip install\n", messages)
+
+    def test_when_local_build_cancelled_then_pip_is_killed(self):
+        self.create_fake_pip("exec sleep 30")
+
+        async def build_and_cancel():
+            task = asyncio.ensure_future(
+                build_requirements_async(self.get_configuration())
+            )
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        with mock.patch.dict(
+            os.environ, {"PATH": f"{self.bin_dir}{os.pathsep}{os.environ['PATH']}"}
+        ):
+            asyncio.run(build_and_cancel())
+
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(self.get_build_dirs(), [])
+
+    @mock.patch("lambda_package.aio.from_env")
+    def test_when_docker_build_cancelled_then_container_is_removed(
+        self, from_env_mock: Mock
+    ):
+        removed = Event()
+        container = Mock()
+        container.logs.return_value = []
+        container.wait.side_effect = lambda: removed.wait(10) and {"StatusCode": 137}
+        container.remove.side_effect = lambda force: removed.set()
+        from_env_mock.return_value.containers.run.return_value = container
+
+        async def build_and_cancel():
+            task = asyncio.ensure_future(
+                build_requirements_async(self.get_configuration(use_docker=True))
+            )
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(build_and_cancel())
+
+        container.remove.assert_called_once_with(force=True)
+        self.assertEqual(self.get_build_dirs(), [])
+
+    @mock.patch("lambda_package.aio.from_env")
+    def test_when_cache_locked_then_docker_build_does_not_block_event_loop(
+        self, from_env_mock: Mock
+    ):
+        container = Mock()
+        container.logs.return_value = []
+        container.wait.return_value = {"StatusCode": 0}
+        from_env_mock.return_value.containers.run.return_value = container
+        configuration = self.get_configuration(use_docker=True)
+        lock = get_cache(configuration).lock("docker_9.9")
+        ticks = []
+
+        async def build_and_tick():
+            task = asyncio.ensure_future(build_requirements_async(configuration))
+            while not task.done():
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+            return await task
+
+        lock.__enter__()
+        Timer(1, lock.__exit__).start()
+        requirements_dir = asyncio.run(build_and_tick())
+
+        self.assertGreater(len(ticks), 10)
+        self.assertTrue(requirements_dir.is_dir())
+        from_env_mock.return_value.containers.run.assert_called_once()
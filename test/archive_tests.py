@@ -0,0 +1,178 @@
+import os
+import unittest
+import zipfile
+import zlib
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from lambda_package.archive import (
+    compress_file,
+    copy_raw_entry,
+    get_reproducible_date_time,
+    is_compressible,
+    is_deflate_stream_of,
+    is_large_file,
+    write_large_file,
+)
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import zip_package
+
+
+class ArchiveTests(unittest.TestCase):
+    """
+    Unit tests for the `archive` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.text_file = self.root.joinpath("model.txt")
+        self.text_file.write_bytes(b"lambda package " * 50000)
+        self.random_file = self.root.joinpath("model.bin")
+        self.random_file.write_bytes(os.urandom(500000))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_when_data_is_random_then_not_compressible(self):
+        self.assertFalse(is_compressible(os.urandom(300000)))
+        self.assertTrue(is_compressible(b"a" * 300000))
+
+    def test_when_is_large_file_then_size_is_compared_to_threshold(self):
+        self.assertTrue(is_large_file(str(self.random_file), 500000))
+        self.assertFalse(is_large_file(str(self.random_file), 500001))
+        self.assertFalse(is_large_file(str(self.random_file), None))
+
+    def test_when_write_large_file_then_incompressible_file_is_stored(self):
+        zip_path = self.root.joinpath("out.zip")
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            write_large_file(z, str(self.text_file), "model.txt")
+            write_large_file(z, str(self.random_file), "model.bin")
+
+        with zipfile.ZipFile(zip_path) as z:
+            self.assertEqual(z.getinfo("model.txt").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(z.getinfo("model.bin").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(z.read("model.txt"), self.text_file.read_bytes())
+            self.assertEqual(z.read("model.bin"), self.random_file.read_bytes())
+            self.assertIsNone(z.testzip())
+
+    def test_when_zip_package_with_threshold_then_large_files_use_fast_path(self):
+        zip_path = self.root.joinpath("out.zip")
+        small_file = self.root.joinpath("small.bin")
+        small_file.write_bytes(os.urandom(1000))
+
+        zip_package(
+            paths=[
+                (self.random_file, Path("model.bin")),
+                (small_file, Path("small.bin")),
+            ],
+            fp=str(zip_path),
+            configuration=Configuration(large_file_threshold=100000),
+        )
+
+        with zipfile.ZipFile(zip_path) as z:
+            self.assertEqual(z.getinfo("model.bin").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(z.getinfo("small.bin").compress_type, zipfile.ZIP_DEFLATED)
+
+    def zip_reproducibly(self, name: str, paths, **kwargs) -> bytes:
+        zip_path = self.root.joinpath(name)
+        zip_package(
+            paths=paths,
+            fp=str(zip_path),
+            configuration=Configuration(reproducible=True, **kwargs),
+        )
+        return zip_path.read_bytes()
+
+    def test_when_reproducible_then_zip_does_not_depend_on_metadata_or_order(self):
+        paths = [
+            (self.text_file, Path("model.txt")),
+            (self.random_file, Path("model.bin")),
+        ]
+        for kwargs in [
+            {},
+            {"large_file_threshold": 100000},
+            {"compressor": "auto"},
+        ]:
+            with self.subTest(**kwargs):
+                first = self.zip_reproducibly("first.zip", paths, **kwargs)
+                self.text_file.chmod(0o600)
+                os.utime(str(self.random_file), (0, 1234567890))
+                second = self.zip_reproducibly("second.zip", paths[::-1], **kwargs)
+                self.text_file.chmod(0o644)
+
+                self.assertEqual(first, second)
+
+        with zipfile.ZipFile(self.root.joinpath("first.zip")) as z:
+            self.assertEqual(z.namelist(), ["model.bin", "model.txt"])
+            for zinfo in z.infolist():
+                self.assertEqual(zinfo.date_time, (1980, 1, 1, 0, 0, 0))
+                self.assertEqual(zinfo.external_attr >> 16, 0o100644)
+
+    def test_when_entries_copied_then_compressed_bytes_are_unchanged(self):
+        (source_path, zip_path) = (
+            self.root.joinpath("a.zip"),
+            self.root.joinpath("b.zip"),
+        )
+        with zipfile.ZipFile(source_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            z.write(str(self.text_file), "model.txt")
+            z.write(str(self.random_file), "model.bin", zipfile.ZIP_STORED)
+
+        with zipfile.ZipFile(source_path) as source, zipfile.ZipFile(
+            zip_path, "w"
+        ) as z:
+            for zinfo in reversed(source.infolist()):
+                copy_raw_entry(z, source, zinfo)
+
+        with zipfile.ZipFile(source_path) as source, zipfile.ZipFile(zip_path) as z:
+            self.assertListEqual(z.namelist(), ["model.bin", "model.txt"])
+            for name in ["model.bin", "model.txt"]:
+                (copied, original) = (z.getinfo(name), source.getinfo(name))
+                self.assertEqual(copied.compress_type, original.compress_type)
+                self.assertEqual(copied.compress_size, original.compress_size)
+                self.assertEqual(copied.date_time, original.date_time)
+                self.assertEqual(copied.external_attr, original.external_attr)
+            self.assertEqual(z.read("model.txt"), self.text_file.read_bytes())
+            self.assertIsNone(z.testzip())
+
+    def test_when_zipfile_internals_missing_then_entries_are_decompressed(self):
+        source_path = self.root.joinpath("a.zip")
+        with zipfile.ZipFile(source_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            z.write(str(self.text_file), "model.txt")
+
+        with mock.patch(
+            "lambda_package.archive.ZipFileInternals", ["_missing"]
+        ), zipfile.ZipFile(source_path) as source, zipfile.ZipFile(
+            self.root.joinpath("b.zip"), "w"
+        ) as z:
+            copy_raw_entry(z, source, source.getinfo("model.txt"))
+
+        with zipfile.ZipFile(self.root.joinpath("b.zip")) as z:
+            self.assertEqual(z.read("model.txt"), self.text_file.read_bytes())
+
+    def test_when_deflate_stream_checked_then_corruption_is_detected(self):
+        data = self.text_file.read_bytes()
+        (crc, stream) = (zlib.crc32(data), self.root.joinpath("stream"))
+        with open(str(stream), "wb") as dest:
+            compress_file(str(self.text_file), dest)
+        compressed = stream.read_bytes()
+
+        self.assertTrue(is_deflate_stream_of(str(stream), crc, len(data)))
+        self.assertFalse(is_deflate_stream_of(str(stream), crc ^ 1, len(data)))
+        for corrupted in [compressed[:-10], compressed + b"x", b"garbage"]:
+            stream.write_bytes(corrupted)
+            self.assertFalse(is_deflate_stream_of(str(stream), crc, len(data)))
+
+    def test_when_source_date_epoch_set_then_it_is_the_timestamp(self):
+        with mock.patch.dict(os.environ, {"SOURCE_DATE_EPOCH": "1700000000"}):
+            self.assertEqual(get_reproducible_date_time(), (2023, 11, 14, 22, 13, 20))
+        with mock.patch.dict(os.environ, {"SOURCE_DATE_EPOCH": "0"}):
+            self.assertEqual(get_reproducible_date_time(), (1980, 1, 1, 0, 0, 0))
+
+    def test_when_reproducible_then_executable_permission_is_kept(self):
+        self.text_file.chmod(0o700)
+
+        self.zip_reproducibly("out.zip", [(self.text_file, Path("model.txt"))])
+
+        with zipfile.ZipFile(self.root.joinpath("out.zip")) as z:
+            self.assertEqual(z.getinfo("model.txt").external_attr >> 16, 0o100755)
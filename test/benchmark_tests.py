@@ -0,0 +1,113 @@
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+from unittest.mock import ANY, Mock
+
+from lambda_package.benchmark import (
+    ImportTimeMarker,
+    ImportTimeReport,
+    ModuleImportTime,
+    compare_import_times,
+    get_handler_module,
+    parse_import_time,
+    run_import_time,
+    unpack_package,
+)
+from lambda_package.configuration import Configuration
+
+ImportTimeOutput = f"""import time: self [us] | cumulative | imported package
+import time:      1402 |      36509 | site
+{ImportTimeMarker}
+import time:       234 |        234 |       _json
+import time:       533 |        767 |     json.scanner
+import time:       493 |       1260 |   json.decoder
+import time:       344 |       1604 | json
+import time:       100 |        100 | app
+"""
+
+
+class BenchmarkTests(unittest.TestCase):
+    """
+    Unit tests for the `benchmark` module
+    """
+
+    def test_when_parse_import_time_then_startup_modules_are_ignored(self):
+        report = parse_import_time("app", ImportTimeOutput)
+
+        self.assertListEqual(
+            [m.name for m in report.modules],
+            ["_json", "json.scanner", "json.decoder", "json", "app"],
+        )
+        self.assertEqual(report.total_us, 1704)
+
+    def test_when_parse_import_time_then_depth_is_parsed(self):
+        report = parse_import_time("app", ImportTimeOutput)
+
+        self.assertListEqual([m.depth for m in report.modules], [3, 2, 1, 0, 0])
+
+    def test_when_get_handler_module_then_function_name_is_removed(self):
+        self.assertEqual(get_handler_module("app.handler"), "app")
+        self.assertEqual(get_handler_module("src/app.handler"), "src.app")
+        self.assertRaises(ValueError, get_handler_module, "app")
+
+    def test_when_compare_import_times_then_sorted_by_difference(self):
+        baseline = ImportTimeReport(
+            "app",
+            300,
+            [ModuleImportTime("a", 100, 100, 0), ModuleImportTime("b", 200, 200, 0)],
+        )
+        current = ImportTimeReport(
+            "app",
+            650,
+            [ModuleImportTime("b", 250, 250, 0), ModuleImportTime("c", 400, 400, 0)],
+        )
+
+        self.assertListEqual(
+            compare_import_times(baseline, current),
+            [("c", None, 400), ("a", 100, None), ("b", 200, 250)],
+        )
+
+    def test_when_unpack_package_then_layer_is_extracted_to_opt_python(self):
+        with TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+            output = temp_path.joinpath("function.zip")
+            layer_output = temp_path.joinpath("layer.zip")
+            with zipfile.ZipFile(output, "w") as z:
+                z.writestr("app.py", "")
+            with zipfile.ZipFile(layer_output, "w") as z:
+                z.writestr("requests/__init__.py", "")
+
+            scratch_dir = temp_path.joinpath("scratch")
+            unpack_package(scratch_dir, output=output, layer_output=layer_output)
+
+            self.assertTrue(scratch_dir.joinpath("var/task/app.py").exists())
+            self.assertTrue(
+                scratch_dir.joinpath("opt/python/requests/__init__.py").exists()
+            )
+
+    @mock.patch("lambda_package.benchmark.from_env")
+    def test_when_use_docker_true_then_import_runs_in_docker(self, from_env_mock: Mock):
+        run_mock = Mock(return_value=ImportTimeOutput.encode())
+        from_env_mock.return_value.containers.run = run_mock
+
+        stderr = run_import_time(
+            Configuration(handler="app.handler", use_docker=True, python_version="3.8"),
+            Path("scratch"),
+        )
+
+        self.assertEqual(stderr, ImportTimeOutput)
+        run_mock.assert_called_once_with(
+            "lambci/lambda:build-python3.8",
+            ["python", "-X", "importtime", "-c", ANY],
+            volumes={
+                "scratch/var/task": {"bind": "/var/task", "mode": "z"},
+                "scratch/opt/python": {"bind": "/opt/python", "mode": "z"},
+            },
+            working_dir="/var/task",
+            environment={"PYTHONPATH": "/var/task:/opt/python"},
+            stdout=False,
+            stderr=True,
+            remove=True,
+        )
@@ -0,0 +1,267 @@
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Event, Lock, Thread
+from unittest import mock
+
+from docker.errors import APIError, ContainerError, NotFound
+
+from lambda_package.builders import BuilderPool, run_in_builder
+from lambda_package.configuration import Configuration
+from lambda_package.requirements import build_requirements
+
+
+class BuildersTests(unittest.TestCase):
+    """
+    Unit tests for the `builders` module, against a fake Docker client
+    """
+
+    def test_when_builds_run_in_sequence_then_one_container_is_reused(self):
+        client = FakeClient()
+        pool = BuilderPool(client)
+
+        for _ in range(3):
+            run_in_builder(pool, "image", "pip install", {"/w": {"bind": "/w"}})
+
+        self.assertEqual(len(client.containers.started), 1)
+        self.assertEqual(len(client.api.commands), 3)
+        pool.close()
+        self.assertTrue(client.containers.started[0].removed)
+
+    def test_when_builds_run_concurrently_then_pool_size_is_respected(self):
+        client = FakeClient(delay=0.05)
+        pool = BuilderPool(client, size=2)
+
+        threads = [
+            Thread(target=run_in_builder, args=(pool, "image", "pip", {}))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(client.containers.started), 2)
+        self.assertEqual(client.api.max_running, 2)
+        self.assertEqual(len(client.api.commands), 5)
+        pool.close()
+
+    def test_when_images_differ_then_each_has_its_own_container(self):
+        client = FakeClient()
+        pool = BuilderPool(client)
+
+        run_in_builder(pool, "python3.8", "pip", {})
+        run_in_builder(pool, "python3.9", "pip", {})
+
+        self.assertListEqual(
+            [c.image for c in client.containers.started], ["python3.8", "python3.9"]
+        )
+        pool.close()
+
+    def test_when_container_is_started_then_it_exits_after_idle_timeout(self):
+        client = FakeClient()
+        pool = BuilderPool(client, idle_timeout=60)
+
+        run_in_builder(pool, "image", "pip install", {})
+
+        (container,) = client.containers.started
+        self.assertIn("-lt 60 ]", container.command[2])
+        self.assertTrue(container.auto_remove)
+        self.assertEqual(client.api.commands[0][:2], ["sh", "-c"])
+        self.assertListEqual(client.api.commands[0][4:], ["pip", "install"])
+        pool.close()
+
+    def test_when_container_has_exited_then_new_container_is_started(self):
+        client = FakeClient()
+        pool = BuilderPool(client)
+
+        run_in_builder(pool, "image", "pip", {})
+        client.containers.started[0].status = "exited"
+        run_in_builder(pool, "image", "pip", {})
+
+        self.assertEqual(len(client.containers.started), 2)
+        self.assertEqual(len(client.api.commands), 2)
+        pool.close()
+
+    def test_when_labelled_container_is_running_then_it_is_reused(self):
+        client = FakeClient()
+        run_in_builder(BuilderPool(client), "image", "pip", {"/w": {"bind": "/w"}})
+
+        pool = BuilderPool(client)
+        run_in_builder(pool, "image", "pip", {"/w": {"bind": "/w"}})
+        run_in_builder(pool, "image", "pip", {"/v": {"bind": "/v"}})
+
+        self.assertEqual(len(client.containers.started), 2)
+        self.assertEqual(len(client.api.commands), 3)
+        pool.close()
+
+    def test_when_command_fails_then_error_is_raised_and_container_kept(self):
+        client = FakeClient(exit_code=1)
+        pool = BuilderPool(client)
+
+        with self.assertRaises(ContainerError):
+            run_in_builder(pool, "image", "pip", {})
+        client.api.exit_code = 0
+        run_in_builder(pool, "image", "pip", {})
+
+        self.assertEqual(len(client.containers.started), 1)
+        pool.close()
+
+    def test_when_docker_api_fails_then_container_is_replaced(self):
+        client = FakeClient()
+        pool = BuilderPool(client)
+        client.api.errors = [APIError("container is not running")] * 2
+
+        with self.assertRaises(APIError):
+            run_in_builder(pool, "image", "pip", {})
+        run_in_builder(pool, "image", "pip", {})
+
+        self.assertTrue(client.containers.started[0].removed)
+        self.assertTrue(client.containers.started[1].removed)
+        self.assertEqual(len(client.containers.started), 3)
+        pool.close()
+
+    def test_when_container_exits_before_build_starts_then_build_is_retried(self):
+        client = FakeClient()
+        pool = BuilderPool(client)
+        client.api.errors = [NotFound("No such container")]
+
+        run_in_builder(pool, "image", "pip", {})
+
+        self.assertTrue(client.containers.started[0].removed)
+        self.assertEqual(len(client.containers.started), 2)
+        self.assertEqual(len(client.api.commands), 1)
+        pool.close()
+
+    def test_when_output_is_chunked_then_log_events_are_lines(self):
+        client = FakeClient(output=[b"Collecting a\nColl", b"ecting b\n", b"Done"])
+        events = mock.Mock()
+
+        run_in_builder(BuilderPool(client), "image", "pip", {}, events)
+
+        self.assertListEqual(
+            [c[1]["message"] for c in events.emit.call_args_list],
+            ["Collecting a\n", "Collecting b\n", "Done"],
+        )
+
+    def test_when_builder_pool_configured_then_build_runs_in_builder(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            requirements = root.joinpath("requirements.txt")
+            requirements.write_text("standin==1.0\n")
+            client = FakeClient()
+            pool = BuilderPool(client)
+
+            with mock.patch(
+                "lambda_package.requirements.get_builder_pool", return_value=pool
+            ):
+                requirements_dir = build_requirements(
+                    Configuration(
+                        requirements=str(requirements),
+                        use_docker=True,
+                        python_version="3.8",
+                        workspace=str(root),
+                        cache_dir=str(root.joinpath("cache")),
+                        builder_pool=True,
+                    )
+                )
+
+            (container,) = client.containers.started
+            self.assertEqual(container.image, "lambci/lambda:build-python3.8")
+            self.assertIn(str(requirements_dir.parent), container.volumes)
+            self.assertIn(str(root.joinpath("cache")), container.volumes)
+            self.assertIn(
+                f"pip install -t {requirements_dir}/", " ".join(client.api.commands[0])
+            )
+            self.assertFalse(requirements_dir.joinpath("requirements.txt").exists())
+            pool.close()
+
+
+class FakeContainer:
+    def __init__(self, image, command, volumes, labels, auto_remove):
+        self.id = f"container-{id(self)}"
+        self.image = image
+        self.command = command
+        self.volumes = volumes
+        self.labels = labels
+        self.auto_remove = auto_remove
+        self.status = "running"
+        self.removed_event = Event()
+
+    @property
+    def removed(self):
+        return self.removed_event.is_set()
+
+    def reload(self):
+        pass
+
+    def remove(self, force=False):
+        self.status = "removing"
+        self.removed_event.set()
+
+
+class FakeContainers:
+    def __init__(self):
+        self.started = []
+
+    def run(
+        self,
+        image,
+        command,
+        volumes=None,
+        labels=None,
+        auto_remove=False,
+        detach=False,
+    ):
+        container = FakeContainer(image, command, volumes, labels, auto_remove)
+        self.started.append(container)
+        return container
+
+    def list(self, filters=None):
+        (name, value) = filters["label"].split("=")
+        return [
+            c
+            for c in self.started
+            if c.status == "running" and c.labels.get(name) == value
+        ]
+
+
+class FakeAPI:
+    def __init__(self, delay, exit_code, output):
+        self.delay = delay
+        self.exit_code = exit_code
+        self.output = output
+        self.errors = []
+        self.commands = []
+        self.lock = Lock()
+        (self.running, self.max_running) = (0, 0)
+
+    def exec_create(self, container, cmd, user=None, environment=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        with self.lock:
+            self.commands.append(cmd)
+            return {"Id": len(self.commands)}
+
+    def exec_start(self, exec_id, stream=False):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return iter(self.output)
+
+    def exec_inspect(self, exec_id):
+        return {"ExitCode": self.exit_code}
+
+
+class FakeClient:
+    """
+    Implements the parts of the Docker client used by the builder pool
+    """
+
+    def __init__(self, delay=0, exit_code=0, output=(b"Successfully installed\n",)):
+        self.containers = FakeContainers()
+        self.api = FakeAPI(delay, exit_code, output)
@@ -0,0 +1,110 @@
+import errno
+import io
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from lambda_package.cache import Cache, get_cache
+from lambda_package.configuration import Configuration
+
+
+class CacheTests(unittest.TestCase):
+    """
+    Unit tests for the `cache` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.cache = Cache(Path(self.temp_dir.name).joinpath("cache"), size_limit=None)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def add_entry(self, name, size, last_access):
+        path = self.cache.put_file(io.BytesIO(b"x" * size), *name.split("/"))
+        os.utime(str(path), (last_access, last_access))
+
+    def test_when_get_cache_without_cache_dir_then_temp_dir_is_used(self):
+        cache = get_cache(Configuration(cache_size_limit=5))
+
+        self.assertEqual(cache.root.name, "lambda_package_cache")
+        self.assertEqual(cache.size_limit, 5)
+
+    def test_when_put_file_then_entry_can_be_read(self):
+        self.cache.put_file(io.BytesIO(b"hello"), "layers", "abc")
+
+        self.assertEqual(self.cache.get("layers", "abc").read_bytes(), b"hello")
+        self.assertIsNone(self.cache.get("layers", "def"))
+        self.assertListEqual(os.listdir(str(self.cache.root.joinpath(".tmp"))), [])
+
+    def test_when_entries_then_namespaces_are_expanded(self):
+        self.add_entry("layers/a", 1, 100)
+        self.add_entry("layers/b", 2, 300)
+        self.add_entry("top", 3, 200)
+
+        self.assertListEqual(
+            [(entry.name, entry.size) for entry in self.cache.entries()],
+            [("layers/a", 1), ("top", 3), ("layers/b", 2)],
+        )
+
+    def test_when_prune_then_least_recently_used_entries_are_evicted(self):
+        self.add_entry("layers/a", 10, 100)
+        self.add_entry("layers/b", 10, 300)
+        self.add_entry("layers/c", 10, 200)
+
+        evicted = self.cache.prune(size_limit=15)
+
+        self.assertListEqual(
+            [entry.name for entry in evicted], ["layers/a", "layers/c"]
+        )
+        self.assertIsNotNone(self.cache.get("layers", "b"))
+
+    def test_when_entry_is_in_use_then_it_is_not_evicted(self):
+        with self.cache.use("pip") as pip_dir:
+            pip_dir.joinpath("wheel").write_bytes(b"x" * 10)
+            evicted = self.cache.clear()
+            self.assertListEqual(evicted, [])
+
+        evicted = self.cache.clear()
+        self.assertListEqual([entry.name for entry in evicted], ["pip"])
+
+    def test_when_entry_is_read_then_it_is_not_evicted(self):
+        self.cache.put_file(io.BytesIO(b"x" * 10), "layers", "abc")
+
+        with self.cache.read("layers", "abc") as path:
+            self.assertListEqual(self.cache.clear(), [])
+            self.assertEqual(path.read_bytes(), b"x" * 10)
+        with self.cache.read("layers", "def") as path:
+            self.assertIsNone(path)
+
+        self.assertListEqual(
+            [entry.name for entry in self.cache.clear()], ["layers/abc"]
+        )
+
+    def test_when_lock_fails_for_other_reason_then_error_is_not_blocking(self):
+        error = OSError(errno.ENOLCK, "No locks available")
+        with mock.patch("lambda_package.cache.fcntl.flock", side_effect=error):
+            with self.assertRaises(OSError) as context:
+                with self.cache.lock("pip", blocking=False):
+                    pass
+
+        self.assertNotIsInstance(context.exception, BlockingIOError)
+        self.assertEqual(context.exception.errno, errno.ENOLCK)
+
+    def test_when_lock_is_held_then_blocking_error_is_raised(self):
+        with self.cache.lock("pip"):
+            with self.assertRaises(BlockingIOError):
+                with self.cache.lock("pip", blocking=False):
+                    pass
+
+    def test_when_put_directory_then_directory_is_moved_into_place(self):
+        def build(path):
+            path.joinpath("module.py").write_text("")
+
+        path = self.cache.put_directory(build, "wheels", "abc")
+        self.cache.put_directory(build, "wheels", "abc")
+
+        self.assertTrue(path.joinpath("module.py").exists())
+        self.assertListEqual(os.listdir(str(self.cache.root.joinpath(".tmp"))), [])
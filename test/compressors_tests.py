@@ -0,0 +1,81 @@
+import os
+import unittest
+import zipfile
+import zlib
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from lambda_package.compressors import Compressors, ZlibCompressor, get_compressor
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import zip_package
+
+
+def is_installed(name: str) -> bool:
+    try:
+        Compressors[name]()
+        return True
+    except ImportError:
+        return False
+
+
+class CompressorsTests(unittest.TestCase):
+    """
+    Unit tests for the `compressors` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.files = {
+            "module.py": b"import os\n" * 5000,
+            "data.bin": os.urandom(100000),
+            "empty.txt": b"",
+        }
+        for (name, data) in self.files.items():
+            self.root.joinpath(name).write_bytes(data)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assert_zip_is_valid(self, compressor: str):
+        output = self.root.joinpath(f"{compressor}.zip")
+        paths = [(self.root.joinpath(name), Path(name)) for name in self.files]
+
+        zip_package(
+            paths, str(output), configuration=Configuration(compressor=compressor)
+        )
+
+        with zipfile.ZipFile(output) as z:
+            self.assertIsNone(z.testzip())
+            for (name, data) in self.files.items():
+                self.assertEqual(z.read(name), data)
+            self.assertLess(z.getinfo("module.py").compress_size, 50000)
+
+    def test_when_auto_compressor_then_zip_is_valid(self):
+        self.assert_zip_is_valid("auto")
+
+    def test_when_zlib_backend_then_output_is_raw_deflate(self):
+        data = self.files["module.py"]
+        compressed = ZlibCompressor().compress(data, 9)
+
+        self.assertEqual(zlib.decompress(compressed, -15), data)
+
+    @unittest.skipUnless(is_installed("isal"), "isal is not installed")
+    def test_when_isal_compressor_then_zip_is_valid(self):
+        self.assert_zip_is_valid("isal")
+
+    @unittest.skipUnless(is_installed("libdeflate"), "deflate is not installed")
+    def test_when_libdeflate_compressor_then_zip_is_valid(self):
+        self.assert_zip_is_valid("libdeflate")
+
+    def test_when_compressor_not_installed_then_zlib_is_used(self):
+        def not_installed():
+            raise ImportError("isal")
+
+        with mock.patch.dict(Compressors, {"isal": not_installed}):
+            with self.assertLogs("lambda_package.compressors", "WARNING"):
+                self.assertIsInstance(get_compressor("isal"), ZlibCompressor)
+
+    def test_when_compressor_is_invalid_then_raise_exception(self):
+        self.assertRaisesRegex(ValueError, "Invalid compressor", get_compressor, "lz4")
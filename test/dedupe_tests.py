@@ -0,0 +1,156 @@
+import unittest
+import zipfile
+from pathlib import Path
+from shutil import copytree
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from lambda_package.configuration import Configuration
+from lambda_package.dedupe import dedupe_paths
+from lambda_package.events import Events
+from lambda_package.lambda_package import get_zip_package_paths, package
+
+
+class DedupeTests(unittest.TestCase):
+    """
+    Unit tests for the `dedupe` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.source = self.root.joinpath("src")
+        self.requirements = self.root.joinpath("requirements")
+
+        self.write(
+            self.source,
+            {
+                "app.py": "import six\n",
+                "six.py": "# six\n" * 100,
+                "vendored/__init__.py": "",
+                "vendored/client.py": "# client\n",
+                "mixed/__init__.py": "",
+                "mixed/local.py": "# local\n",
+                "patched.py": "# patched\n",
+            },
+        )
+        self.write(
+            self.requirements,
+            {
+                "six.py": "# six\n" * 100,
+                "vendored/__init__.py": "",
+                "vendored/client.py": "# client\n",
+                "vendored/extra.py": "# extra\n",
+                "mixed/__init__.py": "",
+                "patched.py": "# original\n",
+            },
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, root: Path, files):
+        for (name, content) in files.items():
+            path = root.joinpath(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+
+    def get_paths(self, root: Path):
+        return get_zip_package_paths(
+            sorted(p for p in root.rglob("*") if p.is_file()), root
+        )
+
+    def get_names(self, paths):
+        return {zip_path.as_posix() for (_, zip_path) in paths}
+
+    def test_when_layer_policy_then_duplicates_are_removed_from_package(self):
+        with self.assertLogs("lambda_package.dedupe") as logs:
+            (zip_paths, layer_paths, report) = dedupe_paths(
+                self.get_paths(self.source), self.get_paths(self.requirements), "layer"
+            )
+
+        self.assertSetEqual(
+            self.get_names(zip_paths),
+            {"app.py", "mixed/__init__.py", "mixed/local.py", "patched.py"},
+        )
+        self.assertEqual(len(layer_paths), 6)
+        self.assertTupleEqual(report, (3, 600 + 9, 1))
+        self.assertIn("patched.py differs", logs.output[0])
+
+    def test_when_function_policy_then_duplicates_are_removed_from_layer(self):
+        (zip_paths, layer_paths, report) = dedupe_paths(
+            self.get_paths(self.source), self.get_paths(self.requirements), "function"
+        )
+
+        self.assertEqual(len(zip_paths), 7)
+        self.assertSetEqual(
+            self.get_names(layer_paths),
+            {
+                "vendored/__init__.py",
+                "vendored/client.py",
+                "vendored/extra.py",
+                "patched.py",
+            },
+        )
+        self.assertTupleEqual(report, (2, 600, 1))
+
+    def test_when_layer_not_built_then_layer_zip_is_read(self):
+        layer_zip = self.root.joinpath("layer.zip")
+        with zipfile.ZipFile(layer_zip, "w") as z:
+            for (path, zip_path) in self.get_paths(self.requirements):
+                z.write(path, zip_path.as_posix())
+
+        (zip_paths, layer_paths, report) = dedupe_paths(
+            self.get_paths(self.source), None, "layer", str(layer_zip)
+        )
+
+        self.assertNotIn("six.py", self.get_names(zip_paths))
+        self.assertIsNone(layer_paths)
+        self.assertTupleEqual(report, (3, 609, 1))
+
+    @mock.patch("lambda_package.lambda_package.Thread")
+    @mock.patch("lambda_package.lambda_package.build_requirements")
+    def test_when_package_with_dedupe_then_report_is_emitted(self, build_mock, _):
+        build_dir = self.root.joinpath("build")
+        copytree(str(self.requirements), str(build_dir))
+        build_mock.return_value = str(build_dir)
+        (output, layer_output) = (self.root.joinpath("app.zip"), "layer.zip")
+        received = []
+
+        package(
+            root_path=str(self.source),
+            configuration=Configuration(
+                exclude=["*.pyc"],
+                requirements="requirements.txt",
+                output=str(output),
+                layer_output=str(self.root.joinpath(layer_output)),
+                dedupe="layer",
+            ),
+            events=Events([received.extend]),
+        )
+
+        with zipfile.ZipFile(output) as z:
+            self.assertNotIn("six.py", z.namelist())
+            self.assertIn("app.py", z.namelist())
+        with zipfile.ZipFile(self.root.joinpath(layer_output)) as z:
+            self.assertIn("six.py", z.namelist())
+        (event,) = [e for e in received if e.kind == "deduplicated"]
+        self.assertTupleEqual(
+            (event.total, event.raw_bytes, event.message), (3, 609, "package")
+        )
+
+    def test_when_dedupe_policy_invalid_then_raise_exception(self):
+        with self.assertRaises(ValueError):
+            package(
+                root_path=str(self.source),
+                configuration=Configuration(
+                    exclude=["*.pyc"],
+                    requirements="requirements.txt",
+                    layer_output=str(self.root.joinpath("layer.zip")),
+                    dedupe="both",
+                ),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import io
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+
+from lambda_package.events import Events, ProgressBar
+from lambda_package.lambda_package import find_paths, zip_package
+
+
+class EventsTests(unittest.TestCase):
+    """
+    Unit tests for the `events` module
+    """
+
+    def setUp(self):
+        self.batches = []
+        self.events = Events([self.batches.append], batch_size=3, flush_interval=60)
+
+    def test_when_batch_is_full_then_listeners_are_called(self):
+        self.events.emit("log", message="one")
+        self.events.emit("log", message="two")
+        self.assertEqual(self.batches, [])
+
+        self.events.emit("log", message="three")
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual([e.message for e in self.batches[0]], ["one", "two", "three"])
+
+    def test_when_emitted_from_threads_then_listener_calls_do_not_overlap(self):
+        calls = {"running": 0, "max_running": 0, "events": 0}
+
+        def listener(batch):
+            calls["running"] += 1
+            calls["max_running"] = max(calls["max_running"], calls["running"])
+            time.sleep(0.001)
+            calls["events"] += len(batch)
+            calls["running"] -= 1
+
+        events = Events([listener], batch_size=1)
+        threads = [
+            Thread(target=lambda: [events.emit("log") for _ in range(20)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        events.flush()
+
+        self.assertEqual(calls["max_running"], 1)
+        self.assertEqual(calls["events"], 160)
+
+    def test_when_phase_ends_then_batch_is_flushed(self):
+        with self.events.phase("zip_package", total=10):
+            self.events.emit(
+                "file_compressed", path="a", raw_bytes=2, compressed_bytes=1
+            )
+
+        kinds = [[e.kind for e in batch] for batch in self.batches]
+        self.assertEqual(kinds, [["phase_start"], ["file_compressed", "phase_end"]])
+        self.assertEqual(self.batches[0][0].total, 10)
+
+    def test_when_zip_package_and_find_paths_then_events_are_emitted(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            root.joinpath("sub").mkdir()
+            root.joinpath("sub", "a.txt").write_text("a" * 1000)
+            root.joinpath("b.txt").write_text("b")
+
+            (paths, _) = find_paths(root, [], events=self.events)
+            zip_package(
+                [(p, p.relative_to(root)) for p in paths],
+                str(root.joinpath("out.zip")),
+                events=self.events,
+            )
+            self.events.flush()
+
+        events = [e for batch in self.batches for e in batch]
+        scanned = [e for e in events if e.kind == "directory_scanned"]
+        self.assertEqual(sorted(e.total for e in scanned), [1, 1])
+
+        compressed = {e.path: e for e in events if e.kind == "file_compressed"}
+        self.assertEqual(set(compressed), {"sub/a.txt", "b.txt"})
+        self.assertEqual(compressed["sub/a.txt"].raw_bytes, 1000)
+        self.assertLess(compressed["sub/a.txt"].compressed_bytes, 1000)
+
+    def test_when_progress_bar_not_a_terminal_then_phase_end_is_printed(self):
+        stream = io.StringIO()
+        events = Events([ProgressBar(stream, interval=60)])
+
+        with events.phase("zip_package", total=2):
+            events.emit("file_compressed", path="a", raw_bytes=10, compressed_bytes=5)
+            events.emit("log", message="Collecting toml\n")
+            events.emit("file_compressed", path="b", raw_bytes=10, compressed_bytes=5)
+
+        lines = stream.getvalue().splitlines()
+        self.assertIn("Collecting toml", lines)
+        self.assertTrue(lines[-1].startswith("zip_package: ["))
+        self.assertIn("2/2 files", lines[-1])
+        self.assertTrue(lines[-1].endswith("done"))
@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import tarfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from lambda_package.configuration import Configuration
+from lambda_package.image import write_image
+from lambda_package.lambda_package import package
+
+
+class ImageTests(unittest.TestCase):
+    """
+    Unit tests for the `image` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.source = self.root.joinpath("src")
+        self.source.joinpath("pkg").mkdir(parents=True)
+        self.source.joinpath("app.py").write_text("app")
+        self.source.joinpath("pkg", "module.py").write_text("module")
+        self.requirements = self.root.joinpath("requirements")
+        self.requirements.joinpath("toml").mkdir(parents=True)
+        self.requirements.joinpath("toml", "__init__.py").write_text("toml")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_layers(self):
+        return [
+            [
+                (
+                    self.requirements.joinpath("toml", "__init__.py"),
+                    Path("toml/__init__.py"),
+                )
+            ],
+            [
+                (self.source.joinpath("app.py"), Path("app.py")),
+                (self.source.joinpath("pkg", "module.py"), Path("pkg/module.py")),
+            ],
+        ]
+
+    def read_blob(self, layout: Path, digest: str) -> bytes:
+        data = layout.joinpath("blobs", "sha256", digest.split(":")[1]).read_bytes()
+        self.assertEqual(f"sha256:{hashlib.sha256(data).hexdigest()}", digest)
+        return data
+
+    def read_image(self, layout: Path):
+        index = json.loads(layout.joinpath("index.json").read_text())
+        manifest = json.loads(self.read_blob(layout, index["manifests"][0]["digest"]))
+        config = json.loads(self.read_blob(layout, manifest["config"]["digest"]))
+        return (manifest, config)
+
+    def test_when_image_written_then_layout_is_valid(self):
+        layout = self.root.joinpath("image")
+
+        write_image(layout, self.get_layers(), handler="app.handler")
+
+        (manifest, config) = self.read_image(layout)
+        self.assertEqual(
+            json.loads(layout.joinpath("oci-layout").read_text()),
+            {"imageLayoutVersion": "1.0.0"},
+        )
+        self.assertEqual(config["architecture"], "amd64")
+        self.assertEqual(config["config"]["Cmd"], ["app.handler"])
+        self.assertEqual(len(manifest["layers"]), 2)
+
+        for (layer, diff_id) in zip(manifest["layers"], config["rootfs"]["diff_ids"]):
+            tar_data = gzip.decompress(self.read_blob(layout, layer["digest"]))
+            self.assertEqual(f"sha256:{hashlib.sha256(tar_data).hexdigest()}", diff_id)
+
+        source_layer = self.read_blob(layout, manifest["layers"][1]["digest"])
+        with tarfile.open(fileobj=gzip.GzipFile(fileobj=BytesIO(source_layer))) as tar:
+            members = tar.getmembers()
+            self.assertEqual(
+                [m.name for m in members],
+                [
+                    "var",
+                    "var/task",
+                    "var/task/app.py",
+                    "var/task/pkg",
+                    "var/task/pkg/module.py",
+                ],
+            )
+            for member in members:
+                self.assertEqual((member.mtime, member.uid, member.gid), (0, 0, 0))
+            self.assertEqual(tar.extractfile("var/task/app.py").read(), b"app")
+
+    def test_when_only_source_changes_then_requirements_layer_is_reused(self):
+        layout = self.root.joinpath("image")
+        write_image(layout, self.get_layers())
+        (first_manifest, _) = self.read_image(layout)
+
+        self.source.joinpath("app.py").write_text("changed")
+        write_image(layout, self.get_layers())
+        (second_manifest, _) = self.read_image(layout)
+
+        self.assertEqual(first_manifest["layers"][0], second_manifest["layers"][0])
+        self.assertNotEqual(first_manifest["layers"][1], second_manifest["layers"][1])
+
+    def test_when_image_written_twice_then_digests_are_identical(self):
+        first = write_image(self.root.joinpath("first"), self.get_layers())
+        second = write_image(self.root.joinpath("second"), self.get_layers())
+
+        self.assertEqual(first, second)
+
+    def test_when_base_given_then_layers_are_added_on_top(self):
+        base = self.root.joinpath("base")
+        write_image(base, self.get_layers()[:1], handler="base.handler")
+        (base_manifest, base_config) = self.read_image(base)
+        layout = self.root.joinpath("image")
+
+        write_image(layout, self.get_layers()[1:], base_dir=base)
+
+        (manifest, config) = self.read_image(layout)
+        self.assertEqual(manifest["layers"][0], base_manifest["layers"][0])
+        self.assertEqual(len(manifest["layers"]), 2)
+        self.assertEqual(
+            config["rootfs"]["diff_ids"][0], base_config["rootfs"]["diff_ids"][0]
+        )
+        self.assertEqual(config["config"]["Cmd"], ["base.handler"])
+        self.assertEqual(len(config["history"]), 2)
+        self.read_blob(layout, manifest["layers"][0]["digest"])
+
+    def test_when_package_with_image_output_then_image_is_written(self):
+        layout = self.root.joinpath("image")
+
+        package(
+            root_path=str(self.source),
+            configuration=Configuration(exclude=["*.pyc"], image_output=str(layout)),
+        )
+
+        (manifest, _) = self.read_image(layout)
+        self.assertEqual(len(manifest["layers"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
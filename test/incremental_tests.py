@@ -0,0 +1,195 @@
+import os
+import sys
+import unittest
+import zipfile
+from functools import partial
+from http.server import ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from test.requirements_tests import StandInIndexHandler, create_wheel
+from threading import Thread
+from unittest import mock
+
+from lambda_package import package
+from lambda_package.configuration import Configuration
+from lambda_package.incremental import (
+    LayerState,
+    format_layer_state,
+    get_owner,
+    plan_layer_update,
+    read_layer_state,
+    read_pins,
+    read_record_owners,
+)
+
+
+class IncrementalTests(unittest.TestCase):
+    """
+    Unit tests for the `incremental` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.requirements = self.root.joinpath("requirements.txt")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_when_requirements_fully_pinned_then_pins_are_read_by_name(self):
+        self.requirements.write_text(
+            "--extra-index-url https://example.com/simple\n"
+            "Foo_Bar==1.0  # via baz\n"
+            "baz[extra]==2.0 ; python_version >= '3.8'\n"
+        )
+
+        (pins, options) = read_pins(str(self.requirements))
+
+        self.assertDictEqual(
+            pins,
+            {
+                "foo-bar": "Foo_Bar==1.0",
+                "baz": "baz[extra]==2.0 ; python_version >= '3.8'",
+            },
+        )
+        self.assertListEqual(
+            options, ["--extra-index-url", "https://example.com/simple"]
+        )
+
+    def test_when_requirement_not_pinned_or_hashed_then_pins_are_not_read(self):
+        for content in [
+            "foo==1.0\nbar>=2.0\n",
+            "foo==1.0 \\\n    --hash=sha256:abcd\n",
+            "-r other.txt\nfoo==1.0\n",
+        ]:
+            self.requirements.write_text(content)
+            self.assertIsNone(read_pins(str(self.requirements)))
+
+    def test_when_pins_change_then_only_changed_distributions_are_installed(self):
+        previous_pins = {"a": "a==1.0", "b": "b==1.0", "c": "c==1.0", "d": "d==1.0"}
+        pins = {"a": "a==1.0", "b": "b==2.0", "d": "d==1.0", "e": "e==1.0"}
+        versions = {"a": "1.0", "b": "1.0", "c": "1.0"}
+
+        update = plan_layer_update(previous_pins, pins, versions)
+
+        # `d` is missing from the previous layer, so it is installed again
+        self.assertListEqual(update.install_specs, ["b==2.0", "d==1.0", "e==1.0"])
+        self.assertSetEqual(update.installed, {"b", "d", "e"})
+        self.assertSetEqual(update.removed, {"b", "c", "d", "e"})
+
+    def test_when_versions_are_equal_but_spelled_differently_then_not_installed(self):
+        pins = {"a": "a==2.31", "b": "b==1.0-Alpha.1", "c": "c==1.0.post1"}
+        versions = {"a": "2.31.0", "b": "1.0a1", "c": "1.0"}
+
+        update = plan_layer_update(pins, pins, versions)
+
+        self.assertListEqual(update.install_specs, ["c==1.0.post1"])
+
+    def test_when_pin_has_marker_then_it_is_installed_only_when_changed(self):
+        spec = "a==1.0 ; python_version < '3'"
+        update = plan_layer_update({"a": spec}, {"a": spec}, {})
+
+        self.assertListEqual(update.install_specs, [])
+        self.assertSetEqual(update.removed, set())
+
+    def test_when_records_read_then_files_and_bytecode_have_owners(self):
+        files = {
+            "foo-1.0.dist-info/RECORD": (
+                "foo/__init__.py,sha256=x,1\n"
+                "foo-1.0.dist-info/RECORD,,\n"
+                "../../bin/foo,sha256=y,2\n"
+            ),
+            "foo/__init__.py": "",
+        }
+
+        (versions, owners) = read_record_owners(
+            files, lambda path: BytesIO(files[path].encode())
+        )
+
+        self.assertDictEqual(versions, {"foo": "1.0"})
+        self.assertEqual(get_owner(owners, "foo/__init__.py"), "foo")
+        self.assertEqual(
+            get_owner(owners, "foo/__pycache__/__init__.cpython-311.pyc"), "foo"
+        )
+        self.assertEqual(get_owner(owners, "bin/foo"), "foo")
+
+    def test_when_state_stored_in_comment_then_it_is_read_back(self):
+        state = LayerState({"a": "a==1.0"}, ["--pre"], ["3.11", "x86_64"])
+        output = BytesIO()
+        with zipfile.ZipFile(output, "w") as z:
+            z.comment = format_layer_state(state)
+
+        with zipfile.ZipFile(output) as z:
+            self.assertEqual(read_layer_state(z), state)
+
+    @mock.patch.dict(
+        os.environ, {"PIP_DISABLE_PIP_VERSION_CHECK": "1", "PIP_NO_INPUT": "1"}
+    )
+    def test_when_pins_change_then_layer_is_updated_from_previous_zip(self):
+        index_dir = self.root.joinpath("index")
+        index_dir.mkdir()
+        for (name, version) in [
+            ("kept", "1.0"),
+            ("changed", "1.0"),
+            ("changed", "2.0"),
+        ]:
+            create_wheel(index_dir, name, version)
+        create_wheel(index_dir, "removed", "1.0", console_script=True)
+        create_wheel(index_dir, "added", "1.0")
+        source_dir = self.root.joinpath("src")
+        source_dir.mkdir()
+        source_dir.joinpath("app.py").write_text("")
+        layer_output = self.root.joinpath("layer.zip")
+
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            partial(StandInIndexHandler, directory=str(index_dir)),
+        )
+        server.requests = []
+        Thread(target=server.serve_forever, daemon=True).start()
+        configuration = Configuration(
+            exclude=[".*"],
+            requirements=str(self.requirements),
+            layer_output=str(layer_output),
+            use_docker=False,
+            python_version=f"{sys.version_info[0]}.{sys.version_info[1]}",
+            workspace=str(self.root),
+            cache_dir=str(self.root.joinpath("cache")),
+            index_url=f"http://127.0.0.1:{server.server_port}/simple",
+            incremental_layer=True,
+        )
+
+        try:
+            self.requirements.write_text("kept==1.0\nchanged==1.0\nremoved==1.0\n")
+            package(str(source_dir), configuration)
+            with zipfile.ZipFile(str(layer_output)) as z:
+                kept_info = z.getinfo("kept/__init__.py")
+                self.assertIn("bin/removed", z.namelist())
+
+            server.requests.clear()
+            self.requirements.write_text("kept==1.0\nchanged==2.0\nadded==1.0\n")
+            package(str(source_dir), configuration)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertNotIn("/simple/kept/", server.requests)
+        with zipfile.ZipFile(str(layer_output)) as z:
+            names = set(z.namelist())
+            self.assertIn("kept/__init__.py", names)
+            self.assertIn("added/__init__.py", names)
+            self.assertFalse(any(name.startswith("removed") for name in names))
+            self.assertNotIn("bin/removed", names)
+            self.assertIn("changed-2.0.dist-info/RECORD", names)
+            self.assertNotIn("changed-1.0.dist-info/RECORD", names)
+            self.assertEqual(z.read("changed/__init__.py"), b"VERSION = '2.0'\n")
+            self.assertIsNone(z.testzip())
+
+            copied_info = z.getinfo("kept/__init__.py")
+            self.assertEqual(copied_info.date_time, kept_info.date_time)
+            self.assertEqual(copied_info.CRC, kept_info.CRC)
+            self.assertEqual(
+                read_layer_state(z).pins,
+                {"kept": "kept==1.0", "changed": "changed==2.0", "added": "added==1.0"},
+            )
@@ -1,7 +1,8 @@
 import unittest
 from pathlib import Path
 
-from lambda_package import find_paths
+from lambda_package import find_paths, iter_paths
+from lambda_package.lambda_package import find_paths_threaded
 
 
 class LambdaPackageFindPathsTests(unittest.TestCase):
@@ -39,6 +40,28 @@ class LambdaPackageFindPathsTests(unittest.TestCase):
             },
         )
 
+    def test_find_paths_threaded_matches_find_paths(self):
+        (excludes, dirs) = get_test_data()
+        (paths, tree) = find_paths(dirs, excludes)
+        (threaded_paths, threaded_tree) = find_paths_threaded(
+            dirs, excludes, max_workers=4
+        )
+
+        self.assertListEqual(
+            [str(path) for path in threaded_paths], [str(path) for path in paths]
+        )
+        self.assertListEqual(tree_to_list(threaded_tree), tree_to_list(tree))
+
+    def test_iter_paths_matches_find_paths(self):
+        (excludes, dirs) = get_test_data()
+        (paths, _) = find_paths(dirs, excludes)
+        iterator = iter_paths(dirs, excludes)
+
+        self.assertEqual(str(next(iterator)), str(paths[0]))
+        self.assertListEqual(
+            [str(path) for path in iterator], [str(path) for path in paths[1:]]
+        )
+
 
 def tree_to_list(tree, path=""):
     files_list = []
@@ -46,7 +46,10 @@ class LambdaPackagePackageTests(unittest.TestCase):
         find_paths_mock.return_value = ([Path("mypaths")], "")
         package(configuration=Configuration(output="myoutput"))
         zip_package_mock.assert_called_once_with(
-            paths=[(Path("mypaths"), Path("mypaths"))], fp="myoutput"
+            paths=[(Path("mypaths"), Path("mypaths"))],
+            fp="myoutput",
+            configuration=ANY,
+            events=None,
         )
 
     def test_when_root_path_given_then_zip_package_called_with_relative_paths(
@@ -62,7 +65,10 @@ class LambdaPackagePackageTests(unittest.TestCase):
         find_paths_mock.return_value = ([Path("src/mypaths")], "")
         package(configuration=Configuration(output="myoutput"), root_path="src")
         zip_package_mock.assert_called_once_with(
-            paths=[(Path("src/mypaths"), Path("mypaths"))], fp="myoutput"
+            paths=[(Path("src/mypaths"), Path("mypaths"))],
+            fp="myoutput",
+            configuration=ANY,
+            events=None,
         )
 
     def test_when_config_not_given_then_read_from_disk(
@@ -110,7 +116,9 @@ class LambdaPackagePackageTests(unittest.TestCase):
         package(configuration=Configuration())
 
         read_gitignore_mock.assert_called_once()
-        find_paths_mock.assert_called_once_with(root_path=ANY, excludes=["gitignoreex"])
+        find_paths_mock.assert_called_once_with(
+            root_path=ANY, excludes=["gitignoreex"], events=None
+        )
 
     def test_when_config_has_excludes_then_do_not_read_gitignore(
         self,
@@ -127,7 +135,9 @@ class LambdaPackagePackageTests(unittest.TestCase):
         package(configuration=Configuration(exclude=["myexclude"]))
 
         read_gitignore_mock.assert_not_called()
-        find_paths_mock.assert_called_once_with(root_path=ANY, excludes=["myexclude"])
+        find_paths_mock.assert_called_once_with(
+            root_path=ANY, excludes=["myexclude"], events=None
+        )
 
     def test_when_requirements_given_then_call_build_requirements(
         self,
@@ -226,6 +236,8 @@ class LambdaPackagePackageTests(unittest.TestCase):
                 (Path("my_temp_dir/req_file_6"), Path("req_file_6")),
             ],
             fp="my_output",
+            configuration=ANY,
+            events=None,
         )
 
     def test_when_requirements_given_and_layer_output_given_then_seperate_zip_created(
@@ -265,11 +277,15 @@ class LambdaPackagePackageTests(unittest.TestCase):
                 (Path("my_temp_dir/req_file_3"), Path("req_file_3")),
             ],
             fp="layer_out",
+            configuration=ANY,
+            events=None,
         )
 
         zip_package_mock.assert_any_call(
             paths=[(Path("mypath1"), Path("mypath1"))],
             fp="my_output",
+            configuration=ANY,
+            events=None,
         )
 
     def test_when_requirements_and_layer_output_given_but_not_output_then_layer_zip_created(
@@ -309,6 +325,8 @@ class LambdaPackagePackageTests(unittest.TestCase):
                 (Path("my_temp_dir/req_file_3"), Path("req_file_3")),
             ],
             fp="layer_out",
+            configuration=ANY,
+            events=None,
         )
 
     def test_when_requirements_not_given_layer_output_given_then_raise_exception(
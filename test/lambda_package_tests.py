@@ -1,9 +1,19 @@
 import unittest
+import zipfile
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import mock
 from unittest.mock import Mock
 
-from lambda_package.lambda_package import get_files_in_directory, get_zip_package_paths
+from lambda_package.configuration import Configuration
+from lambda_package.events import Events
+from lambda_package.lambda_package import (
+    get_files_in_directory,
+    get_zip_package_paths,
+    package,
+    stream_package,
+    validate_configuration,
+)
 
 
 class LambdaPackageTests(unittest.TestCase):
@@ -53,3 +63,89 @@ class LambdaPackageTests(unittest.TestCase):
             ],
             result,
         )
+
+    def test_when_walker_is_invalid_then_raise_exception(self):
+        self.assertRaisesRegex(
+            ValueError,
+            "Invalid walker",
+            validate_configuration,
+            Configuration(exclude=["*.pyc"], walker="recursive"),
+        )
+
+    def test_when_build_method_is_invalid_then_raise_exception(self):
+        self.assertRaisesRegex(
+            ValueError,
+            "Invalid build method",
+            validate_configuration,
+            Configuration(exclude=["*.pyc"], build_method="conda"),
+        )
+
+    @mock.patch("lambda_package.lambda_package.os")
+    def test_when_builder_pool_on_windows_then_raise_exception(self, os_mock: Mock):
+        os_mock.name = "nt"
+        self.assertRaisesRegex(
+            ValueError,
+            "Builder pool parameter cannot be given on Windows",
+            validate_configuration,
+            Configuration(exclude=["*.pyc"], builder_pool=True),
+        )
+
+    @mock.patch("lambda_package.lambda_package.build_requirements")
+    def test_when_stream_package_then_zip_matches_package(
+        self, build_requirements_mock: Mock
+    ):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            source = root.joinpath("src")
+            source.joinpath("pkg").mkdir(parents=True)
+            source.joinpath("app.py").write_text("app")
+            source.joinpath("pkg", "module.py").write_text("module")
+            source.joinpath("app.pyc").write_text("compiled")
+            requirements_dir = root.joinpath("requirements_dir")
+            requirements_dir.joinpath("toml").mkdir(parents=True)
+            requirements_dir.joinpath("toml", "__init__.py").write_text("toml")
+            build_requirements_mock.return_value = requirements_dir
+            namelists = []
+
+            for (function, name) in [
+                (package, "list.zip"),
+                (stream_package, "stream.zip"),
+            ]:
+                output = root.joinpath(name)
+                with mock.patch("lambda_package.lambda_package.Thread"):
+                    function(
+                        root_path=str(source),
+                        configuration=Configuration(
+                            exclude=["*.pyc"],
+                            requirements="requirements.txt",
+                            output=str(output),
+                        ),
+                    )
+                with zipfile.ZipFile(output) as z:
+                    namelists.append(z.namelist())
+
+        self.assertEqual(namelists[0], namelists[1])
+        self.assertEqual(
+            sorted(namelists[1]), ["app.py", "pkg/module.py", "toml/__init__.py"]
+        )
+
+    def test_when_stream_package_then_phases_have_totals(self):
+        with TemporaryDirectory() as temp_dir:
+            source = Path(temp_dir).joinpath("src")
+            source.joinpath("pkg").mkdir(parents=True)
+            source.joinpath("app.py").write_text("app")
+            source.joinpath("pkg", "module.py").write_text("module")
+            received = []
+
+            stream_package(
+                root_path=str(source),
+                configuration=Configuration(
+                    exclude=["*.pyc"], output=str(Path(temp_dir).joinpath("app.zip"))
+                ),
+                events=Events([received.extend]),
+            )
+
+        phases = {e.phase: e.total for e in received if e.kind == "phase_start"}
+        self.assertDictEqual(phases, {"find_paths": None, "zip_package": 2})
+        scanned = [e.total for e in received if e.kind == "directory_scanned"]
+        self.assertEqual(sum(scanned), 2)
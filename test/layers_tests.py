@@ -0,0 +1,222 @@
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+from unittest.mock import Mock
+
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import (
+    get_files_in_directory,
+    get_zip_package_paths,
+    package,
+    validate_configuration,
+    zip_layers,
+)
+from lambda_package.layers import (
+    assign_layers,
+    get_history_path,
+    get_layer_outputs,
+    read_history,
+    update_history,
+)
+
+
+class LayersTests(unittest.TestCase):
+    """
+    Unit tests for the `layers` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.install_dir = self.root.joinpath("install")
+        self.install_dir.mkdir()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_when_no_history_then_heavy_distributions_fill_first_layers(self):
+        sizes = {"numpy": 60, "pandas": 50, "requests": 5, "six": 1, "attrs": 2}
+
+        layers = assign_layers(sizes, {}, {}, 3)
+
+        self.assertListEqual(
+            layers, [["numpy"], ["pandas"], ["attrs", "requests", "six"]]
+        )
+
+    def test_when_distribution_is_volatile_then_it_moves_to_last_layer(self):
+        sizes = {"numpy": 60, "pandas": 50, "app-sdk": 5}
+        previous = {"numpy": 0, "pandas": 0, "app-sdk": 0}
+
+        layers = assign_layers(sizes, {"app-sdk": 0.5}, previous, 2)
+
+        self.assertListEqual(layers, [["numpy", "pandas"], ["app-sdk"]])
+
+    def test_when_distributions_were_assigned_then_they_stay_in_their_layer(self):
+        sizes = {"numpy": 60, "pandas": 50, "requests": 5, "new": 70}
+        previous = {"numpy": 1, "pandas": 0, "requests": 1}
+
+        layers = assign_layers(sizes, {}, previous, 2)
+
+        self.assertListEqual(layers, [["pandas"], ["new", "numpy", "requests"]])
+
+    def test_when_size_limit_then_layers_stay_within_it(self):
+        sizes = {"a": 40, "b": 40, "c": 40, "d": 10}
+
+        layers = assign_layers(sizes, {}, {}, 3, size_limit=80)
+
+        self.assertListEqual(layers, [["a", "b"], ["c", "d"], []])
+
+    def test_when_history_updated_then_change_rates_are_returned(self):
+        history = read_history(self.root.joinpath("missing.json"))
+
+        for versions in [{"a": "1", "b": "1"}, {"a": "2", "b": "1"}]:
+            rates = update_history(history, versions)
+        rates = update_history(history, {"a": "3", "b": "1", "c": "1"})
+
+        self.assertDictEqual(rates, {"a": 1.0, "b": 0.0, "c": 0})
+        self.assertEqual(history["distributions"]["a"]["version"], "3")
+
+    def test_when_layer_output_given_then_split_layers_are_named_after_it(self):
+        self.assertListEqual(
+            get_layer_outputs("dist/layer.zip", 2),
+            [Path("dist/layer-1.zip"), Path("dist/layer-2.zip")],
+        )
+        self.assertListEqual(get_layer_outputs("layer.zip", 1), [Path("layer.zip")])
+        self.assertEqual(
+            get_history_path("dist/layer.zip"), Path("dist/layer.history.json")
+        )
+
+    def test_when_only_volatile_distribution_changes_then_stable_layer_is_reused(self):
+        configuration = Configuration(
+            exclude=[".*"],
+            requirements="requirements.txt",
+            layer_output=str(self.root.joinpath("layer.zip")),
+            layer_count=2,
+        )
+        self.install("numpy", "1.0", 5000)
+        self.install("app-sdk", "1.0", 100)
+        self.zip_layers(configuration)
+        stable_layer = self.root.joinpath("layer-1.zip")
+        stable_bytes = stable_layer.read_bytes()
+        stable_layer.touch()
+        stable_mtime = stable_layer.stat().st_mtime_ns
+
+        for version in ["2.0", "3.0"]:
+            self.uninstall("app-sdk")
+            self.install("app-sdk", version, 100)
+            layer_outputs = self.zip_layers(configuration)
+
+        self.assertListEqual(
+            layer_outputs, [stable_layer, self.root.joinpath("layer-2.zip")]
+        )
+        self.assertEqual(stable_layer.read_bytes(), stable_bytes)
+        self.assertEqual(stable_layer.stat().st_mtime_ns, stable_mtime)
+        history = read_history(self.root.joinpath("layer.history.json"))
+        self.assertListEqual(
+            [layer["distributions"] for layer in history["layers"]],
+            [["numpy"], ["app-sdk"]],
+        )
+        self.assertEqual(history["distributions"]["app-sdk"]["changes"], 2)
+
+    def test_when_contents_or_zip_settings_change_then_layer_is_written(self):
+        configuration = Configuration(
+            exclude=[".*"],
+            requirements="requirements.txt",
+            layer_output=str(self.root.joinpath("layer.zip")),
+            layer_count=2,
+        )
+        self.install("numpy", "1.0", 5000)
+        self.install("app-sdk", "1.0", 100)
+        self.zip_layers(configuration)
+        stable_layer = self.root.joinpath("layer-1.zip")
+
+        # A patched file of the same size, and a change of compressor, are both seen
+        init_path = self.install_dir.joinpath("numpy", "__init__.py")
+        init_path.write_text("!" * 5000)
+        self.zip_layers(configuration)
+        self.assertIn(b"!!!", self.read_layer(stable_layer))
+
+        configuration.compressor = "auto"
+        stable_layer.write_bytes(b"stale")
+        self.zip_layers(configuration)
+        self.assertIn(b"!!!", self.read_layer(stable_layer))
+
+    @mock.patch("lambda_package.lambda_package.Thread")
+    @mock.patch("lambda_package.lambda_package.build_requirements")
+    def test_when_layer_count_decreases_then_stale_layers_are_removed(
+        self, build_mock: Mock, _
+    ):
+        build_mock.return_value = self.install_dir
+        self.install("numpy", "1.0", 5000)
+        self.install("app-sdk", "1.0", 100)
+        source = self.root.joinpath("src")
+        source.mkdir()
+        requirements = self.root.joinpath("requirements.txt")
+        requirements.write_text("numpy==1.0\napp-sdk==1.0\n")
+        self.root.joinpath("layer-3.zip").write_bytes(b"stale")
+        self.root.joinpath("layer-notes.zip").write_bytes(b"kept")
+
+        for count in [2, 1]:
+            package(
+                root_path=str(source),
+                configuration=Configuration(
+                    exclude=[".*"],
+                    requirements=str(requirements),
+                    layer_output=str(self.root.joinpath("layer.zip")),
+                    layer_count=count,
+                ),
+            )
+            if count == 2:
+                self.assertListEqual(
+                    sorted(p.name for p in self.root.glob("layer-*.zip")),
+                    ["layer-1.zip", "layer-2.zip", "layer-notes.zip"],
+                )
+
+        self.assertListEqual(
+            sorted(p.name for p in self.root.glob("layer*.zip")),
+            ["layer-notes.zip", "layer.zip"],
+        )
+
+    def read_layer(self, path: Path) -> bytes:
+        with zipfile.ZipFile(path) as z:
+            return z.read("numpy/__init__.py")
+
+    def test_when_layer_count_out_of_range_then_configuration_is_invalid(self):
+        for layer_count in [0, 6]:
+            with self.assertRaises(ValueError):
+                validate_configuration(
+                    Configuration(
+                        exclude=[".*"],
+                        requirements="requirements.txt",
+                        layer_output="layer.zip",
+                        layer_count=layer_count,
+                    )
+                )
+
+    def zip_layers(self, configuration):
+        paths = get_zip_package_paths(
+            get_files_in_directory(str(self.install_dir)), self.install_dir
+        )
+        return zip_layers(paths, configuration)
+
+    def install(self, name: str, version: str, size: int):
+        """
+        Writes the files of a distribution as pip would install them
+        """
+        module = name.replace("-", "_")
+        dist_info = f"{module}-{version}.dist-info"
+        self.install_dir.joinpath(module).mkdir()
+        self.install_dir.joinpath(module, "__init__.py").write_text("#" * size)
+        self.install_dir.joinpath(dist_info).mkdir()
+        self.install_dir.joinpath(dist_info, "RECORD").write_text(
+            f"{module}/__init__.py,,{size}\n{dist_info}/RECORD,,\n"
+        )
+
+    def uninstall(self, name: str):
+        module = name.replace("-", "_")
+        for path in sorted(self.install_dir.glob(f"{module}*/*")):
+            path.unlink()
+        for path in self.install_dir.glob(f"{module}*"):
+            path.rmdir()
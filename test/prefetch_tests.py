@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import zip_package
+from lambda_package.prefetch import prefetch
+
+
+class PrefetchTests(unittest.TestCase):
+    """
+    Unit tests for the `prefetch` module
+    """
+
+    def test_when_prefetch_then_results_are_in_order(self):
+        def read(item):
+            time.sleep(0.01 * (item % 3))
+            return item * 2
+
+        results = list(prefetch(range(20), read, depth=4))
+
+        self.assertEqual(results, [(i, i * 2) for i in range(20)])
+
+    def test_when_prefetch_then_reads_are_bounded_by_depth(self):
+        consumed = []
+        read_ahead = []
+
+        def read(item):
+            read_ahead.append(item - len(consumed))
+            return item
+
+        for (item, _) in prefetch(range(50), read, depth=3, threads=2):
+            consumed.append(item)
+            time.sleep(0.001)
+
+        self.assertLessEqual(max(read_ahead), 3)
+
+    def test_when_read_fails_then_error_is_raised_at_its_item(self):
+        def read(item):
+            if item == 5:
+                raise OSError("unreadable")
+            return item
+
+        consumed = []
+        with self.assertRaises(OSError):
+            for (item, _) in prefetch(range(10), read, depth=4):
+                consumed.append(item)
+
+        self.assertEqual(consumed, [0, 1, 2, 3, 4])
+
+    def test_when_consumer_stops_then_threads_are_released(self):
+        threads = threading.active_count()
+        iterator = prefetch(range(100), lambda item: item, depth=8)
+        next(iterator)
+        iterator.close()
+
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_when_zip_package_with_read_ahead_then_zip_is_unchanged(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            paths = []
+            for i in range(30):
+                path = root.joinpath(f"file{i}.bin")
+                path.write_bytes(os.urandom(i * 1000) + b"a" * 5000)
+                paths.append((path, Path(f"file{i}.bin")))
+
+            for read_ahead in [None, 4]:
+                with self.subTest(read_ahead=read_ahead):
+                    output = root.joinpath(f"{read_ahead}.zip")
+                    zip_package(
+                        paths=paths,
+                        fp=str(output),
+                        configuration=Configuration(
+                            read_ahead=read_ahead,
+                            large_file_threshold=20000,
+                            reproducible=True,
+                        ),
+                    )
+
+            with zipfile.ZipFile(root.joinpath("4.zip")) as z:
+                self.assertIsNone(z.testzip())
+                self.assertEqual(z.read("file7.bin"), paths[7][0].read_bytes())
+            self.assertEqual(
+                root.joinpath("None.zip").read_bytes(),
+                root.joinpath("4.zip").read_bytes(),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
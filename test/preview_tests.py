@@ -0,0 +1,77 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from lambda_package.preview import format_size, iter_tree
+
+
+class PreviewTests(unittest.TestCase):
+    """
+    Unit tests for the `preview` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+        for (name, contents) in [
+            ("app.py", "1234"),
+            ("app.jpg", "1234"),
+            ("a/goo.txt", "12"),
+            ("a/b/goo.txt", "123"),
+            ("big/f1", "1"),
+            ("big/f2", "12"),
+            ("big/f3", "123"),
+            ("big/f4", "1234"),
+        ]:
+            path = self.root.joinpath(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(contents)
+
+        self.root.joinpath("a", "empty", "excluded").mkdir(parents=True)
+        self.root.joinpath("a", "empty", "excluded", "x.jpg").write_text("")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def relative_entries(self, entries):
+        return [
+            (entry.path.relative_to(self.root).as_posix(), entry.kind, entry.depth)
+            for entry in entries
+        ]
+
+    def test_when_iter_tree_then_dirs_are_listed_before_files(self):
+        entries = self.relative_entries(iter_tree(self.root, ["*.jpg", "big/"]))
+
+        self.assertEqual(entries[-1], ("app.py", "file", 0))
+        self.assertLess(
+            entries.index(("a/b", "dir", 1)), entries.index(("a/goo.txt", "file", 1))
+        )
+        self.assertIn(("a/b/goo.txt", "file", 2), entries)
+
+    def test_when_directory_has_no_included_files_then_it_is_skipped(self):
+        entries = self.relative_entries(iter_tree(self.root, ["*.jpg"]))
+
+        self.assertNotIn("a/empty", [path for (path, kind, depth) in entries])
+        self.assertNotIn("a/empty/excluded", [path for (path, kind, depth) in entries])
+
+    def test_when_max_depth_given_then_subdirectories_are_summarized(self):
+        entries = list(iter_tree(self.root, ["*.jpg"], max_depth=1))
+        summaries = {
+            entry.path.name: (entry.file_count, entry.size)
+            for entry in entries
+            if entry.kind == "summary"
+        }
+
+        self.assertDictEqual(summaries, {"a": (2, 5), "big": (4, 10)})
+
+    def test_when_directory_is_larger_than_collapse_then_it_is_summarized(self):
+        entries = self.relative_entries(iter_tree(self.root, ["*.jpg"], collapse=3))
+
+        self.assertIn(("big", "summary", 0), entries)
+        self.assertIn(("a/b/goo.txt", "file", 2), entries)
+
+    def test_when_format_size_then_units_are_used(self):
+        self.assertEqual(format_size(12), "12 B")
+        self.assertEqual(format_size(2048), "2.0 KB")
+        self.assertEqual(format_size(3 * 1024 * 1024), "3.0 MB")
@@ -0,0 +1,258 @@
+import os
+import unittest
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import mock
+from unittest.mock import Mock
+
+from lambda_package.cache import Cache
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import package, zip_package
+from lambda_package.remote_cache import (
+    ArtifactCache,
+    HttpRemoteCache,
+    get_layer_cache_key,
+    get_remote_cache,
+)
+
+
+class StandInCacheHandler(BaseHTTPRequestHandler):
+    """
+    A minimal HTTP cache server which stores artifacts in memory
+    """
+
+    def do_GET(self):
+        data = self.server.artifacts.get(self.path)
+        self.server.requests.append(("GET", self.path))
+        if self.server.reply is not None:
+            self.wfile.write(self.server.reply)
+            return
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        length = int(self.headers["Content-Length"])
+        self.server.artifacts[self.path] = self.rfile.read(length)
+        self.server.requests.append(("PUT", self.path))
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class RemoteCacheTests(unittest.TestCase):
+    """
+    Unit tests for the `remote_cache` module, using a local stand-in cache server
+    """
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), StandInCacheHandler)
+        self.server.artifacts = {}
+        self.server.requests = []
+        self.server.reply = None
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/cache"
+
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def test_when_put_then_get_returns_artifact(self):
+        remote = HttpRemoteCache(self.url, timeout=5)
+        source = self.root.joinpath("source")
+        source.write_bytes(b"artifact")
+        dest = self.root.joinpath("dest")
+
+        self.assertTrue(remote.put("layers/abc", source))
+        self.assertTrue(remote.get("layers/abc", dest))
+        self.assertEqual(dest.read_bytes(), b"artifact")
+
+    def test_when_artifact_missing_then_get_returns_false(self):
+        remote = HttpRemoteCache(self.url, timeout=5)
+
+        self.assertFalse(remote.get("layers/missing", self.root.joinpath("dest")))
+
+    def test_when_server_unreachable_then_fall_back_to_miss(self):
+        remote = HttpRemoteCache("http://127.0.0.1:1/cache", timeout=1)
+        source = self.root.joinpath("source")
+        source.write_bytes(b"artifact")
+
+        with self.assertLogs("lambda_package.remote_cache", level="WARNING"):
+            self.assertFalse(remote.get("layers/abc", self.root.joinpath("dest")))
+            self.assertFalse(remote.put("layers/abc", source))
+
+    def test_when_server_replies_garbage_or_short_then_fall_back_to_miss(self):
+        remote = HttpRemoteCache(self.url, timeout=5)
+        dest = self.root.joinpath("dest")
+
+        for reply in [
+            b"GARBAGE\r\n\r\n",
+            b"HTTP/1.0 200 OK\r\nContent-Length: 100\r\n\r\nartifact",
+        ]:
+            self.server.reply = reply
+            with self.assertLogs("lambda_package.remote_cache", level="WARNING"):
+                self.assertFalse(remote.get("layers/abc", dest))
+
+    def test_when_fetch_remote_artifact_then_saved_to_local_cache(self):
+        self.server.artifacts["/cache/layers/abc"] = b"artifact"
+        cache = Cache(self.root.joinpath("cache"))
+        artifact_cache = ArtifactCache(cache, HttpRemoteCache(self.url, timeout=5))
+
+        with artifact_cache.fetch("layers", "abc") as path:
+            self.assertEqual(path.read_bytes(), b"artifact")
+        self.assertEqual(cache.get("layers", "abc"), path)
+        with artifact_cache.fetch("layers", "def") as path:
+            self.assertIsNone(path)
+
+    def test_when_invalid_remote_cache_scheme_then_raise_exception(self):
+        self.assertIsNone(get_remote_cache(Configuration()))
+        self.assertRaises(
+            ValueError, get_remote_cache, Configuration(remote_cache="ftp://cache")
+        )
+
+    def test_when_zip_package_on_second_runner_then_entries_are_downloaded(self):
+        model = self.root.joinpath("model.bin")
+        model.write_bytes(b"weights " * 100000 + os.urandom(1000))
+        paths = [(model, Path("model.bin"))]
+
+        for runner in ["runner1", "runner2"]:
+            zip_package(
+                paths=paths,
+                fp=str(self.root.joinpath(f"{runner}.zip")),
+                configuration=Configuration(
+                    cache_dir=str(self.root.joinpath(runner)),
+                    remote_cache=self.url,
+                    remote_cache_min_size=1000,
+                ),
+            )
+
+        self.assertListEqual(
+            [method for (method, path) in self.server.requests], ["GET", "PUT", "GET"]
+        )
+        for runner in ["runner1", "runner2"]:
+            with zipfile.ZipFile(self.root.joinpath(f"{runner}.zip")) as z:
+                self.assertIsNone(z.testzip())
+                self.assertEqual(z.read("model.bin"), model.read_bytes())
+
+    def test_when_remote_entry_is_corrupted_then_file_is_compressed_again(self):
+        model = self.root.joinpath("model.bin")
+        model.write_bytes(b"weights " * 100000 + os.urandom(1000))
+        paths = [(model, Path("model.bin"))]
+        configuration = Configuration(
+            cache_dir=str(self.root.joinpath("runner1")),
+            remote_cache=self.url,
+            remote_cache_min_size=1000,
+        )
+        zip_package(
+            paths, str(self.root.joinpath("runner1.zip")), configuration=configuration
+        )
+        ((path, data),) = self.server.artifacts.items()
+        self.server.artifacts[path] = data[: len(data) // 2]
+
+        configuration.cache_dir = str(self.root.joinpath("runner2"))
+        with self.assertLogs("lambda_package.remote_cache", level="WARNING"):
+            zip_package(
+                paths,
+                str(self.root.joinpath("runner2.zip")),
+                configuration=configuration,
+            )
+
+        with zipfile.ZipFile(self.root.joinpath("runner2.zip")) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.read("model.bin"), model.read_bytes())
+        self.assertEqual(self.server.artifacts[path], data)
+
+    @mock.patch("lambda_package.lambda_package.build_requirements")
+    def test_when_layer_in_remote_cache_then_requirements_not_built(
+        self, build_requirements_mock: Mock
+    ):
+        requirements = self.root.joinpath("requirements.txt")
+        requirements.write_text("requests==2.25.0\n")
+        layer_output = self.root.joinpath("layer.zip")
+        configuration = Configuration(
+            exclude=["*"],
+            requirements=str(requirements),
+            layer_output=str(layer_output),
+            cache_dir=str(self.root.joinpath("cache")),
+            remote_cache=self.url,
+            python_version="3.8",
+        )
+        key = get_layer_cache_key(configuration)
+        layer = self.root.joinpath("cached.zip")
+        with zipfile.ZipFile(layer, "w") as z:
+            z.writestr("python/requests/__init__.py", "")
+        self.server.artifacts[f"/cache/layers/{key}"] = layer.read_bytes()
+
+        package(root_path=str(self.root), configuration=configuration)
+
+        build_requirements_mock.assert_not_called()
+        self.assertEqual(layer_output.read_bytes(), layer.read_bytes())
+
+    @mock.patch("lambda_package.lambda_package.Thread")
+    @mock.patch("lambda_package.lambda_package.build_requirements")
+    def test_when_remote_layer_is_truncated_then_requirements_are_built(
+        self, build_requirements_mock: Mock, _
+    ):
+        requirements = self.root.joinpath("requirements.txt")
+        requirements.write_text("requests==2.25.0\n")
+        build_dir = self.root.joinpath("build")
+        build_dir.joinpath("requests").mkdir(parents=True)
+        build_dir.joinpath("requests", "__init__.py").write_text("")
+        build_requirements_mock.return_value = build_dir
+        configuration = Configuration(
+            exclude=["*"],
+            requirements=str(requirements),
+            layer_output=str(self.root.joinpath("layer.zip")),
+            cache_dir=str(self.root.joinpath("cache")),
+            remote_cache=self.url,
+            python_version="3.8",
+        )
+        layer = self.root.joinpath("cached.zip")
+        with zipfile.ZipFile(layer, "w") as z:
+            z.writestr("python/requests/__init__.py", "# requests\n" * 1000)
+        key = f"/cache/layers/{get_layer_cache_key(configuration)}"
+        self.server.artifacts[key] = layer.read_bytes()[:-100]
+
+        with self.assertLogs("lambda_package.remote_cache", level="WARNING"):
+            package(root_path=str(self.root), configuration=configuration)
+
+        build_requirements_mock.assert_called_once()
+        with zipfile.ZipFile(self.root.joinpath("layer.zip")) as z:
+            self.assertIsNone(z.testzip())
+
+    def test_when_index_url_or_reproducible_changes_then_layer_cache_key_changes(self):
+        requirements = self.root.joinpath("requirements.txt")
+        requirements.write_text("requests==2.25.0\n")
+        keys = {
+            get_layer_cache_key(
+                Configuration(
+                    exclude=["*"],
+                    requirements=str(requirements),
+                    python_version="3.8",
+                    index_url=index_url,
+                    reproducible=reproducible,
+                )
+            )
+            for (index_url, reproducible) in [
+                (None, False),
+                ("https://example.com/simple", False),
+                (None, True),
+            ]
+        }
+
+        self.assertEqual(len(keys), 3)
@@ -1,10 +1,29 @@
+import os
+import sys
 import unittest
+import zipfile
+from collections import namedtuple
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from subprocess import CalledProcessError
+from tempfile import TemporaryDirectory
+from threading import Thread
 from unittest import mock
 from unittest.mock import Mock
 
 from lambda_package.configuration import Configuration
-from lambda_package.requirements import CacheDirName, TempDir, build_requirements
+from lambda_package.requirements import (
+    CacheDirName,
+    TempDir,
+    WorkspaceDirName,
+    build_requirements,
+    get_platform_options,
+    get_workspace_directory,
+    read_requirement_specs,
+)
+
+DiskUsage = namedtuple("DiskUsage", ["total", "used", "free"])
 
 
 @mock.patch("lambda_package.requirements.run")
@@ -76,6 +95,7 @@ class RequirementsTests(unittest.TestCase):
         subprocess_run_mock,
     ):
         generate_temp_task_dir_mock.return_value = "my_temp_dir"
+        subprocess_run_mock.return_value.returncode = 0
         expected_temp_dir = Path(TempDir).joinpath("my_temp_dir").absolute()
 
         build_requirements(
@@ -96,3 +116,395 @@ class RequirementsTests(unittest.TestCase):
                 f"{TempDir}/{CacheDirName}/local_5.6",
             ]
         )
+
+
+class RequirementsWorkspaceTests(unittest.TestCase):
+    """
+    Unit tests for the `requirements.get_workspace_directory` function
+    """
+
+    def test_when_no_workspace_given_then_temp_dir_is_used(self):
+        self.assertEqual(get_workspace_directory(Configuration()), Path(TempDir))
+
+    @mock.patch("lambda_package.requirements.disk_usage")
+    def test_when_workspace_has_enough_space_then_workspace_is_used(
+        self, disk_usage_mock: Mock
+    ):
+        disk_usage_mock.return_value = DiskUsage(100, 0, 100)
+
+        with TemporaryDirectory() as workspace:
+            result = get_workspace_directory(
+                Configuration(workspace=workspace, workspace_size_limit=100)
+            )
+
+            self.assertEqual(result, Path(workspace).joinpath(WorkspaceDirName))
+            self.assertTrue(result.is_dir())
+
+    @mock.patch("lambda_package.requirements.disk_usage")
+    def test_when_workspace_has_too_little_space_then_temp_dir_is_used(
+        self, disk_usage_mock: Mock
+    ):
+        disk_usage_mock.return_value = DiskUsage(100, 1, 99)
+
+        with TemporaryDirectory() as workspace:
+            result = get_workspace_directory(
+                Configuration(workspace=workspace, workspace_size_limit=100)
+            )
+
+            self.assertEqual(result, Path(TempDir))
+
+    def test_when_workspace_cannot_be_created_then_temp_dir_is_used(self):
+        with TemporaryDirectory() as temp_dir:
+            workspace = Path(temp_dir).joinpath("file")
+            workspace.write_text("")
+
+            result = get_workspace_directory(Configuration(workspace=str(workspace)))
+
+            self.assertEqual(result, Path(TempDir))
+
+    @mock.patch("lambda_package.requirements.run")
+    def test_when_build_fails_in_workspace_then_it_is_retried_on_disk(
+        self, run_mock: Mock
+    ):
+        run_mock.side_effect = [Mock(returncode=1), Mock(returncode=0)]
+
+        with TemporaryDirectory() as workspace:
+            requirements_dir = build_requirements(
+                Configuration(
+                    requirements="requirements.txt",
+                    use_docker=False,
+                    python_version="5.6",
+                    workspace=workspace,
+                    workspace_size_limit=0,
+                    cache_dir=str(Path(workspace).joinpath("cache")),
+                )
+            )
+
+            workspace_dir = Path(workspace).joinpath(WorkspaceDirName)
+            self.assertListEqual(list(workspace_dir.iterdir()), [])
+        self.assertEqual(requirements_dir.parent, Path(TempDir))
+        requirements_dir.rmdir()
+
+    @mock.patch("lambda_package.requirements.run")
+    def test_when_local_build_fails_then_error_is_raised(self, run_mock: Mock):
+        run_mock.return_value.returncode = 1
+
+        with TemporaryDirectory() as cache_dir:
+            with self.assertRaises(CalledProcessError):
+                build_requirements(
+                    Configuration(
+                        requirements="requirements.txt",
+                        use_docker=False,
+                        python_version="5.6",
+                        cache_dir=cache_dir,
+                    )
+                )
+
+
+class StandInIndexHandler(SimpleHTTPRequestHandler):
+    """
+    Serves a directory as a package index, recording the requested paths
+    """
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def create_wheel(index_dir: Path, name: str, version: str, console_script=False):
+    """
+    Creates a minimal pure-Python wheel and its page in a PEP 503 simple index.  If
+    `console_script` is set, pip installs a script named after the distribution.
+    """
+    module = name.replace("-", "_")
+    dist_info = f"{module}-{version}.dist-info"
+    files = {
+        f"{module}/__init__.py": f"VERSION = '{version}'\n",
+        f"{dist_info}/METADATA": (
+            f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"
+        ),
+        f"{dist_info}/WHEEL": (
+            "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\n"
+            "Tag: py3-none-any\n"
+        ),
+    }
+    if console_script:
+        files[
+            f"{dist_info}/entry_points.txt"
+        ] = f"[console_scripts]\n{name} = {module}:main\n"
+    files[f"{dist_info}/RECORD"] = "".join(f"{f},,\n" for f in [*files, "RECORD"])
+
+    wheel_name = f"{module}-{version}-py3-none-any.whl"
+    with zipfile.ZipFile(index_dir.joinpath(wheel_name), "w") as z:
+        for (arcname, content) in files.items():
+            z.writestr(arcname, content)
+
+    # Each version of a distribution adds a link to its page
+    page_dir = index_dir.joinpath("simple", name)
+    page_dir.mkdir(parents=True, exist_ok=True)
+    with open(str(page_dir.joinpath("index.html")), "a") as f:
+        f.write(f'<a href="../../{wheel_name}">{wheel_name}</a>\n')
+
+
+class RequirementsDownloadTests(unittest.TestCase):
+    """
+    Unit tests for the parallel download stage of the `requirements` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.requirements = self.root.joinpath("requirements.txt")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_when_requirements_read_then_specs_and_options_are_split(self):
+        self.requirements.write_text(
+            "# Pinned requirements\n"
+            "--extra-index-url https://example.com/simple\n"
+            "toml==0.10.2 \\\n"
+            "    --hash=sha256:abc  # via lambda-package\n"
+            'pathspec==0.9.0; python_version >= "3.7"\n'
+        )
+
+        self.assertEqual(
+            read_requirement_specs(str(self.requirements)),
+            (
+                ["toml==0.10.2", 'pathspec==0.9.0; python_version >= "3.7"'],
+                ["--extra-index-url", "https://example.com/simple"],
+            ),
+        )
+
+    def test_when_requirements_include_other_files_then_not_split(self):
+        self.requirements.write_text("-r base.txt\ntoml==0.10.2\n")
+
+        self.assertIsNone(read_requirement_specs(str(self.requirements)))
+
+    @mock.patch("lambda_package.requirements.run")
+    def test_when_parallel_downloads_then_install_uses_wheelhouse(self, run_mock: Mock):
+        self.requirements.write_text("toml==0.10.2\npathspec==0.9.0\n")
+        run_mock.return_value.returncode = 0
+
+        build_requirements(
+            Configuration(
+                requirements=str(self.requirements),
+                use_docker=False,
+                python_version="5.6",
+                workspace=str(self.root),
+                cache_dir=str(self.root.joinpath("cache")),
+                parallel_downloads=2,
+            )
+        )
+
+        commands = [c[0][0] for c in run_mock.call_args_list]
+        downloads = sorted(c[-1] for c in commands if c[1] == "download")
+        self.assertEqual(downloads, ["pathspec==0.9.0", "toml==0.10.2"])
+        self.assertEqual(commands[-1][1], "install")
+        self.assertIn("--no-index", commands[-1])
+        self.assertIn("--find-links", commands[-1])
+
+    @mock.patch.dict(
+        os.environ, {"PIP_DISABLE_PIP_VERSION_CHECK": "1", "PIP_NO_INPUT": "1"}
+    )
+    def test_when_parallel_downloads_from_stand_in_index_then_installed(self):
+        index_dir = self.root.joinpath("index")
+        index_dir.mkdir()
+        create_wheel(index_dir, "standin-one", "1.0")
+        create_wheel(index_dir, "standin-two", "2.0")
+        self.requirements.write_text("standin-one==1.0\nstandin-two==2.0\n")
+
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            partial(StandInIndexHandler, directory=str(index_dir)),
+        )
+        server.requests = []
+        Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            requirements_dir = build_requirements(
+                Configuration(
+                    requirements=str(self.requirements),
+                    use_docker=False,
+                    python_version=f"{sys.version_info[0]}.{sys.version_info[1]}",
+                    workspace=str(self.root),
+                    cache_dir=str(self.root.joinpath("cache")),
+                    parallel_downloads=2,
+                    index_url=f"http://127.0.0.1:{server.server_port}/simple",
+                )
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertTrue(
+            requirements_dir.joinpath("standin_one", "__init__.py").exists()
+        )
+        self.assertTrue(
+            requirements_dir.joinpath("standin_two", "__init__.py").exists()
+        )
+        self.assertIn("/standin_one-1.0-py3-none-any.whl", server.requests)
+        self.assertIn("/standin_two-2.0-py3-none-any.whl", server.requests)
+
+    @mock.patch.dict(
+        os.environ, {"PIP_DISABLE_PIP_VERSION_CHECK": "1", "PIP_NO_INPUT": "1"}
+    )
+    def test_when_wheel_store_used_then_second_build_is_linked_from_store(self):
+        index_dir = self.root.joinpath("index")
+        index_dir.mkdir()
+        create_wheel(index_dir, "standin-one", "1.0")
+        self.requirements.write_text("standin-one==1.0\n")
+
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            partial(StandInIndexHandler, directory=str(index_dir)),
+        )
+        server.requests = []
+        Thread(target=server.serve_forever, daemon=True).start()
+        configuration = Configuration(
+            requirements=str(self.requirements),
+            use_docker=False,
+            python_version=f"{sys.version_info[0]}.{sys.version_info[1]}",
+            workspace=str(self.root),
+            cache_dir=str(self.root.joinpath("cache")),
+            index_url=f"http://127.0.0.1:{server.server_port}/simple",
+            wheel_store=True,
+        )
+
+        try:
+            first_dir = build_requirements(configuration)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # The index is no longer available, so the second build must use the store
+        second_dir = build_requirements(configuration)
+
+        for requirements_dir in [first_dir, second_dir]:
+            module = requirements_dir.joinpath("standin_one", "__init__.py")
+            self.assertTrue(module.is_file())
+            self.assertGreater(module.stat().st_nlink, 2)
+        self.assertTrue(
+            second_dir.joinpath("standin_one-1.0.dist-info", "METADATA").is_file()
+        )
+
+    @mock.patch.dict(
+        os.environ,
+        {"PIP_DISABLE_PIP_VERSION_CHECK": "1", "PIP_NO_INPUT": "1", "PIP_RETRIES": "0"},
+    )
+    def test_when_wheel_store_fallback_fails_then_error_is_raised(self):
+        self.requirements.write_text("standin-one==1.0\n")
+        configuration = Configuration(
+            requirements=str(self.requirements),
+            use_docker=False,
+            python_version=f"{sys.version_info[0]}.{sys.version_info[1]}",
+            workspace=str(self.root),
+            cache_dir=str(self.root.joinpath("cache")),
+            index_url="http://127.0.0.1:1/simple",
+            wheel_store=True,
+        )
+
+        with self.assertRaises(CalledProcessError):
+            build_requirements(configuration)
+
+
+@mock.patch("lambda_package.requirements.from_env")
+@mock.patch("lambda_package.requirements.run")
+class RequirementsPlatformTests(unittest.TestCase):
+    """
+    Unit tests for the `"platform"` build method of the `requirements` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.requirements = self.root.joinpath("requirements.txt")
+        self.requirements.write_text("toml==0.10.2\nsdist-only==1.0\n")
+        self.configuration = Configuration(
+            requirements=str(self.requirements),
+            python_version="3.11",
+            workspace=str(self.root),
+            cache_dir=str(self.root.joinpath("cache")),
+            build_method="platform",
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_when_all_wheels_available_then_docker_is_not_used(
+        self, run_mock: Mock, from_env_mock: Mock
+    ):
+        run_mock.return_value.returncode = 0
+
+        build_requirements(self.configuration)
+
+        run_mock.assert_called_once()
+        command = run_mock.call_args[0][0]
+        self.assertEqual(command[:4], [sys.executable, "-m", "pip", "install"])
+        self.assertIn("manylinux2014_x86_64", command)
+        self.assertIn(":all:", command)
+        from_env_mock.assert_not_called()
+
+    def test_when_wheel_missing_then_only_that_requirement_uses_docker(
+        self, run_mock: Mock, from_env_mock: Mock
+    ):
+        def run(command):
+            failed = "-r" in command or command[-1] == "sdist-only==1.0"
+            return Mock(returncode=1 if failed else 0)
+
+        run_mock.side_effect = run
+        docker_requirements = []
+        from_env_mock.return_value.containers.run.side_effect = (
+            lambda image, command, volumes: docker_requirements.append(
+                Path(next(iter(volumes))).joinpath("requirements.txt").read_text()
+            )
+        )
+
+        build_requirements(self.configuration)
+
+        installs = [c[0][0] for c in run_mock.call_args_list if "install" in c[0][0]]
+        self.assertEqual(installs[-1][-1], "toml==0.10.2")
+        self.assertNotIn("--no-deps", installs[-1])
+        downloads = [c[0][0] for c in run_mock.call_args_list if "download" in c[0][0]]
+        self.assertTrue(all("--no-deps" not in command for command in downloads))
+        self.assertEqual(docker_requirements, ["\nsdist-only==1.0\n"])
+
+    def test_when_wheel_install_fails_then_error_is_raised(
+        self, run_mock: Mock, from_env_mock: Mock
+    ):
+        run_mock.side_effect = lambda command: Mock(
+            returncode=1 if "install" in command else 0
+        )
+
+        with self.assertRaises(CalledProcessError):
+            build_requirements(self.configuration)
+
+    def test_when_wheel_missing_for_arm64_then_error_is_raised(
+        self, run_mock: Mock, from_env_mock: Mock
+    ):
+        run_mock.side_effect = lambda command: Mock(
+            returncode=1 if "-r" in command or command[-1] == "sdist-only==1.0" else 0
+        )
+        self.configuration.architecture = "arm64"
+
+        with self.assertRaises(ValueError):
+            build_requirements(self.configuration)
+
+        from_env_mock.assert_not_called()
+
+    def test_when_platform_options_then_tags_match_lambda_runtime(
+        self, run_mock: Mock, from_env_mock: Mock
+    ):
+        arm_options = get_platform_options(
+            Configuration(python_version="3.12", architecture="arm64")
+        )
+        legacy_options = get_platform_options(Configuration(python_version="3.7"))
+
+        self.assertIn("manylinux_2_34_aarch64", arm_options)
+        self.assertNotIn("manylinux1_aarch64", arm_options)
+        self.assertIn("manylinux_2_26_x86_64", legacy_options)
+        self.assertNotIn("manylinux_2_27_x86_64", legacy_options)
+        self.assertIn("cp37m", legacy_options)
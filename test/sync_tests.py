@@ -0,0 +1,69 @@
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import package
+from lambda_package.sync import SyncResult, sync_directory
+
+
+class SyncTests(unittest.TestCase):
+    """
+    Unit tests for the `sync` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.source = self.root.joinpath("src")
+        self.source.joinpath("pkg").mkdir(parents=True)
+        self.source.joinpath("app.py").write_text("app")
+        self.source.joinpath("pkg", "module.py").write_text("module")
+        self.dest = self.root.joinpath("out")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_paths(self):
+        return [(self.source.joinpath(p), Path(p)) for p in ["app.py", "pkg/module.py"]]
+
+    def test_when_synced_then_files_are_hardlinked(self):
+        result = sync_directory(self.get_paths(), self.dest)
+
+        self.assertEqual(result, SyncResult(updated=2, unchanged=0, removed=0))
+        self.assertTrue(
+            os.path.samefile(
+                str(self.source.joinpath("pkg", "module.py")),
+                str(self.dest.joinpath("pkg", "module.py")),
+            )
+        )
+
+    def test_when_synced_again_then_only_changes_are_applied(self):
+        sync_directory(self.get_paths(), self.dest)
+        self.dest.joinpath("old").mkdir()
+        self.dest.joinpath("old", "stale.py").write_text("stale")
+
+        # Editors often save by replacing the file, which breaks the hardlink
+        self.source.joinpath("app.py").unlink()
+        self.source.joinpath("app.py").write_text("new app")
+
+        result = sync_directory(self.get_paths(), self.dest)
+
+        self.assertEqual(result, SyncResult(updated=1, unchanged=1, removed=1))
+        self.assertEqual(self.dest.joinpath("app.py").read_text(), "new app")
+        self.assertFalse(self.dest.joinpath("old").exists())
+
+    def test_when_package_has_output_dir_then_lambda_layout_is_written(self):
+        output_dir = self.root.joinpath("emulator")
+
+        package(
+            root_path=str(self.source),
+            configuration=Configuration(exclude=["*.pyc"], output_dir=str(output_dir)),
+        )
+
+        self.assertEqual(
+            output_dir.joinpath("var", "task", "pkg", "module.py").read_text(),
+            "module",
+        )
+        self.assertFalse(output_dir.joinpath("var", "task", "src").exists())
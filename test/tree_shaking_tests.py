@@ -0,0 +1,203 @@
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from lambda_package.configuration import Configuration
+from lambda_package.lambda_package import get_zip_package_paths, package
+from lambda_package.tree_shaking import (
+    get_bytecode_module_name,
+    get_module_name,
+    resolve_import,
+    shake_paths,
+)
+
+
+class TreeShakingTests(unittest.TestCase):
+    """
+    Unit tests for the `tree_shaking` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.source = self.root.joinpath("src")
+        self.requirements = self.root.joinpath("requirements")
+
+        self.write(
+            self.source,
+            {
+                "app.py": "import sdk.clients.s3\nfrom helpers import util\n",
+                "helpers/__init__.py": "",
+                "helpers/util.py": "from .strings import upper\n",
+                "helpers/strings.py": "def upper(s):\n    return s.upper()\n",
+                "helpers/unused.py": "import sdk.clients.ec2\n",
+                "scripts/migrate.py": "import sdk\n",
+                "bin/run-migrations.py": "import sdk\n",
+                "data.json": "{}",
+            },
+        )
+        self.write(
+            self.requirements,
+            {
+                "sdk/__init__.py": "from sdk.session import Session\n",
+                "sdk/session.py": "import importlib\n"
+                "def load():\n    importlib.import_module('sdk.loader')\n",
+                "sdk/loader.py": "",
+                "sdk/clients/__init__.py": "",
+                "sdk/clients/s3.py": "from ..session import Session\n",
+                "sdk/clients/ec2.py": "x = 1\n" * 1000,
+                "sdk/clients/__pycache__/__init__.cpython-311.pyc": "",
+                "sdk/clients/__pycache__/s3.cpython-311.pyc": "s3",
+                "sdk/clients/__pycache__/ec2.cpython-311.pyc": "ec2" * 100,
+                "sdk/_vendor/__pycache__/sourceless.cpython-311.pyc": "",
+                "sdk/plugins/extra.py": "",
+                "sdk/_speedups.so": "binary",
+                "sdk-1.0.dist-info/RECORD": "",
+                "legacy/__init__.py": "print 'python 2'\n",
+            },
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, root: Path, files):
+        for (name, content) in files.items():
+            path = root.joinpath(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+
+    def get_paths(self, root: Path):
+        return get_zip_package_paths(
+            sorted(p for p in root.rglob("*") if p.is_file()), root
+        )
+
+    def shake(self, keep=None):
+        ((source, requirements), report) = shake_paths(
+            [self.get_paths(self.source), self.get_paths(self.requirements)],
+            "app.handler",
+            keep,
+        )
+        names = {str(zip_path) for (_, zip_path) in source + requirements}
+        return (names, report)
+
+    def test_when_shaken_then_unreachable_modules_are_removed(self):
+        (names, report) = self.shake()
+
+        self.assertEqual(
+            names,
+            {
+                "app.py",
+                "data.json",
+                "helpers/__init__.py",
+                "helpers/util.py",
+                "helpers/strings.py",
+                "bin/run-migrations.py",
+                "sdk/__init__.py",
+                "sdk/session.py",
+                "sdk/loader.py",
+                "sdk/clients/__init__.py",
+                "sdk/clients/s3.py",
+                "sdk/clients/__pycache__/__init__.cpython-311.pyc",
+                "sdk/clients/__pycache__/s3.cpython-311.pyc",
+                "sdk/_vendor/__pycache__/sourceless.cpython-311.pyc",
+                "sdk/_speedups.so",
+                "sdk-1.0.dist-info/RECORD",
+            },
+        )
+        self.assertEqual(report.removed_modules, 5)
+        self.assertEqual(
+            report.removed_bytes,
+            sum(
+                path.stat().st_size
+                for path in [
+                    self.source.joinpath("helpers", "unused.py"),
+                    self.source.joinpath("scripts", "migrate.py"),
+                    self.requirements.joinpath("sdk", "clients", "ec2.py"),
+                    self.requirements.joinpath(
+                        "sdk", "clients", "__pycache__", "ec2.cpython-311.pyc"
+                    ),
+                    self.requirements.joinpath("sdk", "plugins", "extra.py"),
+                    self.requirements.joinpath("legacy", "__init__.py"),
+                ]
+            ),
+        )
+
+    def test_when_keep_given_then_matching_modules_and_imports_are_kept(self):
+        (names, _) = self.shake(keep=["sdk.plugins.*", "helpers.unused"])
+
+        self.assertIn("sdk/plugins/extra.py", names)
+        self.assertIn("helpers/unused.py", names)
+        self.assertIn("sdk/clients/ec2.py", names)
+        self.assertNotIn("legacy/__init__.py", names)
+
+    def test_when_star_import_then_all_submodules_are_kept(self):
+        self.source.joinpath("app.py").write_text("from sdk.clients import *\n")
+
+        (names, _) = self.shake()
+
+        self.assertIn("sdk/clients/ec2.py", names)
+        self.assertNotIn("sdk/plugins/extra.py", names)
+
+    def test_when_reached_module_cannot_be_parsed_then_every_module_is_kept(self):
+        self.source.joinpath("app.py").write_text("import legacy\n")
+
+        with self.assertLogs("lambda_package.tree_shaking", "WARNING") as logs:
+            (names, report) = self.shake()
+
+        self.assertIn("sdk/clients/ec2.py", names)
+        self.assertIn("helpers/unused.py", names)
+        self.assertEqual(report.removed_modules, 0)
+        self.assertIn("legacy", logs.output[0])
+
+    def test_resolve_import(self):
+        self.assertEqual(resolve_import("a.b", 0, "x.y", False), "a.b")
+        self.assertEqual(resolve_import("c", 1, "x.y.z", False), "x.y.c")
+        self.assertEqual(resolve_import("c", 1, "x.y", True), "x.y.c")
+        self.assertEqual(resolve_import(None, 2, "x.y.z", False), "x")
+        self.assertIsNone(resolve_import("c", 3, "x.y", False))
+
+    def test_get_module_name(self):
+        self.assertEqual(get_module_name(Path("a/b/c.py")), "a.b.c")
+        self.assertEqual(get_module_name(Path("a/b/__init__.py")), "a.b")
+        self.assertIsNone(get_module_name(Path("a-1.0.data/c.py")))
+        self.assertIsNone(get_module_name(Path("a/c.so")))
+
+    def test_get_bytecode_module_name(self):
+        self.assertEqual(
+            get_bytecode_module_name(Path("a/__pycache__/c.cpython-311.pyc")), "a.c"
+        )
+        self.assertEqual(
+            get_bytecode_module_name(Path("a/__pycache__/__init__.cpython-311.pyc")),
+            "a",
+        )
+        self.assertIsNone(get_bytecode_module_name(Path("a/c.pyc")))
+        self.assertIsNone(get_bytecode_module_name(Path("a/c.py")))
+
+    def test_when_package_with_tree_shaking_then_zip_is_shaken(self):
+        output = self.root.joinpath("app.zip")
+
+        package(
+            root_path=str(self.source),
+            configuration=Configuration(
+                exclude=["*.pyc"],
+                handler="app.handler",
+                tree_shaking=True,
+                output=str(output),
+            ),
+        )
+
+        with zipfile.ZipFile(output) as z:
+            self.assertNotIn("helpers/unused.py", z.namelist())
+            self.assertIn("helpers/strings.py", z.namelist())
+
+    def test_when_tree_shaking_without_handler_then_raise_exception(self):
+        with self.assertRaises(ValueError):
+            package(
+                root_path=str(self.source),
+                configuration=Configuration(exclude=["*.pyc"], tree_shaking=True),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
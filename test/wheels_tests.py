@@ -0,0 +1,77 @@
+import os
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from lambda_package.wheels import link_tree, unpack_wheel
+
+
+class WheelsTests(unittest.TestCase):
+    """
+    Unit tests for the `wheels` module
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.wheel = self.root.joinpath("standin-1.0-py3-none-any.whl")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_wheel(self, files):
+        with zipfile.ZipFile(self.wheel, "w") as z:
+            for (arcname, content, mode) in files:
+                info = zipfile.ZipInfo(arcname)
+                info.external_attr = mode << 16
+                z.writestr(info, content)
+
+    def test_when_wheel_unpacked_then_data_directory_is_installed(self):
+        self.write_wheel(
+            [
+                ("standin/__init__.py", "", 0o644),
+                ("standin-1.0.data/purelib/standin_extra.py", "", 0o644),
+                ("standin-1.0.data/scripts/standin", "#!python\nmain()\n", 0o755),
+                ("standin-1.0.data/scripts/standin.sh", "#!/bin/sh\n", 0o755),
+                ("standin-1.0.data/headers/standin.h", "", 0o644),
+            ]
+        )
+        dest = self.root.joinpath("dest")
+
+        unpack_wheel(self.wheel, dest, "/var/lang/bin/python3.8")
+
+        self.assertTrue(dest.joinpath("standin", "__init__.py").is_file())
+        self.assertTrue(dest.joinpath("standin_extra.py").is_file())
+        self.assertTrue(os.access(str(dest.joinpath("bin", "standin")), os.X_OK))
+        self.assertEqual(
+            dest.joinpath("bin", "standin").read_bytes(),
+            f"#!/var/lang/bin/python3.8{os.linesep}main()\n".encode(),
+        )
+        self.assertEqual(dest.joinpath("bin", "standin.sh").read_text(), "#!/bin/sh\n")
+        self.assertFalse(dest.joinpath("standin-1.0.data").exists())
+        self.assertFalse(dest.joinpath("standin.h").exists())
+
+    def test_when_wheel_has_parent_path_then_error_is_raised(self):
+        self.write_wheel([("../escaped.py", "", 0o644)])
+
+        with self.assertRaises(ValueError):
+            unpack_wheel(self.wheel, self.root.joinpath("dest"), "python")
+
+    def test_when_tree_linked_then_files_are_hardlinked_and_merged(self):
+        source = self.root.joinpath("source")
+        source.joinpath("pkg").mkdir(parents=True)
+        source.joinpath("pkg", "a.py").write_text("a")
+        dest = self.root.joinpath("dest")
+        dest.joinpath("pkg").mkdir(parents=True)
+        dest.joinpath("pkg", "b.py").write_text("b")
+
+        copied = link_tree(source, dest)
+
+        self.assertEqual(copied, 0)
+        self.assertTrue(dest.joinpath("pkg", "b.py").is_file())
+        self.assertTrue(
+            os.path.samefile(
+                str(source.joinpath("pkg", "a.py")), str(dest.joinpath("pkg", "a.py"))
+            )
+        )